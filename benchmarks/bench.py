@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+各个耗时环节的性能测试，用法：
+    python benchmarks/bench.py                 与保存的基准比较
+    python benchmarks/bench.py --save          保存为新的基准
+    python benchmarks/bench.py --only vix --scale 2
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from volopt import add_script_dirs
+add_script_dirs()
+
+import synthetic
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+MODELS = ['realized', 'parkinson', 'garman_klass', 'roger_satchell',
+          'garkla_yangzh', 'yang_zhang']
+CASES = {}
+
+def case(name):
+    '''
+    注册一个测试，被装饰的函数接收scale，准备数据后返回一个无参数的函数，
+    只有返回的函数计时
+    '''
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+def volatility_case(model):
+    def setup(scale):
+        from volatility import rolling_volatility
+        data = synthetic.ohlc(2000 * scale)
+        kw = {column: data[column] for column in data.columns}
+        return lambda: rolling_volatility(model, 60, **kw)
+    return setup
+
+for model in MODELS:
+    case('rolling_volatility:' + model)(volatility_case(model))
+
+@case('bootstrap_bands')
+def bootstrap_bands_case(scale):
+    '''六种波动率、每个日期200次重抽样的置信区间'''
+    from volopt.bootstrap import confidence_bands
+    data = synthetic.ohlc(300 * scale)
+    kw = {column: data[column] for column in data.columns}
+    return lambda: confidence_bands(60, B=200, seed=0, **kw)
+
+@case('rolling_implied')
+def rolling_implied_case(scale):
+    from implied_volatility import rolling_implied
+    close = synthetic.ohlc(1200 + 60 + 100 * scale)['close']
+    shibor = synthetic.shibor(close.index)
+    return lambda: rolling_implied(close, shibor)
+
+@case('rolling_hedge')
+def rolling_hedge_case(scale):
+    from implied_volatility import rolling_hedge
+    close = synthetic.ohlc(61 + 20 * scale, sigma=0.2)['close']
+    shibor = synthetic.shibor(close.index)
+    return lambda: rolling_hedge(close, shibor)
+
+@case('mc_paths')
+def mc_paths_case(scale):
+    from phoenix import mc_paths
+    random.seed(0)
+    return lambda: mc_paths(100, 0.3, 3, 0.04, 10000 * scale)
+
+@case('phoenix_value')
+def phoenix_value_case(scale):
+    from phoenix import mc_paths, phoenix_value
+    random.seed(0)
+    paths = mc_paths(100, 0.3, 3, 0.04, 10000 * scale)
+    return lambda: phoenix_value(paths, 3, 101, 85, 0.015)
+
+@case('phoenix_delta')
+def phoenix_delta_case(scale):
+    from phoenix import mc_paths, phoenix_delta
+    random.seed(0)
+    paths = mc_paths(100, 0.3, 3, 0.04, 10000 * scale)
+    return lambda: phoenix_delta(paths, 3, 101, 85, 0.015)
+
+@case('vix_new:batch')
+def vix_new_batch_case(scale):
+    from VIX_batch import vix_batch
+    chain, close = synthetic.option_chain(1000 * scale)
+    shibor = synthetic.shibor(close['date'])
+    return lambda: vix_batch(chain, shibor['shibor_3M'])
+
+@case('vix_new:term')
+def vix_new_term_case(scale):
+    '''所有到期日的方差和5个固定期限的插值'''
+    from VIX_batch import constant_maturity
+    chain, close = synthetic.option_chain(1000 * scale)
+    shibor = synthetic.shibor(close['date'])
+    return lambda: constant_maturity(chain, shibor['shibor_3M'])
+
+@case('vix_new:loop')
+def vix_new_loop_case(scale):
+    '''逐日使用Vix类，作为批量计算的对照'''
+    from VIX_new import Vix
+    chain, close = synthetic.option_chain(100 * scale)
+    def run():
+        VIX = {}
+        for date, data_t in chain.groupby('date'):
+            pair = []
+            for flag in ('last1', 'last2'):
+                data_last = data_t[data_t['T_days'] == data_t[flag]]
+                data_last = data_last.set_index('strike', drop=False)
+                pair.append(Vix(data_last['T_days'].iloc[0],
+                                data_last['strike'], data_last['call'],
+                                data_last['put'], 0.03))
+            VIX[date] = pair[0].volatility(pair[1])
+        return VIX
+    return run
+
+@case('vix_old')
+def vix_old_case(scale):
+    import pandas as pd
+    from VIX_old import select_nearest, implied_vols, whaley_vix
+    chain, close = synthetic.option_chain(1000 * scale)
+    shibor = synthetic.shibor(close['date']).reset_index()
+    data = pd.merge(chain, shibor, on='date', how='left')
+    data = pd.merge(data, close, on='date', how='left')
+    return lambda: whaley_vix(implied_vols(select_nearest(data)))
+
+def measure(name, scale=1, repeat=5):
+    '''
+    准备数据后先运行一次预热（导入、缓存等一次性的开销不计入），
+    再运行repeat次
+    Returns:
+        耗时的中位数和中位数绝对偏差（秒）
+    '''
+    run = CASES[name](scale)
+    run()
+    times = []
+    for i in range(max(repeat, 1)):
+        t0 = perf_counter()
+        run()
+        times.append(perf_counter() - t0)
+    median = statistics.median(times)
+    return median, statistics.median(abs(t - median) for t in times)
+
+def load_baseline(path=BASELINE):
+    '''读取保存的基准，不存在时返回空的基准'''
+    if not os.path.exists(path):
+        return {'scale': None, 'results': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def regressed(seconds, spread, base, threshold=0.2, noise=0.005):
+    '''
+    耗时的中位数超过基准(1 + threshold)倍，且多出的时间超过噪声时记为回退；
+    噪声取noise秒和本次计时的3倍中位数绝对偏差中较大的一个，
+    避免很短的测试或负载波动较大的机器上的误报
+    '''
+    return seconds > base * (1 + threshold) + max(noise, 3 * spread)
+
+def report(results, baseline, threshold=0.2, noise=0.005):
+    '''
+    打印与基准的比较，见regressed
+    Args:
+        results:
+            测试名称为键，(中位数, 中位数绝对偏差)为值
+    Returns:
+        回退的测试名称列表
+    '''
+    regressions = []
+    print('%-34s %10s %10s %7s' % ('benchmark', 'seconds', 'baseline', 'ratio'))
+    for name, (seconds, spread) in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print('%-34s %10.4f %10s %7s' % (name, seconds, '-', '-'))
+            continue
+        ratio = seconds / base
+        flag = ''
+        if regressed(seconds, spread, base, threshold, noise):
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('%-34s %10.4f %10.4f %7.2f%s' % (name, seconds, base, ratio, flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='性能测试')
+    parser.add_argument('--only', default='',
+                        help='只运行名称包含该字符串的测试')
+    parser.add_argument('--scale', type=int, default=1, help='数据规模的倍数')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='每个测试计时的次数，取中位数')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='允许比基准慢的比例')
+    parser.add_argument('--noise', type=float, default=0.005,
+                        help='比基准多出的时间不超过该秒数时不记为回退')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='保存为新的基准')
+    args = parser.parse_args(argv)
+
+    names = [name for name in CASES if args.only in name]
+    results = {name: measure(name, args.scale, args.repeat) for name in names}
+    baseline = load_baseline(args.baseline)
+    if baseline['scale'] not in (None, args.scale):
+        print('基准的scale为%s，与本次不同，不做比较' % baseline['scale'])
+        baseline = {'scale': None, 'results': {}}
+    # 超出基准的测试再计时一次（次数加倍），两次都超出才记为回退
+    for name in names:
+        base = baseline['results'].get(name)
+        if base is not None and regressed(*results[name], base,
+                                          args.threshold, args.noise):
+            again = measure(name, args.scale, 2 * args.repeat)
+            results[name] = min(results[name], again)
+    regressions = report(results, baseline, args.threshold, args.noise)
+    if args.save:
+        saved = load_baseline(args.baseline)
+        if saved['scale'] != args.scale:
+            saved = {'scale': args.scale, 'results': {}}
+        saved['results'].update({name: seconds
+                                 for name, (seconds, spread) in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+    return 1 if regressions and not args.save else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+检查volopt轻量模块的导入耗时，保证进程池的工作进程和命令行调用启动得快：
+每个模块在新的进程中导入，耗时为导入numpy之后再导入该模块的时间，取多次中的最小值；
+同时检查导入后没有加载scipy, pandas, matplotlib。超出预算时返回非零的退出码
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget 30 --repeat 7
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['volopt', 'volopt.core', 'volopt.estimators', 'volopt.autocall',
+           'volopt.telemetry', 'volopt.plotting']
+HEAVY = ['scipy', 'pandas', 'matplotlib']
+
+PROBE = '''
+import json, sys
+from time import perf_counter
+t0 = perf_counter()
+import numpy
+t1 = perf_counter()
+import %s
+t2 = perf_counter()
+print(json.dumps({'numpy': t1 - t0, 'module': t2 - t1,
+                  'heavy': [m for m in %r if m in sys.modules]}))
+'''
+
+def measure(module, repeat=5):
+    '''
+    在新进程中导入模块repeat次
+    Returns:
+        导入numpy的最短耗时、导入模块的最短耗时（毫秒）以及被加载的重量级模块
+    '''
+    runs = []
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE % (module, HEAVY)],
+                             cwd=ROOT, capture_output=True, text=True,
+                             check=True)
+        runs.append(json.loads(out.stdout))
+    return (min(r['numpy'] for r in runs) * 1000,
+            min(r['module'] for r in runs) * 1000,
+            sorted(set(m for r in runs for m in r['heavy'])))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导入耗时检查')
+    parser.add_argument('--budget', type=float, default=20,
+                        help='导入numpy之外允许的耗时，毫秒')
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块的进程数')
+    args = parser.parse_args(argv)
+
+    failed = False
+    print('%-20s %10s %10s  %s' % ('module', 'numpy ms', 'module ms', 'heavy'))
+    for module in MODULES:
+        numpy_ms, module_ms, heavy = measure(module, args.repeat)
+        over = module_ms > args.budget or heavy
+        failed = failed or over
+        print('%-20s %10.1f %10.1f  %s%s' % (module, numpy_ms, module_ms,
+                                            ','.join(heavy) or '-',
+                                            '  FAIL' if over else ''))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+性能测试用的模拟数据，所有函数都以seed为随机数种子，相同参数得到相同的数据
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+def trading_dates(n, start='2005-01-04'):
+    '''n个交易日，按工作日近似'''
+    return pd.bdate_range(start, periods=n, name='date')
+
+def ohlc(n, S0=1000, sigma=0.3, seed=0, start='2005-01-04'):
+    '''
+    模拟中证500指数的OHLC日数据
+    Args:
+        n:
+            交易日数
+        sigma:
+            年化波动率
+    Returns:
+        以日期为索引，包含open, high, low, close列的DataFrame
+    '''
+    rng = np.random.default_rng(seed)
+    dt = 1 / 240
+    gap = sigma * np.sqrt(dt) * 0.3 * rng.standard_normal(n) #隔夜收益
+    body = sigma * np.sqrt(dt) * rng.standard_normal(n) #日内收益
+    close = S0 * np.exp(np.cumsum(gap + body))
+    open = close * np.exp(-body)
+    spread = np.abs(sigma * np.sqrt(dt) * rng.standard_normal((2, n))) / 2
+    high = np.maximum(open, close) * np.exp(spread[0])
+    low = np.minimum(open, close) * np.exp(-spread[1])
+    return pd.DataFrame({'open': open, 'high': high, 'low': low,
+                         'close': close}, index=trading_dates(n, start))
+
+def shibor(dates, level=0.035, seed=0):
+    '''
+    模拟3个月Shibor，以日期为索引，列名shibor_3M，与shibor_3M.xlsx相同
+    '''
+    rng = np.random.default_rng(seed)
+    steps = 0.0005 * rng.standard_normal(len(dates))
+    rate = np.clip(level + np.cumsum(steps), 0.01, 0.08)
+    return pd.DataFrame({'shibor_3M': rate}, index=pd.DatetimeIndex(dates,
+                                                                    name='date'))
+
+def expiries(date):
+    '''
+    50ETF期权的到期日：当月、下月及随后两个季月的第四个星期三，
+    当月合约已到期时从下月开始算
+    '''
+    first = pd.Timestamp(date.year, date.month, 1)
+    wednesday = pd.offsets.WeekOfMonth(week=3, weekday=2)
+    expire = lambda k: first + pd.DateOffset(months=k) + wednesday
+    k = 0 if expire(0) >= date else 1
+    months = [k, k + 1]
+    k += 2
+    while len(months) < 4:
+        if ((date.month - 1 + k) % 12 + 1) % 3 == 0: #季月
+            months.append(k)
+        k += 1
+    return [expire(k) for k in months]
+
+def option_chain(n_days, n_strikes=20, S0=2.5, sigma=0.25, r=0.03, seed=0,
+                 start='2015-02-09'):
+    '''
+    模拟50ETF期权的日数据，格式与VIX_data_clean.py的结果相同
+    Args:
+        n_days:
+            交易日数
+        n_strikes:
+            每个到期日的执行价个数
+    Returns:
+        chain:
+            包含date, expire, strike, call, put, T_days, last1, last2列的DataFrame
+        close:
+            包含date, close列的标的收盘价
+    '''
+    rng = np.random.default_rng(seed)
+    dates = trading_dates(n_days, start)
+    S = S0 * np.exp(np.cumsum(sigma / np.sqrt(240)
+                              * rng.standard_normal(n_days)))
+    rows = []
+    for date, s in zip(dates, S):
+        center = np.round(s / 0.05) * 0.05
+        strikes = np.round(center + 0.05 * (np.arange(n_strikes)
+                                            - n_strikes // 2), 2)
+        for expire in expiries(date):
+            rows.append((np.full(n_strikes, date.value),
+                         np.full(n_strikes, expire.value), strikes,
+                         np.full(n_strikes, s)))
+    date, expire, strike, spot = (np.concatenate(x) for x in zip(*rows))
+    T_days = (expire - date) // (86400 * 10**9)
+    T = np.maximum(T_days, 0.01) / 365 #到期日当天的期权按很短的期限定价
+    vol = sigma * (1 + 0.5 * (np.log(strike / spot)) ** 2) #波动率微笑
+    d1 = (np.log(spot / strike) + (r + 0.5 * vol**2) * T) / (vol * np.sqrt(T))
+    d2 = d1 - vol * np.sqrt(T)
+    call = spot * ndtr(d1) - strike * np.exp(-r * T) * ndtr(d2)
+    put = call - spot + strike * np.exp(-r * T)
+    noise = 1 + 0.01 * rng.uniform(-1, 1, (2, len(call)))
+    chain = pd.DataFrame({
+        'date': pd.to_datetime(date), 'expire': pd.to_datetime(expire),
+        'strike': strike, 'call': np.maximum(call * noise[0], 1e-4),
+        'put': np.maximum(put * noise[1], 1e-4), 'T_days': T_days})
+    #近月合约到期期限必须大于7天
+    valid = chain[chain['T_days'] > 7]
+    terms = valid.groupby('date')['T_days'].unique().apply(np.sort)
+    chain['last1'] = chain['date'].map(terms.str[0])
+    chain['last2'] = chain['date'].map(terms.str[1])
+    close = pd.DataFrame({'date': dates, 'close': S})
+    return chain, close
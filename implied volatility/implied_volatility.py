@@ -6,10 +6,10 @@ Created on Sat Sep 22 16:12:39 2018
 """
 
 from math import exp, log, sqrt
-from scipy.stats import norm
 from collections import defaultdict
-from scipy.optimize import brentq
 #from scipy.optimize import fsolve
+from volopt import telemetry
+from volopt.core import norm_cdf, norm_pdf #不必导入scipy.stats
 
 def bs_value(S0, K, r, sigma, T):
     '''
@@ -30,14 +30,14 @@ def bs_value(S0, K, r, sigma, T):
     '''
     d1 = (log(S0 / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt(T))
     d2 = d1 - sigma * sqrt(T)
-    return S0 * norm.cdf(d1) - K * exp(-r * T) * norm.cdf(d2)           
+    return S0 * norm_cdf(d1) - K * exp(-r * T) * norm_cdf(d2)           
 
 def bs_vega(S0, K, r, sigma, T):
     '''
     计算期权的vega
     '''
     d1 = (log(S0 / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt(T))
-    return S0 * norm.pdf(d1) * sqrt(T)
+    return S0 * norm_pdf(d1) * sqrt(T)
 
 def pseudo_mc(close, n, M=1200):
     '''
@@ -68,12 +68,26 @@ def implied(close, r, sigma=0.5, S0=1, K=1, T=0.25, days=240, M=1200, N=50):
     '''
     n = int(T * days)
     price = pseudo_mc(close, n, M) / (1 + r * T)
+    track = telemetry.enabled
+    needed = N # 误差首次小于1e-8时的迭代次数，只在记录时统计
     for i in range(N):
         value = bs_value(S0, K, r, sigma, T)
+        if track and needed == N and abs(value - price) < 1e-8:
+            needed = i
         vega = bs_vega(S0, K, r, sigma, T)
         sigma -= (value - price) / vega
+    if track:
+        error = abs(bs_value(S0, K, r, sigma, T) - price)
+        # 总是迭代N次，每次计算价格和vega，最后检查误差时再计算一次价格
+        telemetry.record('solver', 'implied_volatility.implied', method='newton',
+                         iterations=needed, max_iterations=N,
+                         function_calls=2 * N + 1, error=error)
+        if not error < 1e-8: # 包括nan
+            telemetry.record('nonconvergence', 'implied_volatility.implied',
+                             r=r, price=price, sigma=sigma, error=error)
     return sigma
     
+@telemetry.timed()
 def rolling_implied(close, shibor, sigma=0.5, S0=1, K=1, T=0.25, days=240, 
                     M=1200, N=50):
     '''
@@ -95,7 +109,7 @@ def rolling_implied(close, shibor, sigma=0.5, S0=1, K=1, T=0.25, days=240,
             r = shibor.loc[date, 'shibor_3M']
         else:
             r = 0.03
-        iv[date] = implied(close_i, r, sigma, S0, K, T, days, M, N)
+        iv[date] = implied(close_i.values, r, sigma, S0, K, T, days, M, N)
     return iv
     
 def hedge_cost(close, r, sigma, T=0.25, days=240):
@@ -105,7 +119,7 @@ def hedge_cost(close, r, sigma, T=0.25, days=240):
     n = int(T * days)
     S0 = K = close[0]
     d1_0 = (log(S0 / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt(T))
-    delta_0 = norm.cdf(d1_0)
+    delta_0 = norm_cdf(d1_0)
     cash_0 = S0 * delta_0 * (1 + r / days)
     d = defaultdict(list)
     d['delta'].append(delta_0); d['cash'].append(cash_0)
@@ -116,7 +130,7 @@ def hedge_cost(close, r, sigma, T=0.25, days=240):
         else:
             d1_i = (log(close[i] / K) + (r + 0.5 * sigma**2) * T_i)\
                  / (sigma * sqrt(T_i))
-            delta_i = norm.cdf(d1_i)
+            delta_i = norm_cdf(d1_i)
         trade_i = delta_i - d['delta'][i-1]
         cash_i = (d['cash'][i -1] + trade_i * close[i]) * (1 + r / days)
         d['delta'].append(delta_i); d['cash'].append(cash_i)        
@@ -128,14 +142,14 @@ def equation(sigma, close=None, shibor=None, T=0.25):
     建立以sigma为未知数的对冲成本与期权价格的方程
     value(sigma) - price(sigma) = 0
     '''
-    S0 = K = close[0]
+    S0 = K = close.iloc[0]
     date = close.index[0]
     if date in shibor.index:
         r = shibor.loc[date, 'shibor_3M']
     else:
         r = 0.03
     value = bs_value(S0, K, T, r, sigma)
-    price = hedge_cost(close, r, sigma)
+    price = hedge_cost(close.values, r, sigma) # 按位置取价格
     return value - price
 
 def solve(func, close, shibor):
@@ -149,8 +163,30 @@ def solve(func, close, shibor):
         对冲隐含波动率
     '''
 #    return fsolve(func, 0.3, args=(close, shibor))[0]
-    return brentq(func, 0.05, 1, args=(close, shibor))
+    from scipy.optimize import brentq #只在求解时导入scipy
+    if not telemetry.enabled:
+        return brentq(func, 0.05, 1, args=(close, shibor))
+    try:
+        root, result = brentq(func, 0.05, 1, args=(close, shibor),
+                              full_output=True, disp=False)
+    except ValueError: # 区间两端函数值同号，没有解
+        telemetry.record('nonconvergence', 'implied_volatility.solve',
+                         method='brentq', date=close.index[0],
+                         reason='no sign change in [0.05, 1]')
+        raise
+    telemetry.record('solver', 'implied_volatility.solve', method='brentq',
+                     iterations=result.iterations,
+                     function_calls=result.function_calls,
+                     converged=result.converged)
+    if not result.converged: # 与不记录时一样报错，不返回没有收敛的解
+        telemetry.record('nonconvergence', 'implied_volatility.solve',
+                         method='brentq', date=close.index[0], root=root,
+                         reason=result.flag)
+        raise RuntimeError('Failed to converge after %d iterations, value is %s'
+                           % (result.iterations, root))
+    return root
 
+@telemetry.timed()
 def rolling_hedge(close, shibor, T=0.25, days=240):
     '''
     返回对冲隐含波动率序列
@@ -167,10 +203,11 @@ def rolling_hedge(close, shibor, T=0.25, days=240):
 if __name__ == '__main__':
     import pandas as pd
     import matplotlib.pyplot as plt
+    from volopt.data import read_excel #数据目录通过环境变量VOLOPT_DATA设定
     
-    zz500 = pd.read_excel('e:/data/zz500.xlsx')
+    zz500 = read_excel('zz500.xlsx')
     zz500.set_index(pd.to_datetime(zz500['date']), inplace=True)
-    shibor = pd.read_excel('E:/data/shibor_3M.xlsx', index_col='date')
+    shibor = read_excel('shibor_3M.xlsx', index_col='date')
 
     close = zz500['close']
     # 以第一种方法计算的隐含波动率
@@ -10,7 +10,9 @@ Created on Sun Sep 23 20:47:07 2018
 from random import uniform
 from math import sqrt, log, cos, pi
 from collections import defaultdict
+from time import perf_counter
 import numpy as np
+from volopt import telemetry
 
 def std_norm(n):
     '''
@@ -44,12 +46,18 @@ def mc_paths(S0, sigma, n, r=0.04, M=50000, days=20):
     Returns:
         (n+1) * M的numpy二维数组
     '''
+    t0 = perf_counter()
     dt = 1 / (12 * days)
     paths = np.zeros((n*days + 1, M))
     paths[0] = S0
     for i in range(1, n*days + 1):
         paths[i] = paths[i-1] * np.exp((r - 0.5 * sigma**2) * dt + sigma
                                        * sqrt(dt) * np.array(std_norm(M)))
+    if telemetry.enabled:
+        seconds = perf_counter() - t0
+        telemetry.record('simulation', 'phoenix.mc_paths', paths=M,
+                         steps=n * days, seconds=seconds,
+                         paths_per_sec=M / seconds)
     return paths
 
 def phoenix_pl(path, n, upper, lower, coupon, r=0.04, days=20):
@@ -88,6 +96,7 @@ def phoenix_pl(path, n, upper, lower, coupon, r=0.04, days=20):
     else:
         return interest
 
+@telemetry.timed()
 def phoenix_value(paths, n, upper, lower, coupon, r=0.04, days=20):
     '''
     通过取所有路径期末损益的均值，贴现回期初即为期权的价格
@@ -102,6 +111,7 @@ def phoenix_value(paths, n, upper, lower, coupon, r=0.04, days=20):
           for i in range(M))
     return sum(PL) / M / (1 + r * n/12)
 
+@telemetry.timed()
 def phoenix_delta(paths, n, upper, lower, coupon, r=0.04, days=20, point=0.01):
     '''
     delta = 期权价格变化/标的价格变化
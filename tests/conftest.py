@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+'''
+测试共用的设置：各专题目录和benchmarks中的模拟数据加入sys.path
+'''
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
+
+from volopt import add_script_dirs
+add_script_dirs()
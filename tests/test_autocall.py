@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+'''
+凤凰期权的向量化定价与phoenix.py中逐条路径的计算比较
+'''
+
+import numpy as np
+import pytest
+
+import phoenix
+from volopt import autocall
+from volopt.daycount import TradingCalendar
+
+ARGS = dict(n=6, upper=1.05, lower=0.8, coupon=0.01)
+
+@pytest.fixture(scope='module')
+def paths():
+    return autocall.mc_paths(1.0, 0.3, 6, M=2000, seed=4)
+
+def test_mc_paths(paths):
+    assert paths.shape == (6 * 20 + 1, 2000)
+    np.testing.assert_array_equal(paths[0], 1.0)
+    np.testing.assert_array_equal(autocall.mc_paths(1.0, 0.3, 6, M=2000,
+                                                    seed=4), paths)
+    # 每步的对数收益率的均值和标准差
+    steps = np.diff(np.log(paths), axis=0)
+    dt = 1 / 240
+    assert steps.std() == pytest.approx(0.3 * np.sqrt(dt), rel=0.01)
+    assert steps.mean() == pytest.approx((0.04 - 0.045) * dt,
+                                         abs=5 * 0.3 * np.sqrt(dt / steps.size))
+
+def test_pl_matches_loop(paths):
+    expected = [phoenix.phoenix_pl(paths[:, i], **ARGS)
+                for i in range(paths.shape[1])]
+    np.testing.assert_allclose(autocall.phoenix_pl(paths, **ARGS), expected,
+                               rtol=1e-12)
+    assert autocall.phoenix_pl(paths[:, 7], **ARGS) == \
+        pytest.approx(expected[7], rel=1e-12)
+
+def test_value_and_delta_match_loop(paths):
+    assert autocall.phoenix_value(paths, **ARGS) == \
+        pytest.approx(phoenix.phoenix_value(paths, **ARGS), rel=1e-12)
+    assert autocall.phoenix_delta(paths, **ARGS) == \
+        pytest.approx(phoenix.phoenix_delta(paths, **ARGS), rel=1e-10)
+
+def test_schedule_of_equal_months(paths):
+    '''每月的观察日间隔相同时，与默认的每月days个交易日相同'''
+    schedule = 20 * np.arange(1, 7)
+    np.testing.assert_array_equal(
+        autocall.phoenix_pl(paths, schedule=schedule, **ARGS),
+        autocall.phoenix_pl(paths, **ARGS))
+
+def test_calendar_schedule():
+    calendar = TradingCalendar(np.arange('2018-01-01', '2018-12-31',
+                                         dtype='datetime64[D]')[::2])
+    values, deltas = autocall.phoenix(1.0, [0.3], [3], 1.05, 0.8, 0.01, M=500,
+                                      seed=0, calendar=calendar,
+                                      start='2018-03-01')
+    assert np.isfinite(values[3][0.3]) and np.isfinite(deltas[3][0.3])
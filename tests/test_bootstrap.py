@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+自助法置信区间：重抽样的位置、由对数比值重建价格，以及每个日期独立的重抽样
+'''
+
+import numpy as np
+import pytest
+
+import synthetic
+from volopt import bootstrap
+from volopt.estimators import rolling_array
+
+@pytest.mark.parametrize('method', ['stationary', 'block'])
+def test_resample_indices(method):
+    idx = bootstrap.resample_indices(50, 200, block=5, method=method, rng=0)
+    assert idx.shape == (200, 50)
+    assert idx.min() >= 0 and idx.max() < 50
+    # 块内的位置循环地连续
+    steps = np.diff(idx, axis=1) % 50
+    assert (steps == 1).mean() > 0.7
+    if method == 'block':
+        assert np.all(steps[:, np.arange(49) % 5 != 4] == 1)
+
+def test_rebuild_round_trip():
+    prices = synthetic.ohlc(40, seed=1)
+    arrays = [prices[k].to_numpy() for k in ('open', 'high', 'low', 'close')]
+    rebuilt = bootstrap.rebuild(bootstrap.log_ratios(*arrays))
+    scale = arrays[3][0]
+    for x, y in zip(rebuilt[1:], arrays[1:]):
+        np.testing.assert_allclose(x[1:] * scale, y[1:], rtol=1e-12)
+    # 与价格水平无关，波动率与原序列相同
+    np.testing.assert_allclose(rolling_array('yang_zhang', 20, *rebuilt),
+                               rolling_array('yang_zhang', 20, *arrays),
+                               rtol=1e-10)
+
+def test_dates_are_resampled_independently():
+    '''窗口内的交易日完全相同的两个日期，重抽样的结果也不同'''
+    prices = synthetic.ohlc(40, seed=1)
+    ratios = bootstrap.log_ratios(*(prices[k].to_numpy()
+                                    for k in ('open', 'high', 'low', 'close')))
+    same = np.repeat(ratios[None, :20], 2, axis=0)
+    result = bootstrap._bands(same, ['realized'], 20, 200, 5, 'stationary',
+                              [0.025, 0.5, 0.975], 240,
+                              np.random.default_rng(0))
+    q, std = result['realized']
+    assert std[0] != std[1]
+    assert np.all(q[0] < q[2])
+
+def test_confidence_bands_reproducible():
+    prices = synthetic.ohlc(80, seed=2)
+    kw = {k: prices[k] for k in ('open', 'high', 'low', 'close')}
+    a = bootstrap.confidence_bands(20, models=['parkinson'], B=100, chunk=7,
+                                   jobs=1, seed=5, **kw)
+    b = bootstrap.confidence_bands(20, models=['parkinson'], B=100, chunk=7,
+                                   jobs=3, seed=5, **kw)
+    assert a.equals(b)
+    assert len(a) == 80 - 20 and a.index[-1] == prices.index[-1]
+    vol = rolling_array('parkinson', 20, *kw.values())[-len(a):]
+    assert np.mean((a[('parkinson', 'lower')] <= vol)
+                   & (vol <= a[('parkinson', 'upper')])) > 0.8
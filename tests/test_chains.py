@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+期权数据的紧凑存储：保存后读取与原数据相同，按日期范围切片，缺失的到期日保存为-1
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from volopt.chains import ChainStore, near_expiries, write_store
+
+@pytest.fixture(scope='module')
+def chain():
+    chain, close = synthetic.option_chain(12, n_strikes=6, seed=9)
+    chain = chain.drop(columns=['last1', 'last2'])
+    # 最后两个交易日只保留两个到期日，last3缺失
+    dates = chain['date'].unique()
+    first_two = chain.groupby('date')['expire'].transform(
+        lambda x: x.rank(method='dense') <= 2)
+    chain = chain[~chain['date'].isin(dates[-2:]) | first_two]
+    return near_expiries(chain).reset_index(drop=True)
+
+@pytest.fixture
+def store(chain, tmp_path):
+    write_store(chain, str(tmp_path / 'chain'))
+    return ChainStore(str(tmp_path / 'chain'))
+
+def test_near_expiries(chain):
+    day = chain[chain['date'] == chain['date'].iloc[0]]
+    terms = np.sort(day.loc[day['T_days'] > 7, 'T_days'].unique())
+    assert list(day[['last1', 'last2', 'last3']].iloc[0]) == list(terms[:3])
+    last = chain[chain['date'] == chain['date'].iloc[-1]]
+    assert (last['last3'] == -1).all() and (last['last1'] > 7).all()
+
+def test_round_trip(chain, store):
+    loaded = store.load()
+    assert len(loaded) == len(chain)
+    assert loaded['call'].dtype == np.float32
+    assert loaded['last3'].dtype == np.int16
+    assert loaded['date'].dtype == 'datetime64[ns]'
+    expected = chain.sort_values(['date', 'expire', 'strike'],
+                                 kind='mergesort').reset_index(drop=True)
+    for column in ('date', 'expire', 'T_days', 'last1', 'last2', 'last3'):
+        np.testing.assert_array_equal(loaded[column].to_numpy(),
+                                      expected[column].to_numpy())
+    np.testing.assert_allclose(loaded['strike'], expected['strike'],
+                               rtol=1e-12)
+    np.testing.assert_allclose(loaded['call'], expected['call'], rtol=1e-6)
+    pd.testing.assert_index_equal(store.dates, pd.DatetimeIndex(
+        expected['date'].unique()))
+
+def test_missing_days_are_minus_one(chain, tmp_path):
+    '''VIX_data_clean的结果中缺失的到期日为nan，保存为-1而不是0'''
+    cleaned = chain.astype({'last3': float})
+    cleaned.loc[cleaned['last3'] == -1, 'last3'] = np.nan
+    write_store(cleaned, str(tmp_path / 'nan'))
+    loaded = ChainStore(str(tmp_path / 'nan')).load()
+    np.testing.assert_array_equal(loaded['last3'].to_numpy(),
+                                  chain['last3'].to_numpy())
+    assert (loaded['last3'] != 0).all()
+
+def test_date_range(chain, store):
+    dates = store.dates
+    part = store.load(dates[3], dates[6])
+    assert list(part['date'].unique()) == list(dates[3:7])
+    assert len(part) == chain['date'].isin(dates[3:7]).sum()
+    # 起始日为周日，不是交易日
+    part = store.load(dates[5] - pd.Timedelta(days=1), dates[5])
+    assert list(part['date'].unique()) == [dates[5]]
+    assert len(store.load(end=dates[0])) == (chain['date'] == dates[0]).sum()
+
+def test_out_of_range_is_empty(store):
+    dates = store.dates
+    for start, end in ((dates[-1] + pd.Timedelta(days=1), None),
+                       (None, dates[0] - pd.Timedelta(days=1)),
+                       (dates[5], dates[2])):
+        part = store.load(start, end)
+        assert len(part) == 0
+        assert list(part.columns) == list(store.load().columns)
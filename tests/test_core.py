@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+'''
+core中的正态分布和B-S公式与scipy的结果比较，以及导入volopt时不加载重的依赖
+'''
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from volopt.core import bs_value, implied_vol, norm_cdf, norm_pdf
+
+def test_norm_cdf_matches_scipy():
+    x = np.concatenate([np.linspace(-40, 40, 20001), [0.0, -7.0710678, 37.5]])
+    np.testing.assert_allclose(norm_cdf(x), norm.cdf(x), rtol=1e-13,
+                               atol=1e-16)
+    for v in (-8.5, -1.0, 0.0, 0.3, 6.0):
+        assert norm_cdf(v) == pytest.approx(norm.cdf(v), rel=1e-13)
+
+def test_norm_pdf_matches_scipy():
+    x = np.linspace(-10, 10, 101)
+    np.testing.assert_allclose(norm_pdf(x), norm.pdf(x), rtol=1e-14)
+    assert norm_pdf(0.7) == pytest.approx(norm.pdf(0.7), rel=1e-14)
+
+@pytest.mark.parametrize('method', ['newton', 'bisect'])
+def test_implied_vol_round_trip(method):
+    K = np.array([2.2, 2.4, 2.5, 2.6, 2.8])
+    sigma = np.array([0.18, 0.22, 0.25, 0.28, 0.32])
+    for kind in ('call', 'put'):
+        price = bs_value(2.5, K, 0.03, sigma, 0.2, kind)
+        result = implied_vol(price, 2.5, K, 0.03, 0.2, kind, method=method)
+        np.testing.assert_allclose(result, sigma, rtol=1e-8)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.parametrize('module', ['volopt', 'volopt.core',
+                                    'volopt.estimators', 'volopt.autocall',
+                                    'volopt.telemetry'])
+def test_import_stays_light(module):
+    '''与benchmarks/import_budget.py相同：导入后没有加载pandas, scipy, matplotlib'''
+    code = ('import json, sys; import %s; print(json.dumps([m for m in '
+            '("pandas", "scipy", "matplotlib") if m in sys.modules]))' % module)
+    env = dict(os.environ, VOLOPT_TELEMETRY='')
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+volopt.data的按列缓存：读取结果与pd.read_excel相同，数值列以内存映射方式读取
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from volopt import data
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOLOPT_DATA', str(tmp_path))
+    monkeypatch.delenv('VOLOPT_CACHE', raising=False)
+    frame = pd.DataFrame({
+        'date': pd.bdate_range('2018-01-01', periods=30).strftime('%Y-%m-%d'),
+        'close': np.linspace(1, 2, 30),
+        'volume': np.arange(30, dtype=float),
+        'change': ['--'] + list(np.round(np.linspace(-1, 1, 29), 2)),
+        'time': pd.bdate_range('2018-01-01', periods=30)})
+    frame.to_excel(tmp_path / 'prices.xlsx', index=False)
+    return 'prices.xlsx'
+
+def materialized(frame):
+    '''内存映射的列转换为普通数组，便于与pd.read_excel的结果比较'''
+    frame = frame.copy()
+    for column in frame.columns:
+        if isinstance(frame[column].to_numpy(), np.memmap):
+            frame[column] = np.array(frame[column].to_numpy())
+    return frame
+
+def test_read_matches_read_excel(source):
+    expected = pd.read_excel(data.source_path(source))
+    for hit in (False, True): # 第一次转换，第二次读取缓存
+        result = data.read_excel(source)
+        pd.testing.assert_frame_equal(materialized(result), expected)
+    assert result['date'].dtype == expected['date'].dtype
+
+def test_index_col(source):
+    expected = pd.read_excel(data.source_path(source), index_col='date')
+    result = data.read_excel(source, index_col='date')
+    pd.testing.assert_frame_equal(materialized(result), expected)
+
+def test_numeric_columns_are_memory_mapped(source, monkeypatch):
+    cols, index = data.columns(source)
+    assert isinstance(cols['close'], np.memmap)
+    loaded = {}
+    def spy(*args, **kwargs):
+        result = columns(*args, **kwargs)
+        loaded.update(result[0])
+        return result
+    columns = data.columns
+    monkeypatch.setattr(data, 'columns', spy)
+    frame = data.read_excel(source)
+    if int(pd.__version__.split('.')[0]) >= 3:
+        assert np.shares_memory(frame['close'].to_numpy(), loaded['close'])
+
+def test_source_change_invalidates_cache(source, tmp_path):
+    data.read_excel(source)
+    frame = pd.read_excel(tmp_path / source)
+    frame.loc[0, 'close'] = 100.0
+    frame.to_excel(tmp_path / source, index=False)
+    assert data.read_excel(source)['close'].iloc[0] == 100.0
+
+def test_lost_race_keeps_fresh_cache(source):
+    '''其他进程已经写入了有效的缓存时，不删除它，使用其manifest'''
+    cols, index = data.columns(source)
+    directory = data.cache_dir(source, 'excel', {})
+    winner = data.read_manifest(directory)
+    mtime = os.stat(os.path.join(directory, '0.npy')).st_mtime_ns
+    frame = pd.DataFrame({'other': [1.0, 2.0]})
+    manifest = data.write_cache(frame, directory, dict(winner['source']))
+    assert manifest == winner
+    assert os.stat(os.path.join(directory, '0.npy')).st_mtime_ns == mtime
+    assert sorted(os.listdir(os.path.dirname(directory))) == \
+        [os.path.basename(directory)]
+    # 已有的缓存过期时才替换
+    stale = dict(winner['source'], sha1='0' * 40)
+    manifest = data.write_cache(frame, directory, stale)
+    assert data.read_manifest(directory) == manifest
+    assert [c['name'] for c in manifest['columns']] == ['other']
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+交易日历：交易日数、月末观察日的规则，数据之外按工作日的外推，以及实例不被缓存引用
+'''
+
+import numpy as np
+import pytest
+
+from volopt.daycount import TradingCalendar, calendar_days
+
+@pytest.fixture(scope='module')
+def calendar():
+    days = np.arange('2018-01-01', '2018-12-31', dtype='datetime64[D]')
+    holidays = np.array(['2018-10-01', '2018-10-02', '2018-10-03'],
+                        dtype='datetime64[D]')
+    return TradingCalendar(days[np.is_busday(days, holidays=holidays)])
+
+def test_trading_days(calendar):
+    assert calendar.trading_days('2018-09-28', '2018-10-08') == 3
+    assert calendar_days(np.array(['2018-09-28'], dtype='datetime64[D]'),
+                         np.array(['2018-10-08'], dtype='datetime64[D]'))[0] == 10
+    # 数据之后按工作日外推
+    assert calendar.trading_days('2018-12-28', '2019-01-04') == 5
+    assert calendar.offset('2018-09-28', 1) == np.datetime64('2018-10-04')
+    assert calendar.offset('2018-12-28', 3) == np.datetime64('2019-01-02')
+
+def test_month_ends_start_in_month(calendar):
+    '''start所在月份还剩至少min_gap个交易日时，第一个观察日为当月月末'''
+    ends = calendar.month_ends('2018-09-03', 3)
+    np.testing.assert_array_equal(ends, np.array(
+        ['2018-09-28', '2018-10-31', '2018-11-30'], dtype='datetime64[D]'))
+    np.testing.assert_array_equal(calendar.schedule('2018-09-03', 3),
+                                  [19, 39, 61])
+
+def test_month_ends_late_start(calendar):
+    '''start所在月份剩下的交易日不足min_gap个时，从下个月开始'''
+    ends = calendar.month_ends('2018-09-20', 2)
+    np.testing.assert_array_equal(ends, np.array(
+        ['2018-10-31', '2018-11-30'], dtype='datetime64[D]'))
+    np.testing.assert_array_equal(
+        calendar.month_ends('2018-09-20', 2, min_gap=5),
+        np.array(['2018-09-28', '2018-10-31'], dtype='datetime64[D]'))
+
+def test_month_ends_beyond_data(calendar):
+    '''交易日历到2018-12-28为止，之后的月末取工作日'''
+    ends = calendar.month_ends('2018-11-01', 4)
+    np.testing.assert_array_equal(ends, np.array(
+        ['2018-11-30', '2018-12-31', '2019-01-31', '2019-02-28'],
+        dtype='datetime64[D]'))
+
+def test_start_before_data(calendar):
+    with pytest.raises(ValueError):
+        calendar.month_ends('2017-12-15', 3)
+
+def test_year_fraction(calendar):
+    assert calendar.year_fraction('2018-01-02', '2018-04-02') == \
+        pytest.approx(90 / 365)
+    start = np.array(['2018-01-02'], dtype='datetime64[D]')
+    end = np.array(['2018-04-02'], dtype='datetime64[D]')
+    assert calendar.year_fraction(start, end, 'bus/240')[0] == \
+        calendar.trading_days(start, end)[0] / 240
+    with pytest.raises(ValueError):
+        calendar.year_fraction(start, end, 'act/360')
+
+def test_year_days():
+    days = np.arange('2017-06-01', '2020-03-01', dtype='datetime64[D]')
+    calendar = TradingCalendar(days[np.is_busday(days)])
+    full = [np.busday_count('%d-01-01' % y, '%d-01-01' % (y + 1))
+            for y in (2018, 2019)]
+    assert calendar.year_days() == np.mean(full)
+    assert calendar.year_fraction('2018-01-02', '2018-04-02', 'bus') == \
+        pytest.approx(calendar.trading_days('2018-01-02', '2018-04-02')
+                      / np.mean(full))
+    assert TradingCalendar(days[:100]).year_days() == 240.0
+
+def test_calendar_is_released():
+    '''year_fraction的缓存属于实例，不会让用过的日历一直留在内存中'''
+    import gc
+    import weakref
+    days = np.arange('2018-01-01', '2018-03-01', dtype='datetime64[D]')
+    calendar = TradingCalendar(days)
+    calendar.year_days()
+    calendar.year_fraction('2018-01-02', '2018-02-02', 'bus')
+    ref = weakref.ref(calendar)
+    del calendar
+    gc.collect()
+    assert ref() is None
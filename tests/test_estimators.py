@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+'''
+向量化的波动率与volatility.py中逐个窗口的计算比较
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+import volatility
+from volopt import estimators
+from volopt.estimators import MODELS
+
+@pytest.fixture(scope='module')
+def prices():
+    return synthetic.ohlc(150, seed=3)
+
+def kwargs(prices):
+    return {k: prices[k] for k in ('open', 'high', 'low', 'close')}
+
+@pytest.mark.parametrize('model', MODELS)
+def test_rolling_matches_loop(prices, model):
+    expected = pd.Series(volatility.rolling_volatility(model, 20,
+                                                       **kwargs(prices)))
+    result = estimators.rolling(model, 20, **kwargs(prices))
+    pd.testing.assert_index_equal(result.index, expected.index,
+                                  check_names=False)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(),
+                               rtol=1e-10)
+
+@pytest.mark.parametrize('model', MODELS)
+def test_volatility_matches_loop(prices, model):
+    date, expected = volatility.volatility(model, **kwargs(prices[:60]))
+    result = estimators.volatility(model, **kwargs(prices[:60]))
+    assert result == pytest.approx(expected, rel=1e-10)
+
+def test_rolling_batches(prices):
+    '''前面的维度为多组价格时，与逐组计算相同'''
+    arrays = [np.stack([prices[k].to_numpy(), prices[k].to_numpy()[::-1]])
+              for k in ('open', 'high', 'low', 'close')]
+    batched = estimators.rolling_array('yang_zhang', 30, *arrays)
+    for i in range(2):
+        np.testing.assert_allclose(batched[i], estimators.rolling_array(
+            'yang_zhang', 30, *(a[i] for a in arrays)), rtol=1e-12)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+'''
+流水线：环节的指纹在数据文件、参数、模块源代码或上游指纹变化时改变，
+输入没有变化时从缓存读取结果而不运行环节
+'''
+
+import multiprocessing
+import os
+
+import pytest
+
+from volopt import pipeline
+
+def run_base(inputs, params):
+    '''读取数据文件中的数，记录一次运行'''
+    with open(params['log'], 'a') as f:
+        f.write('base\n')
+    with open(os.path.join(os.environ['VOLOPT_DATA'], 'x.txt')) as f:
+        return float(f.read()) * params['scale']
+
+def run_double(inputs, params):
+    with open(params['log'], 'a') as f:
+        f.write('double\n')
+    return 2 * inputs['base']
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOLOPT_DATA', str(tmp_path))
+    monkeypatch.setenv('VOLOPT_CACHE', str(tmp_path / 'cache'))
+    (tmp_path / 'x.txt').write_text('3')
+    (tmp_path / 'toy_module.py').write_text('VERSION = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    log = str(tmp_path / 'log.txt')
+    stages = {'double': pipeline.stage(run_double, deps=['base'],
+                                       params={'log': log}),
+              'base': pipeline.stage(run_base, sources=['x.txt'],
+                                     modules=['toy_module'],
+                                     params={'log': log, 'scale': 1})}
+    monkeypatch.setattr(pipeline, 'STAGES', stages)
+
+    def runs():
+        '''上次调用以来运行过的环节'''
+        if not os.path.exists(log):
+            return []
+        with open(log) as f:
+            names = sorted(f.read().split())
+        os.remove(log)
+        return names
+    return stages, runs
+
+def result(name='double'):
+    keys = {}
+    for n in pipeline.resolve([name]):
+        keys[n] = pipeline.stage_key(n, keys)
+    return pipeline.load_result(name, keys[name])
+
+def test_resolve_orders_dependencies(stages):
+    assert pipeline.resolve(['double']) == ['base', 'double']
+    assert pipeline.resolve([]) == ['base', 'double']
+    with pytest.raises(KeyError):
+        pipeline.resolve(['missing'])
+
+JOBS = [1] + ([2] if multiprocessing.get_start_method() == 'fork' else [])
+
+@pytest.mark.parametrize('jobs', JOBS)
+def test_cache(stages, tmp_path, monkeypatch, jobs):
+    stages, runs = stages
+    status = pipeline.run(jobs=jobs)
+    assert [status[n][0] for n in ('base', 'double')] == ['done', 'done']
+    assert runs() == ['base', 'double'] and result() == 6.0
+
+    # 没有变化时从缓存读取，不运行
+    status = pipeline.run(jobs=jobs)
+    assert [status[n][0] for n in ('base', 'double')] == ['cached', 'cached']
+    assert runs() == []
+
+    # force时重新运行
+    pipeline.run(jobs=jobs, force=True)
+    assert runs() == ['base', 'double']
+
+    # 数据文件、模块源代码或参数变化时，该环节和下游都重新运行
+    (tmp_path / 'x.txt').write_text('4')
+    pipeline.run(jobs=jobs)
+    assert runs() == ['base', 'double'] and result() == 8.0
+    (tmp_path / 'toy_module.py').write_text('VERSION = 2\n')
+    pipeline.run(jobs=jobs)
+    assert runs() == ['base', 'double']
+    base = stages['base']
+    monkeypatch.setitem(stages, 'base', base._replace(
+        params=dict(base.params, scale=10)))
+    pipeline.run(jobs=jobs)
+    assert runs() == ['base', 'double'] and result() == 80.0
+
+    # 只有下游的参数变化时，上游从缓存读取
+    double = stages['double']
+    monkeypatch.setitem(stages, 'double', double._replace(
+        params=dict(double.params, note='v2')))
+    status = pipeline.run(jobs=jobs)
+    assert status['base'][0] == 'cached' and runs() == ['double']
+
+def test_dependency_key_changes(stages):
+    stages, runs = stages
+    key = pipeline.stage_key('double', {'base': 'a' * 16})
+    assert key != pipeline.stage_key('double', {'base': 'b' * 16})
+    assert key == pipeline.stage_key('double', {'base': 'a' * 16})
+
+def test_missing_source_skips_downstream(stages, tmp_path):
+    stages, runs = stages
+    os.remove(tmp_path / 'x.txt')
+    status = pipeline.run()
+    assert status['base'][0] == 'missing' and status['double'][0] == 'skipped'
+    assert runs() == []
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+结果序列的增量存储：追加新日期、修正中间某天的输入后的重新计算，与整段计算相同
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from volopt import series, telemetry
+from volopt.estimators import rolling
+
+WINDOW = 10
+
+def rolling_close(data):
+    '''滚动的已实现波动率，每个结果用到前WINDOW个交易日'''
+    return rolling('realized', WINDOW, close=data['close'])
+
+def daily(data):
+    '''每个日期的结果只取决于当日的输入'''
+    return np.log(data['high'] / data['low'])
+
+@pytest.fixture
+def prices():
+    return synthetic.ohlc(60, seed=6)
+
+@pytest.fixture
+def computed():
+    telemetry.enable()
+    telemetry.clear()
+    yield lambda: [r['computed'] for r in telemetry.records('series')]
+    telemetry.disable()
+    telemetry.clear()
+
+def test_append(prices, tmp_path, computed):
+    args = ('rv', {'window': WINDOW})
+    first = series.update(*args, prices[:40], rolling_close, before=WINDOW,
+                          root=tmp_path)
+    pd.testing.assert_series_equal(first, rolling_close(prices[:40]),
+                                   check_names=False, check_index_type=False,
+                                   check_freq=False)
+    result = series.update(*args, prices, rolling_close, before=WINDOW,
+                           root=tmp_path)
+    expected = rolling_close(prices)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(),
+                               rtol=1e-12)
+    assert (result.index == expected.index).all()
+    assert computed() == [40 - WINDOW, 20]
+    pd.testing.assert_series_equal(series.load(*args, root=tmp_path)['value']
+                                   .rename(None), result)
+
+def test_correction(prices, tmp_path, computed):
+    args = ('rv', {'window': WINDOW})
+    series.update(*args, prices, rolling_close, before=WINDOW, root=tmp_path)
+    corrected = prices.copy()
+    corrected.iloc[30, corrected.columns.get_loc('close')] *= 1.02
+    result = series.update(*args, corrected, rolling_close, before=WINDOW,
+                           root=tmp_path)
+    np.testing.assert_allclose(result.to_numpy(),
+                               rolling_close(corrected).to_numpy(), rtol=1e-12)
+    assert computed()[-1] == 60 - 30
+    assert result.index.is_unique
+
+def test_pointwise_correction(prices, tmp_path, computed):
+    '''只重新计算修正的日期；compute多返回的日期不会造成重复'''
+    args = ('range', {})
+    series.update(*args, prices, daily, pointwise=True, root=tmp_path)
+    corrected = prices.copy()
+    corrected.iloc[[3, 30], corrected.columns.get_loc('high')] *= 1.01
+    # 像分段计算一样返回修正日期之间的所有日期
+    span = lambda data: daily(corrected[data.index[0]: data.index[-1]])
+    result = series.update(*args, corrected, span, pointwise=True,
+                           root=tmp_path)
+    assert result.index.is_unique and len(result) == 60
+    np.testing.assert_allclose(result.to_numpy(), daily(corrected).to_numpy(),
+                               rtol=1e-12)
+    assert computed() == [60, 2]
+    assert series.load(*args, root=tmp_path).index.is_unique
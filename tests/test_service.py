@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+'''
+定价服务：批量隐含波动率与core的结果比较，phoenix和vix的批量结果与单独计算一致，
+参数有误或计算出错的请求不影响同一批次的其他请求
+'''
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from volopt import service
+from volopt.core import bs_value
+
+IV = {'S': 2.5, 'K': 2.4, 'r': 0.03, 'T_days': 30}
+
+def test_iv_batch_puts_use_parity():
+    sigma = [0.2, 0.3, 0.25]
+    kinds = ['call', 'put', 'put']
+    requests = [dict(IV, kind=k, price=float(bs_value(2.5, 2.4, 0.03, s,
+                                                       30 / 365, k)))
+                for s, k in zip(sigma, kinds)]
+    np.testing.assert_allclose(service.iv_batch(requests), sigma, rtol=1e-8)
+
+def test_params_are_checked():
+    assert service.iv_params(dict(IV, price=1)) == dict(IV, price=1.0,
+                                                         kind='call')
+    for bad in ([1], dict(IV), dict(IV, price='abc'), dict(IV, price=0.1,
+                                                          kind='straddle')):
+        with pytest.raises(ValueError):
+            service.iv_params(bad)
+    with pytest.raises(ValueError):
+        service.phoenix_params({'S0': 1, 'sigma': 0.2, 'n': 1.5, 'upper': 1.05,
+                                'lower': 0.8, 'coupon': 0.01})
+    with pytest.raises(ValueError):
+        service.vix_params({'r': 0.03, 'quotes': [{'T_days': 30}]})
+
+def run_service(coroutine):
+    async def main():
+        svc = service.PricingService(window=0.01, workers=1)
+        try:
+            return await coroutine(svc)
+        finally:
+            svc.close()
+    return asyncio.run(main())
+
+def test_bad_request_only_fails_itself():
+    price = float(bs_value(2.5, 2.4, 0.03, 0.25, 30 / 365))
+    async def batch(svc):
+        requests = [{'id': 0, 'method': 'iv', 'params': dict(IV, price=price)},
+                    {'id': 1, 'method': 'iv', 'params': dict(IV)},
+                    {'id': 2, 'method': 'iv', 'params': dict(IV, price='x')},
+                    {'id': 3, 'method': 'iv', 'params': dict(IV, price=price)}]
+        return await asyncio.gather(*(svc.handle(q) for q in requests))
+    responses = run_service(batch)
+    assert responses[0]['result'] == pytest.approx(0.25)
+    assert responses[3]['result'] == pytest.approx(0.25)
+    assert responses[0]['latency']['batch'] == 2
+    assert 'missing parameter' in responses[1]['error']
+    assert 'number' in responses[2]['error']
+
+def test_failed_batch_is_retried_one_by_one():
+    async def run(requests):
+        if any(q < 0 for q in requests):
+            raise ValueError('negative')
+        return [2 * q for q in requests]
+    async def main():
+        batcher = service.Batcher('double', run, window=0.01)
+        return await asyncio.gather(*(batcher.submit(q) for q in (1, -1, 3)))
+    results = [result for result, latency in asyncio.run(main())]
+    assert results[0] == 2 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+
+def test_non_object_json_gets_an_error():
+    async def session(svc):
+        server = await asyncio.start_server(svc._client, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for line in ('[1]', 'not json', json.dumps({'id': 5,
+                                                    'method': 'stats'})):
+            writer.write(line.encode() + b'\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for i in range(3)]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return responses
+    responses = run_service(session)
+    assert sum('error' in r for r in responses) == 2
+    assert [r['id'] for r in responses if 'result' in r] == [5]
+
+PHOENIX = {'S0': 1.0, 'sigma': 0.25, 'n': 3, 'upper': 1.05, 'lower': 0.8,
+           'coupon': 0.01, 'M': 2000, 'seed': 3}
+
+def test_delta_flag():
+    assert service.phoenix_params(dict(PHOENIX, delta='false'))['delta'] is False
+    assert service.phoenix_params(dict(PHOENIX, delta=True))['delta'] is True
+    assert service.phoenix_params(PHOENIX)['delta'] is True
+    for bad in ('no', 0, None, [True]):
+        with pytest.raises(ValueError):
+            service.phoenix_params(dict(PHOENIX, delta=bad))
+
+def test_phoenix_batch():
+    from volopt.autocall import mc_paths, phoenix_delta, phoenix_value
+    requests = [dict(PHOENIX), dict(PHOENIX, upper=1.1, delta='false'),
+                dict(PHOENIX, sigma=0.3), dict(PHOENIX, delta='maybe'),
+                {k: v for k, v in PHOENIX.items() if k != 'upper'}]
+    async def batch(svc):
+        return await asyncio.gather(*(svc.handle({'id': i, 'method': 'phoenix',
+                                                  'params': q})
+                                      for i, q in enumerate(requests)))
+    responses = run_service(batch)
+    for i in range(3):
+        q = service.phoenix_params(requests[i])
+        paths = mc_paths(q['S0'], q['sigma'], q['n'], q['r'], q['M'],
+                         q['days'], seed=q['seed'])
+        terms = (q['n'], q['upper'], q['lower'], q['coupon'], q['r'], q['days'])
+        result = responses[i]['result']
+        assert result['value'] == pytest.approx(phoenix_value(paths, *terms),
+                                                rel=1e-12)
+        if q['delta']:
+            assert result['delta'] == pytest.approx(
+                phoenix_delta(paths, *terms), rel=1e-12)
+        else:
+            assert 'delta' not in result
+        assert responses[i]['latency']['batch'] == 3
+    assert 'delta should be' in responses[3]['error']
+    assert 'missing parameter: upper' in responses[4]['error']
+
+def vix_quotes(T_days, S=2.5, r=0.03, sigma=0.25):
+    return [{'T_days': T, 'strike': K,
+             'call': float(bs_value(S, K, r, sigma, T / 365)),
+             'put': float(bs_value(S, K, r, sigma, T / 365, 'put'))}
+            for T in T_days for K in (2.3, 2.4, 2.5, 2.6, 2.7)]
+
+def test_vix_batch_and_isolation():
+    requests = [{'r': 0.03, 'quotes': vix_quotes([20, 50])},
+                {'r': 0.03, 'quotes': vix_quotes([20])}, # 只有一个到期日
+                {'r': 0.03, 'quotes': [{'T_days': 'x'}]},
+                {'r': 0.02, 'quotes': vix_quotes([15, 45], sigma=0.3)}]
+    async def batch(svc):
+        return await asyncio.gather(*(svc.handle({'id': i, 'method': 'vix',
+                                                  'params': q})
+                                      for i, q in enumerate(requests)))
+    responses = run_service(batch)
+    for i in (0, 3):
+        alone = service.vix_batch([service.vix_params(requests[i])])[0]
+        assert responses[i]['result'] == pytest.approx(alone, rel=1e-12)
+        assert responses[i]['latency']['batch'] == 3
+    assert responses[1]['result'] is None
+    assert 'T_days' in responses[2]['error']
+    assert responses[3]['result'] > responses[0]['result']
+
+def test_vix_failure_is_isolated(monkeypatch):
+    '''参数正确但计算出错的请求只让自己失败'''
+    batch = service.vix_batch
+    def fragile(requests):
+        if any(q['r'] < 0 for q in requests):
+            raise ZeroDivisionError('negative rate')
+        return batch(requests)
+    monkeypatch.setattr(service, 'vix_batch', fragile)
+    requests = [{'r': 0.03, 'quotes': vix_quotes([20, 50])},
+                {'r': -0.01, 'quotes': vix_quotes([20, 50])}]
+    async def run(svc):
+        return await asyncio.gather(*(svc.handle({'id': i, 'method': 'vix',
+                                                  'params': q})
+                                      for i, q in enumerate(requests)))
+    responses = run_service(run)
+    assert responses[0]['result'] > 0
+    assert responses[1]['error'].startswith('ZeroDivisionError')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+'''
+运行记录：装饰器保留函数的元数据，求解器记录实际需要的迭代次数，
+开启记录不改变计算结果，进程内的记录条数有上限
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.optimize
+
+import implied_volatility
+import synthetic
+from volopt import telemetry
+from VIX_old import IV
+
+@pytest.fixture
+def records():
+    telemetry.enable()
+    telemetry.clear()
+    yield telemetry.records
+    telemetry.disable()
+    telemetry.clear()
+
+def test_timed_keeps_metadata(records):
+    @telemetry.timed('demo')
+    def f(x, y=1):
+        '''文档'''
+        return x + y
+
+    assert f.__name__ == 'f' and f.__doc__ == '文档'
+    assert f.__wrapped__(1) == 2
+    assert f(1, y=2) == 3
+    assert [r['name'] for r in records('stage')] == ['demo']
+
+def test_newton_iterations(records):
+    S, K, r, T = 2.5, np.array([2.3, 2.5, 2.7]), 0.03, 36.5
+    price = IV(S, K, r, T, 0).bs_value(np.array([0.2, 0.25, 0.3]))
+    sigma = IV(S, K, r, T, price).newton(N=50)
+    np.testing.assert_allclose(sigma, [0.2, 0.25, 0.3])
+    solver, = records('solver')
+    assert solver['max_iterations'] == 50
+    assert 0 < solver['iterations'] < 50
+    # 少于实际需要的迭代次数时不收敛，记录的迭代次数为上限
+    telemetry.clear()
+    IV(S, K, r, T, price).newton(N=solver['iterations'] - 1)
+    solver, = records('solver')
+    assert solver['failures'] > 0
+    assert solver['iterations'] == solver['max_iterations']
+
+def test_implied_unchanged_by_telemetry(records):
+    close = synthetic.ohlc(400, seed=1)['close'].to_numpy()
+    telemetry.disable()
+    expected = implied_volatility.implied(close, 0.03, M=300, N=30)
+    telemetry.enable()
+    assert implied_volatility.implied(close, 0.03, M=300, N=30) == expected
+    solver, = records('solver')
+    assert solver['function_calls'] == 2 * 30 + 1
+    assert solver['iterations'] < solver['max_iterations'] == 30
+
+def test_solve_raises_when_not_converged(records, monkeypatch):
+    '''brentq不收敛时，开启记录与否都报错，而不是返回没有收敛的解'''
+    def brentq(f, a, b, args=(), full_output=False, disp=True):
+        if disp:
+            raise RuntimeError('Failed to converge after 100 iterations')
+        result = scipy.optimize.RootResults(0.3, 100, 101, -2, method='brentq')
+        return 0.3, result
+    monkeypatch.setattr(scipy.optimize, 'brentq', brentq)
+    close = pd.Series([1.0, 1.1], index=pd.bdate_range('2018-01-01', periods=2))
+    for enabled in (False, True):
+        telemetry.enable() if enabled else telemetry.disable()
+        with pytest.raises(RuntimeError):
+            implied_volatility.solve(lambda x, c, s: x - 0.3, close, None)
+    assert records('nonconvergence')[0]['name'] == 'implied_volatility.solve'
+
+def test_records_are_bounded():
+    telemetry.enable(max_records=5)
+    try:
+        for i in range(20):
+            telemetry.record('stage', 'demo', i=i)
+        assert [r['i'] for r in telemetry.records()] == list(range(15, 20))
+    finally:
+        telemetry.enable()
+        telemetry.disable()
+        telemetry.clear()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+VIX_batch与逐日使用VIX_new.Vix的结果比较，以及期限结构的插值
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from VIX_batch import (constant_maturity, interpolate_variance, sigma2_batch,
+                       term_structure, vix_batch)
+from VIX_new import Vix
+
+@pytest.fixture(scope='module')
+def chain():
+    return synthetic.option_chain(40, n_strikes=12, seed=1)[0]
+
+def vix_loop(chain, r):
+    '''与VIX_new.py相同的逐日计算'''
+    VIX = {}
+    for date, data_t in chain.groupby('date'):
+        pair = []
+        for flag in ('last1', 'last2'):
+            data_last = data_t[data_t['T_days'] == data_t[flag]]
+            data_last = data_last.set_index('strike', drop=False)
+            pair.append(Vix(data_last['T_days'].iloc[0], data_last['strike'],
+                            data_last['call'], data_last['put'], r))
+        VIX[date] = pair[0].volatility(pair[1])
+    return pd.Series(VIX)
+
+def test_vix_batch_matches_loop(chain):
+    expected = vix_loop(chain, 0.03)
+    result = vix_batch(chain, 0.03)
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(),
+                               rtol=1e-12)
+
+def test_rate_series_aligned_by_date(chain):
+    dates = chain['date'].unique()
+    r = pd.Series(np.linspace(0.02, 0.04, len(dates)), index=dates)
+    result = vix_batch(chain, r)
+    day = chain[chain['date'] == dates[5]]
+    expected = vix_loop(day, r.iloc[5])
+    assert result.iloc[5] == pytest.approx(expected.iloc[0], rel=1e-12)
+
+def test_single_strike_group_is_nan(chain):
+    dates = chain['date'].unique()
+    expires = chain.loc[chain['date'] == dates[3], 'expire'].unique()
+    # 第4个交易日的最后一个到期日只保留一个执行价
+    one = (chain['date'] == dates[3]) & (chain['expire'] == expires[-1])
+    drop = one & (chain['strike'] != chain.loc[one, 'strike'].iloc[0])
+    reduced = chain[~drop]
+    s2 = sigma2_batch(reduced, 0.03)
+    assert np.isnan(s2.loc[(dates[3], expires[-1]), 'sigma2'])
+    # 其他组不受影响
+    full = sigma2_batch(chain, 0.03).drop(index=(dates[3], expires[-1]))
+    np.testing.assert_allclose(
+        s2.drop(index=(dates[3], expires[-1]))['sigma2'].to_numpy(),
+        full['sigma2'].to_numpy(), rtol=1e-12)
+
+def valid_terms(chain, min_days=7):
+    '''每个交易日剩余期限大于min_days的到期日的(T_days, sigma2)，按期限排序'''
+    s2 = term_structure(chain, 0.03)
+    s2 = s2[s2['T_days'] > min_days].reset_index()
+    return {date: g.sort_values('T_days')[['T_days', 'sigma2']].to_numpy()
+            for date, g in s2.groupby('date')}
+
+def test_term_structure_columns(chain):
+    s2 = term_structure(chain, 0.03)
+    np.testing.assert_allclose(s2['variance'], s2['sigma2'] * s2['T_days']
+                               / 365)
+    np.testing.assert_allclose(s2['vix'], 100 * np.sqrt(s2['sigma2']))
+
+def test_30_days_matches_vix_batch(chain):
+    '''30天不超过次近月时，固定期限的30天指数就是VIX'''
+    terms = valid_terms(chain)
+    inside = [d for d, t in terms.items() if t[1, 0] >= 30]
+    assert len(inside) > 20
+    result = constant_maturity(chain, 0.03, targets=[30])[30]
+    expected = vix_batch(chain, 0.03)
+    np.testing.assert_allclose(result[inside].to_numpy(),
+                               expected[inside].to_numpy(), rtol=1e-12)
+
+def near_next(T1, s1, T2, s2, target):
+    '''VIX的近月、次近月插值公式，目标期限为target天'''
+    w = (s1 * T1 * (T2 - target) + s2 * T2 * (target - T1)) / (T2 - T1)
+    return w / target
+
+@pytest.mark.parametrize('target', [12, 25, 40])
+def test_interpolation_matches_formula(chain, target):
+    s2 = sigma2_batch(chain, 0.03)
+    result = interpolate_variance(s2, [target])[target]
+    for date, t in valid_terms(chain).items():
+        j = np.clip(np.searchsorted(t[:, 0], target), 1, len(t) - 1)
+        (T1, s1), (T2, s2_) = t[j - 1], t[j]
+        assert result[date] == pytest.approx(
+            near_next(T1, s1, T2, s2_, target), rel=1e-12)
+
+def test_extrapolation_modes(chain):
+    s2 = sigma2_batch(chain, 0.03)
+    terms = valid_terms(chain)
+    targets = [3, 1000]
+    linear = interpolate_variance(s2, targets)
+    flat = interpolate_variance(s2, targets, extrapolate='flat')
+    none = interpolate_variance(s2, targets, extrapolate=None)
+    for date, t in terms.items():
+        (T1, s1), (T2, s2_) = t[0], t[1]
+        assert linear.loc[date, 3] == pytest.approx(
+            near_next(T1, s1, T2, s2_, 3), rel=1e-12)
+        (Ta, sa), (Tb, sb) = t[-2], t[-1]
+        assert linear.loc[date, 1000] == pytest.approx(
+            near_next(Ta, sa, Tb, sb, 1000), rel=1e-12)
+        assert flat.loc[date, 3] == pytest.approx(s1, rel=1e-12)
+        assert flat.loc[date, 1000] == pytest.approx(sb, rel=1e-12)
+    assert none.isna().all().all()
+    with pytest.raises(ValueError):
+        interpolate_variance(s2, targets, extrapolate='cubic')
+
+def test_dates_without_valid_expiry_are_nan(chain):
+    '''没有剩余期限大于min_days的到期日的交易日保留在结果中，为nan'''
+    s2 = sigma2_batch(chain, 0.03)
+    dates = s2.index.get_level_values('date')
+    s2.loc[dates == dates.unique()[4], 'T_days'] = 5
+    s2.loc[dates == dates.unique()[9], 'sigma2'] = np.nan
+    result = interpolate_variance(s2, [30, 60])
+    pd.testing.assert_index_equal(result.index, pd.DatetimeIndex(
+        dates.unique(), name='date'))
+    assert result.iloc[[4, 9]].isna().all().all()
+    assert result.drop(index=dates.unique()[[4, 9]]).notna().all().all()
+    # 所有交易日都没有有效到期日
+    s2['T_days'] = 5
+    assert interpolate_variance(s2, [30]).isna().all().all()
+    assert len(interpolate_variance(s2, [30])) == len(dates.unique())
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+'''
+VIX_live的增量计算与VIX_new.Vix的完整计算比较，以及逐条报价时不完整的报价
+'''
+
+import math
+import random
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from VIX_live import LiveVix, replay, synthetic_quotes
+from VIX_new import Vix
+
+START = datetime(2018, 9, 21, 9, 30)
+EXPIRES = [datetime(2018, 9, 26, 15), datetime(2018, 10, 24, 15),
+           datetime(2018, 12, 26, 15), datetime(2019, 3, 27, 15)]
+STRIKES = [round(2.0 + 0.05 * i, 2) for i in range(20)]
+
+def full(live, time, r=0.03):
+    '''由当前的报价完整计算的Vix'''
+    ks = live.strikes
+    return Vix(live.T_days(time), pd.Series(ks, index=ks),
+               pd.Series(live.calls)[ks], pd.Series(live.puts)[ks], r)
+
+def test_live_matches_full_calculation():
+    quotes = list(synthetic_quotes(START, EXPIRES, STRIKES, n=5000, seed=2))
+    engine = LiveVix(0.03)
+    values, latency = replay(quotes, engine)
+    time = quotes[-1][0]
+    for expire in EXPIRES:
+        live = engine.expiries[expire]
+        assert live.sigma2(0.03, time) == pytest.approx(
+            full(live, time).sigma2(), rel=1e-9)
+    near, nxt = engine.near_next(time)
+    expected = full(near, time).volatility(full(nxt, time))
+    assert values[-1][1] == pytest.approx(expected, rel=1e-9)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_partial_books_one_quote_at_a_time(seed):
+    # 初始报价打乱顺序逐条到达，各到期日只有部分执行价时方差可能为负
+    quotes = list(synthetic_quotes(START, EXPIRES, STRIKES, n=0))
+    random.Random(seed).shuffle(quotes)
+    engine = LiveVix(0.03)
+    for time, expire, strike, call, put in quotes:
+        vix = engine.update(START, expire, strike, call, put)
+        assert math.isnan(vix) or vix > 0
+    assert vix > 0 # 报价完整后有值
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+'''
+VIX_old的向量化计算与原来逐日、逐个标记选择期权的计算比较
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from VIX_old import IV, implied_vols, moneyness, select_nearest, whaley_vix
+
+@pytest.fixture(scope='module')
+def data():
+    chain, close = synthetic.option_chain(30, n_strikes=12, seed=2)
+    close = close.copy()
+    # 三个交易日的收盘价低于所有执行价，这些交易日没有实值期权
+    low = chain.groupby('date')['strike'].min() - 0.01
+    no_itm = close['date'].isin(low.index[[4, 11, 20]])
+    close.loc[no_itm, 'close'] = low.reindex(close.loc[no_itm, 'date'])\
+                                    .to_numpy()
+    shibor = synthetic.shibor(close['date']).reset_index()
+    data = pd.merge(chain, shibor, on='date', how='left')
+    return pd.merge(data, close, on='date', how='left')
+
+def whaley_loop(data, M_days=30):
+    '''原来的算法：逐日选出每个标记最接近平价的期权，没有实值期权时不选'''
+    flags = [('otm', 'last1'), ('otm', 'last2'), ('itm', 'last1'),
+             ('itm', 'last2')]
+    VIX = {}
+    for date, d in data.groupby('date'):
+        vols, spread, T = {}, {}, {}
+        for lf in ('last1', 'last2'):
+            e = moneyness(d[d['T_days'] == d[lf]].copy())
+            T[lf] = e['T_days'].iloc[0]
+            for vf, column in (('otm', 'k_close'), ('itm', 'close_k')):
+                best = e[column].min()
+                if vf == 'itm' and best == e['close'].iloc[0]:
+                    vols[(vf, lf)] = np.nan
+                    spread.setdefault(vf, np.nan)
+                    continue
+                row = e[e[column] == best].iloc[0]
+                args = (row['close'], row['strike'], row['shibor_3M'],
+                        row['T_days'])
+                call = IV(*args, row['call']).newton()
+                put = IV(*args, row['put'])
+                put = put.newton() if vf == 'otm' else put.bisect()
+                vols[(vf, lf)] = np.nanmean([call, put])\
+                                 if not np.isnan([call, put]).all() else np.nan
+                spread.setdefault(vf, best)
+        otm_weight = spread['itm'] / (spread['otm'] + spread['itm'])
+        itm_weight = spread['otm'] / (spread['otm'] + spread['itm'])
+        vol1 = vols[flags[0]] * otm_weight + vols[flags[2]] * itm_weight
+        vol2 = vols[flags[1]] * otm_weight + vols[flags[3]] * itm_weight
+        T1, T2 = T['last1'], T['last2']
+        vix = vol1 * (T2 - M_days) / (T2 - T1) + vol2 * (M_days - T1) / (T2 - T1)
+        if np.isnan(vix):
+            available = [vols[f] for f in flags if not np.isnan(vols[f])]
+            vix = np.mean(available) if available else np.nan
+        VIX[date] = vix
+    return pd.Series(VIX)
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_whaley_vix_matches_loop(data):
+    expected = whaley_loop(data)
+    result = whaley_vix(implied_vols(select_nearest(data)))['VIX']
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(),
+                               rtol=1e-10)
+
+def test_no_itm_dates_fall_back_to_mean(data):
+    selected = select_nearest(data)
+    result = whaley_vix(implied_vols(selected))
+    dates = data.loc[data['close'] < data.groupby('date')['strike']
+                     .transform('min'), 'date'].unique()
+    assert len(dates) == 3
+    assert not ((selected['value_flag'] == 'itm')
+                & selected['date'].isin(dates)).any()
+    rows = result.loc[dates]
+    assert rows[[('itm', 'last1'), ('itm', 'last2')]].isna().all().all()
+    expected = rows[[('otm', 'last1'), ('otm', 'last2')]].mean(axis=1)
+    np.testing.assert_allclose(rows['VIX'].to_numpy(), expected.to_numpy())
+
+def fsolve_put(S, K, r, T_days, price):
+    '''原来逐个期权用fsolve求解实值期权看跌价格的隐含波动率'''
+    iv = IV(S, K, r, T_days, price)
+    root = iv.solve()
+    converged = root > 0 and abs(iv.equation(root)) < 1e-10
+    return root, converged
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_bisect_matches_fsolve(data):
+    '''
+    实值期权的看跌价格由fsolve改为二分法求解：fsolve收敛到正的解时两者之差
+    小于1e-8；二分法为nan时（价格超出B-S价格的范围），fsolve也没有得到有效的解
+    '''
+    selected = select_nearest(data)
+    itm = selected[selected['value_flag'] == 'itm']
+    S = itm['close'].to_numpy(dtype=float)
+    K = itm['strike'].to_numpy(dtype=float)
+    r = itm['shibor_3M'].to_numpy(dtype=float)
+    T_days = itm['T_days'].to_numpy(dtype=float)
+    price = itm['put'].to_numpy(dtype=float)
+    # 加上深度实值的看跌期权：执行价远高于标的价格，价格接近内在价值
+    deep = 2.5 * np.array([1.1, 1.2, 1.3, 1.5])
+    S = np.append(S, np.full(4, 2.5))
+    K = np.append(K, deep)
+    r = np.append(r, np.full(4, 0.03))
+    T_days = np.append(T_days, [20, 45, 80, 120])
+    price = np.append(price, deep - 2.5 + 0.01)
+    bisect = IV(S, K, r, T_days, price).bisect()
+    compared = []
+    for i in range(len(S)):
+        root, converged = fsolve_put(S[i], K[i], r[i], T_days[i], price[i])
+        if np.isnan(bisect[i]):
+            assert not converged
+        elif converged:
+            assert bisect[i] == pytest.approx(root, abs=1e-8)
+            compared.append(i)
+    assert len(compared) > len(S) // 2
+    assert set(range(len(S) - 4, len(S))) <= set(compared)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+多个标的的VIX的增量更新：修正历史中间的某几天后，分段计算的结果不产生重复的日期，
+只读取和计算修正过的日期
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from volopt import vix
+from volopt.chains import ChainStore, write_store
+from VIX_batch import vix_batch
+
+@pytest.fixture
+def spec(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOLOPT_DATA', str(tmp_path))
+    monkeypatch.delenv('VOLOPT_CACHE', raising=False)
+    chain, close = synthetic.option_chain(40, n_strikes=8, seed=7)
+    write_store(chain, str(tmp_path / 'chain'))
+    close.to_excel(tmp_path / 'close.xlsx', index=False)
+    synthetic.shibor(close['date']).reset_index()\
+             .to_excel(tmp_path / 'shibor_3M.xlsx', index=False)
+    return {'chain': 'chain', 'close': 'close.xlsx'}
+
+def test_shards():
+    days = pd.bdate_range('2018-01-01', periods=20)
+    runs = vix.shards(days[[2, 3, 4, 9, 15, 16]], days, 2)
+    assert runs == [[(days[2], days[4])], [(days[9], days[9]),
+                                           (days[15], days[16])]]
+    # 全部日期时每段是一个连续区间
+    assert vix.shards(days, days, 3) == [[(days[0], days[6])],
+                                         [(days[7], days[13])],
+                                         [(days[14], days[19])]]
+    assert vix.shards(days[:0], days, 3) == []
+
+def test_mid_history_correction(spec, tmp_path, monkeypatch):
+    loaded = []
+    shard = vix.vix_shard
+    def counting(spec, method, runs):
+        loaded.extend(runs)
+        return shard(spec, method, runs)
+    monkeypatch.setattr(vix, 'vix_shard', counting)
+    with ThreadPoolExecutor(2) as pool:
+        first = vix.update('test', spec, 'new', pool, 1)
+        assert len(first) == 40 and first.index.is_unique
+
+        chain = ChainStore(str(tmp_path / 'chain')).load()
+        chain['call'] = chain['call'].astype(float)
+        dates = chain['date'].unique()
+        fix = chain['date'].isin(dates[[3, 30]])
+        chain.loc[fix, 'call'] *= 1.05
+        write_store(chain, str(tmp_path / 'chain'))
+        loaded.clear()
+        result = vix.update('test', spec, 'new', pool, 1)
+
+    assert result.index.is_unique and len(result) == 40
+    expected = vix_batch(ChainStore(str(tmp_path / 'chain')).load(),
+                         vix._rate(spec))
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(),
+                               rtol=1e-12)
+    changed = result.index[result.to_numpy() != first.to_numpy()]
+    assert list(changed) == list(pd.DatetimeIndex(dates[[3, 30]]))
+    # 中间没有修正的日期不读取
+    assert loaded == [(d, d) for d in pd.DatetimeIndex(dates[[3, 30]])]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+'''
+波动率风险溢价的面板：不同日期的序列对齐到日期的并集上，与逐列计算相同
+'''
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from volopt import vrp
+from volopt.estimators import rolling
+from volopt.series import to_ns
+
+def test_to_ns_ignores_resolution():
+    dates = pd.DatetimeIndex(['2018-01-02', '2018-01-03'])
+    np.testing.assert_array_equal(to_ns(dates.as_unit('s')),
+                                  to_ns(dates.as_unit('ns')))
+
+def test_panel():
+    prices = synthetic.ohlc(80, seed=8)
+    iv = pd.Series(0.2, index=prices.index[10:70:2])
+    vix = pd.Series(0.25, index=pd.date_range(prices.index[-1], periods=3,
+                                              freq='D')[1:])
+    panel = vrp.panel(prices, {'iv': iv, 'vix': vix}, models=['realized'],
+                      windows=[20])
+    assert len(panel) == 80 + 2
+    rv = rolling('realized', 20, close=prices['close'])
+    spread = panel[('spread', 'iv', 'realized', 20)].dropna()
+    expected = (iv - rv).dropna()
+    np.testing.assert_allclose(spread.to_numpy(), expected.to_numpy())
+    assert (spread.index == expected.index).all()
+    # 未来窗口按交易日对齐
+    forward = panel[('forward_ratio', 'iv', 'realized', 20)]
+    date = iv.index[0]
+    later = rv[prices.index[prices.index.get_loc(date) + 20]]
+    assert forward[date] == later / 0.2
+    assert panel.loc[vix.index, ('spread', 'vix', 'realized', 20)].isna().all()
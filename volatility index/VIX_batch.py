@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+方差互换方法的VIX的批量计算：所有交易日、所有到期日的期权数据排序一次，
+分组的向量化计算得到整个VIX序列和期限结构
+"""
+
+import numpy as np
+import pandas as pd
+from volopt import telemetry
+
+def sort_chain(chain):
+    '''
+    将长格式的期权数据按(date, expire, strike)排序一次，后续所有计算都基于排序后的数组
+    Args:
+        chain:
+            DataFrame，至少包含date, expire, strike, call, put列，
+            若没有T_days列，则按自然日计算剩余到期天数
+    Returns:
+        排序并重建索引后的DataFrame
+    '''
+    chain = chain.loc[:, [c for c in chain.columns
+                          if c in ('date', 'expire', 'strike', 'call', 'put',
+                                   'T_days')]]
+    chain = chain.sort_values(['date', 'expire', 'strike'], kind='mergesort')
+    chain = chain.reset_index(drop=True)
+    if 'T_days' not in chain.columns:
+        chain['T_days'] = (chain['expire'] - chain['date']).dt.days
+    return chain
+
+def group_bounds(*keys):
+    '''
+    对已排序的键数组，返回每一组的起始位置和每一行所属的组号
+    Args:
+        keys:
+            一个或多个等长的数组，相邻行的键全部相同视为同一组
+    Returns:
+        starts:
+            每一组第一行的位置
+        gid:
+            每一行对应的组号
+    '''
+    n = len(keys[0])
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    for key in keys:
+        key = np.asarray(key)
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    gid = np.cumsum(change) - 1
+    return starts, gid
+
+def rate_by_date(r, dates):
+    '''
+    将无风险利率对齐到每一行的日期上
+    r:
+        常数，或以日期为索引的Series（如shibor['shibor_3M']）
+    '''
+    if np.isscalar(r):
+        return np.full(len(dates), float(r))
+    return r.reindex(pd.DatetimeIndex(dates)).to_numpy(dtype=float)
+
+@telemetry.timed()
+def sigma2_batch(chain, r, Y_days=365):
+    '''
+    一次性计算所有(交易日, 到期日)组的远期价格F、K0以及方差sigma2，
+    与Vix类逐日逐到期日的计算结果一致
+    Args:
+        chain:
+            长格式的期权数据，见sort_chain
+        r:
+            无风险利率，常数或以日期为索引的Series
+        Y_days:
+            一年的总天数
+    Returns:
+        以(date, expire)为索引的DataFrame，包含T_days, F, K0, sigma2
+    '''
+    chain = sort_chain(chain)
+    date = chain['date'].to_numpy()
+    expire = chain['expire'].to_numpy()
+    K = chain['strike'].to_numpy(dtype=float)
+    C = chain['call'].to_numpy(dtype=float)
+    P = chain['put'].to_numpy(dtype=float)
+    starts, gid = group_bounds(date, expire)
+    ends = np.append(starts[1:], len(K))
+    sizes = ends - starts
+
+    T = chain['T_days'].to_numpy(dtype=float)[starts] / Y_days
+    rate = rate_by_date(r, date[starts])
+    growth = np.exp(rate * T)
+
+    # F：每组内看涨与看跌价差绝对值最小的执行价对应的远期价格，
+    # 稳定排序保证并列时与idxmin一样取第一个
+    order = np.lexsort((np.abs(C - P), gid))
+    i_F = order[starts]
+    F = K[i_F] + (C[i_F] - P[i_F]) * growth
+
+    # K0：低于F的第一个执行价格，组内低于F的执行价个数即为K0在组内的位置
+    below = np.add.reduceat((K < F[gid]).astype(np.int64), starts)
+    i_K0 = starts + np.maximum(below - 1, 0) # 没有低于F的执行价时取最低执行价
+    K0 = K[i_K0]
+
+    # delta_K：内部为相邻执行价差的均值，两端为单侧价差，只有一个执行价的组为nan
+    # 内部的差分会跨到相邻的组，组的两端再按组内的执行价覆盖
+    dK = np.full(len(K), np.nan)
+    dK[1:-1] = (K[2:] - K[:-2]) / 2
+    first = starts[sizes > 1]
+    last = ends[sizes > 1] - 1
+    dK[first] = K[first + 1] - K[first]
+    dK[last] = K[last] - K[last - 1]
+    dK[starts[sizes == 1]] = np.nan
+
+    # Q_K：K < K0取看跌，K > K0取看涨，K = K0取两者均值
+    K0_row = K0[gid]
+    Q = np.where(K < K0_row, P, np.where(K > K0_row, C, (C + P) / 2))
+
+    sum_K = np.add.reduceat(dK / K**2 * Q, starts) * growth
+    with np.errstate(divide='ignore', invalid='ignore'): #到期日当天T为0
+        sigma2 = 2 * sum_K / T - (F / K0 - 1) ** 2 / T
+
+    index = pd.MultiIndex.from_arrays([date[starts], expire[starts]],
+                                      names=['date', 'expire'])
+    return pd.DataFrame({'T_days': chain['T_days'].to_numpy()[starts],
+                         'F': F, 'K0': K0, 'sigma2': sigma2}, index=index)
+
+def near_next(T_days, dates, min_days=7):
+    '''
+    确定每个交易日的近月和次近月：剩余到期天数大于min_days的前两个到期日，
+    与VIX_data_clean.py中last1, last2的处理一致
+    Args:
+        T_days:
+            按(date, T_days)排序的每组剩余到期天数
+        dates:
+            每组对应的交易日
+    Returns:
+        近月和次近月所在组的位置，以及对应的交易日
+    '''
+    valid = T_days > min_days
+    starts, day = group_bounds(dates)
+    rank = np.cumsum(valid)
+    rank = rank - np.append(0, rank[:-1])[starts][day] # 组内有效到期日的序号
+    near = np.flatnonzero(valid & (rank == 1))
+    nxt = np.flatnonzero(valid & (rank == 2))
+    # 只保留同时有近月和次近月的交易日
+    common = np.intersect1d(dates[near], dates[nxt])
+    near = near[np.isin(dates[near], common)]
+    nxt = nxt[np.isin(dates[nxt], common)]
+    return near, nxt, common
+
+@telemetry.timed()
+def vix_batch(chain, r, M_days=30, Y_days=365, min_days=7):
+    '''
+    用方差互换方法一次性计算所有交易日的VIX，结果与逐日使用Vix.volatility相同
+    Args:
+        chain:
+            长格式的期权数据，见sort_chain
+        r:
+            无风险利率，常数或以日期为索引的Series
+        M_days:
+            一个月的总天数
+        Y_days:
+            一年的总天数
+        min_days:
+            近月合约的最短剩余到期天数
+    Returns:
+        以日期为索引的VIX序列
+    '''
+    s2 = sigma2_batch(chain, r, Y_days)
+    dates = s2.index.get_level_values('date').to_numpy()
+    T_days = s2['T_days'].to_numpy(dtype=float)
+    sigma2 = s2['sigma2'].to_numpy()
+    near, nxt, common = near_next(T_days, dates, min_days)
+    T1, T2 = T_days[near], T_days[nxt]
+    last1 = sigma2[near] * T1 / Y_days * (T2 - M_days) / (T2 - T1)
+    last2 = sigma2[nxt] * T2 / Y_days * (M_days - T1) / (T2 - T1)
+    vix = 100 * np.sqrt((last1 + last2) * Y_days / M_days)
+    return pd.Series(vix, index=pd.DatetimeIndex(common, name='date'))
+
+def term_structure(chain, r, Y_days=365):
+    '''
+    所有交易日、所有到期日的方差期限结构，一次批量计算
+    Returns:
+        以(date, expire)为索引的DataFrame，在sigma2_batch的基础上增加
+        variance（总方差sigma2 * T）和vix（该到期日单独的波动率指数）两列
+    '''
+    s2 = sigma2_batch(chain, r, Y_days)
+    s2['variance'] = s2['sigma2'] * s2['T_days'] / Y_days
+    with np.errstate(invalid='ignore'):
+        s2['vix'] = 100 * np.sqrt(s2['sigma2'])
+    return s2
+
+def interpolate_variance(s2, targets, Y_days=365, min_days=7,
+                         extrapolate='linear'):
+    '''
+    在每个交易日的期限结构上按总方差线性插值，得到固定期限的年化方差
+    Args:
+        s2:
+            term_structure或sigma2_batch的结果
+        targets:
+            目标期限，自然日数，如[9, 30, 60, 90, 180]
+        min_days:
+            剩余到期天数不超过min_days的到期日不参与插值，与VIX的近月规则一致
+        extrapolate:
+            目标期限在所有到期日之外时的处理：'linear'用最近的两个到期日线性外推总方差
+            （与vix_batch中30天落在近月之前时相同），'flat'保持最近到期日的年化方差，
+            None为nan
+    Returns:
+        以s2中所有交易日为索引、目标期限为列的DataFrame；
+        有效到期日少于两个（包括没有有效到期日）的交易日为nan
+    '''
+    names = list(targets)
+    targets = np.asarray(targets, dtype=float)
+    T_days = s2['T_days'].to_numpy(dtype=float)
+    sigma2 = s2['sigma2'].to_numpy(dtype=float)
+    dates = s2.index.get_level_values('date').to_numpy()
+    grid = pd.DatetimeIndex(np.unique(dates), name='date')
+    columns = pd.Index(names, name='T_days')
+    valid = (T_days > min_days) & np.isfinite(sigma2)
+    if not valid.any():
+        return pd.DataFrame(np.nan, index=grid, columns=columns)
+    T_days, sigma2, dates = T_days[valid], sigma2[valid], dates[valid]
+    w = sigma2 * T_days # 总方差（乘以Y_days），按期限线性插值
+
+    # 同一交易日内按期限排序，日期序号 * 步长 + 期限作为全局有序的键，
+    # 一次searchsorted找到每个(交易日, 目标期限)所在的区间
+    order = np.lexsort((T_days, dates))
+    T_days, w, dates = T_days[order], w[order], dates[order]
+    starts, gid = group_bounds(dates)
+    sizes = np.diff(np.append(starts, len(T_days)))
+    step = max(T_days.max(initial=0), targets.max(initial=0)) + 1
+    keys = gid * step + T_days
+    day = np.arange(len(starts))[:, None]
+    pos = np.searchsorted(keys, day * step + targets[None, :]) - starts[:, None]
+    j = np.clip(pos, 1, np.maximum(sizes - 1, 1)[:, None]) + starts[:, None]
+    j = np.minimum(j, len(T_days) - 1)
+    T1, T2 = T_days[j - 1], T_days[j]
+    w1, w2 = w[j - 1], w[j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wt = w1 + (w2 - w1) * (targets - T1) / (T2 - T1)
+        outside = (targets < T1) | (targets > T2)
+        if extrapolate == 'flat':
+            wt = np.where(targets < T1, w1 / T1 * targets, wt)
+            wt = np.where(targets > T2, w2 / T2 * targets, wt)
+        elif extrapolate is None:
+            wt = np.where(outside, np.nan, wt)
+        elif extrapolate != 'linear':
+            raise ValueError("extrapolate should be 'linear', 'flat' or None")
+        sigma2_t = wt / targets
+    sigma2_t[sizes < 2] = np.nan
+    # 没有有效到期日的交易日在上面被去掉了，按所有交易日对齐为nan
+    return pd.DataFrame(sigma2_t, columns=columns,
+                        index=pd.DatetimeIndex(dates[starts], name='date'))\
+             .reindex(grid)
+
+@telemetry.timed()
+def constant_maturity(chain, r, targets=(9, 30, 60, 90, 180), Y_days=365,
+                      min_days=7, extrapolate='linear'):
+    '''
+    每个交易日固定期限的波动率指数，参数见interpolate_variance
+    目标期限为30天、且30天不超过次近月时，与vix_batch的结果相同
+    Returns:
+        以日期为索引、目标期限为列的DataFrame
+    '''
+    s2 = sigma2_batch(chain, r, Y_days)
+    sigma2 = interpolate_variance(s2, targets, Y_days, min_days, extrapolate)
+    with np.errstate(invalid='ignore'):
+        return 100 * np.sqrt(sigma2)
@@ -5,46 +5,59 @@ Created on Thu Sep 27 14:45:19 2018
 @author: 54326
 """
 
+import os
 import pandas as pd
+from volopt.data import data_root, read_excel #数据目录通过环境变量VOLOPT_DATA设定
+from volopt.chains import write_store
+from volopt.daycount import calendar_days
 
-basic = pd.read_excel('E:/data/50ETF期权合约基本资料.xlsx', parse_date=True)
-basic = basic.loc[:, ['trade_code', 'type', 'expire']]
-data2015 = pd.read_excel('E:/data/50ETF期权日行情2015-2016.xlsx', parse_date=True)
-data2017 = pd.read_excel('E:/data/50ETF期权日行情2017-2018.xlsx', parse_date=True)
-data2015 = data2015.loc[:, ['date', 'trade_code', 'strike', 'settle']]
-data2017 = data2017.loc[:, ['date', 'trade_code', 'strike', 'settle']]
-data = pd.concat([data2015, data2017])
-datas = pd.merge(data, basic, how='left') # 按trade_code合并
-datas.drop(columns='trade_code', inplace=True) # 删除trade_code列
-calls = datas[datas['type'] == 'call'] # 分离出认购期权的数据
-puts = datas[datas['type'] == 'put'] # 分离出认沽期权的数据
-calls.rename(columns={'settle': 'call'}, inplace=True)
-puts.rename(columns={'settle': 'put'}, inplace=True)
-# 按交易日期、到期日、执行价为连接键合并，并删除重复数据
-options = pd.merge(calls, puts.loc[:, ['date', 'expire', 'strike', 'put']], 
-                   on=['date', 'expire', 'strike'], how='left').drop_duplicates()
-# 计算剩余到期的天数（自然日）
-options = options.loc[:, ['date', 'expire', 'strike', 'call', 'put']]
+def clean_options(basic, daily):
+    '''
+    将期权合约基本资料与日行情整理为VIX程序使用的期权数据
+    Args:
+        basic:
+            50ETF期权合约基本资料
+        daily:
+            50ETF期权日行情的列表，如[2015-2016年, 2017-2018年]
+    Returns:
+        包含date, expire, strike, call, put, T_days, last1, last2, last3列的DataFrame
+    '''
+    basic = basic.loc[:, ['trade_code', 'type', 'expire']]
+    data = pd.concat([d.loc[:, ['date', 'trade_code', 'strike', 'settle']]
+                      for d in daily])
+    datas = pd.merge(data, basic, how='left') # 按trade_code合并
+    datas.drop(columns='trade_code', inplace=True) # 删除trade_code列
+    calls = datas[datas['type'] == 'call'] # 分离出认购期权的数据
+    puts = datas[datas['type'] == 'put'] # 分离出认沽期权的数据
+    calls.rename(columns={'settle': 'call'}, inplace=True)
+    puts.rename(columns={'settle': 'put'}, inplace=True)
+    # 按交易日期、到期日、执行价为连接键合并，并删除重复数据
+    options = pd.merge(calls, puts.loc[:, ['date', 'expire', 'strike', 'put']], 
+                       on=['date', 'expire', 'strike'], how='left').drop_duplicates()
+    # 计算剩余到期的天数（自然日）
+    options = options.loc[:, ['date', 'expire', 'strike', 'call', 'put']]
+    options['T_days'] = calendar_days(options['date'], options['expire'])
+    
+    # 每个交易日第一、第二、第三短的到期天数
+    terms = options[['date', 'T_days']].drop_duplicates()\
+                                       .sort_values(['date', 'T_days'])
+    terms['rank'] = terms.groupby('date').cumcount()
+    last = terms[terms['rank'] < 3].pivot(index='date', columns='rank',
+                                          values='T_days')
+    last.columns = ['last1', 'last2', 'last3']
+    short = last['last1'] <= 7 # 近月合约到期期限必须不少于1个星期
+    last.loc[short, ['last1', 'last2']] = last.loc[short, ['last2', 'last3']]\
+                                              .to_numpy()
+    return pd.merge(options, last.reset_index(), on='date', how='left')
 
-options['T_days'] = (options['expire'] - options['date']).apply(lambda x: x.days)
-
-def small(x, s):
-    '''确定第（s+1）小的值'''
-    ts = list(set(x))
-    ts.sort()
-    return ts[s]
-
-last1 = options.groupby('date')['T_days'].apply(small, s=0) # 交易日第一短到期天数
-last2 = options.groupby('date')['T_days'].apply(small, s=1) # 交易日第二短到期天数
-last3 = options.groupby('date')['T_days'].apply(small, s=2) # 交易日第三短到期天数
-last = pd.concat([last1, last2, last3], axis=1)
-last.columns = ['last1', 'last2', 'last3']
-for i in range(len(last)):
-    if last['last1'][i] <= 7: # 近月合约到期期限必须不少于1个星期
-        last.loc[last.index[i], 'last1'] = last.loc[last.index[i],'last2']
-        last.loc[last.index[i], 'last2'] = last.loc[last.index[i],'last3']
-options = pd.merge(options, last, on='date', how='left')
-
-options.to_excel('E:/data/50ETF_option_VIX.xlsx')
-with pd.HDFStore('E:/data/market.h5') as store:
-    store['50ETF_option_VIX'] = options
\ No newline at end of file
+if __name__ == '__main__':
+    basic = read_excel('50ETF期权合约基本资料.xlsx')
+    data2015 = read_excel('50ETF期权日行情2015-2016.xlsx')
+    data2017 = read_excel('50ETF期权日行情2017-2018.xlsx')
+    options = clean_options(basic, [data2015, data2017])
+    
+    options.to_excel(os.path.join(data_root(), '50ETF_option_VIX.xlsx'))
+    with pd.HDFStore(os.path.join(data_root(), 'market.h5')) as store:
+        store['50ETF_option_VIX'] = options
+    # 按日期建立索引的紧凑存储，VIX程序可以只读取需要的日期范围
+    write_store(options, os.path.join(data_root(), '50ETF_option_VIX'))
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+实时VIX：按报价逐笔增量更新各到期日的方差，以及回放历史报价的测试工具
+"""
+
+import csv
+import heapq
+import random
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from math import erf, exp, isfinite, log, sqrt
+from time import perf_counter
+
+class LiveExpiry():
+    '''
+    某一到期日的实时方差互换计算，执行价格保存在有序列表中，
+    每次报价更新只调整该执行价（以及相邻执行价）对sigma2求和项的贡献，
+    看涨与看跌价差最小的执行价用带惰性删除的堆维护
+    '''
+    def __init__(self, expire, resync_every=10000):
+        '''
+        expire:
+            到期时间，datetime
+        resync_every:
+            每隔多少次更新重新完整求和一次，消除累加的舍入误差
+        '''
+        self.expire = expire
+        self.resync_every = resync_every
+        self.strikes = [] #看涨、看跌报价都已到达的执行价，从小到大排列
+        self.calls = {}
+        self.puts = {}
+        self.terms = {} #每个执行价的delta_K / K**2 * Q_K
+        self.sum_K = 0.0
+        self.spreads = [] #(|call - put|, strike)的堆
+        self.K0 = None #当前求和项所依据的K0
+        self.count = 0
+
+    def T_days(self, time):
+        '''剩余到期天数，按自然日计算，可以是小数'''
+        return (self.expire - time) / timedelta(days=1)
+
+    def delta_K(self, i):
+        '''第i个执行价的价差，与Vix.delta_K相同'''
+        ks = self.strikes
+        if len(ks) < 2:
+            return 0.0
+        if i == 0:
+            return ks[1] - ks[0]
+        if i == len(ks) - 1:
+            return ks[-1] - ks[-2]
+        return (ks[i+1] - ks[i-1]) / 2
+
+    def Q_K(self, k):
+        '''K < K0取看跌，K > K0取看涨，K = K0取均值'''
+        if k < self.K0:
+            return self.puts[k]
+        elif k > self.K0:
+            return self.calls[k]
+        else:
+            return (self.calls[k] + self.puts[k]) / 2
+
+    def refresh(self, i):
+        '''重新计算第i个执行价的求和项，并调整总和'''
+        if i < 0 or i >= len(self.strikes):
+            return
+        k = self.strikes[i]
+        term = self.delta_K(i) / k**2 * self.Q_K(k)
+        self.sum_K += term - self.terms.get(k, 0.0)
+        self.terms[k] = term
+
+    def resync(self):
+        '''完整地重新求和'''
+        self.terms = {}
+        self.sum_K = 0.0
+        for i in range(len(self.strikes)):
+            self.refresh(i)
+
+    def K_F(self):
+        '''看涨期权和看跌期权价差绝对值最小的执行价，丢弃堆顶过期的价差'''
+        while self.spreads:
+            spread, k = self.spreads[0]
+            if abs(self.calls[k] - self.puts[k]) == spread:
+                return k
+            heapq.heappop(self.spreads)
+        return None
+
+    def update(self, strike, call=None, put=None):
+        '''
+        更新一个执行价的看涨、看跌报价（中间价），只给出一边时另一边保持不变
+        '''
+        if call is not None:
+            self.calls[strike] = call
+        if put is not None:
+            self.puts[strike] = put
+        if strike not in self.calls or strike not in self.puts:
+            return #另一边的报价还没有到达
+        heapq.heappush(self.spreads,
+                       (abs(self.calls[strike] - self.puts[strike]), strike))
+        if len(self.spreads) > 4 * len(self.strikes) + 64: #清理过期的价差
+            self.spreads = [(abs(self.calls[k] - self.puts[k]), k)
+                            for k in self.strikes + [strike]]
+            heapq.heapify(self.spreads)
+        if self.K0 is None:
+            self.K0 = strike
+        i = bisect_left(self.strikes, strike)
+        if i < len(self.strikes) and self.strikes[i] == strike:
+            self.refresh(i)
+        else: #新挂牌的执行价，相邻执行价的delta_K也随之改变
+            self.strikes.insert(i, strike)
+            self.refresh(i - 1); self.refresh(i); self.refresh(i + 1)
+        self.count += 1
+        if self.count % self.resync_every == 0:
+            self.resync()
+
+    def forward(self, r, T):
+        '''
+        返回远期价格F和K0，K0变化时只重新计算新旧K0之间的执行价的求和项
+        '''
+        k = self.K_F()
+        F = k + (self.calls[k] - self.puts[k]) * exp(r * T)
+        i = bisect_left(self.strikes, F) #低于F的执行价个数
+        K0 = self.strikes[max(i - 1, 0)] #没有低于F的执行价时取最低执行价
+        if K0 != self.K0:
+            lo = bisect_left(self.strikes, min(K0, self.K0))
+            hi = bisect_left(self.strikes, max(K0, self.K0))
+            self.K0 = K0
+            for j in range(lo, hi + 1):
+                self.refresh(j)
+        return F, K0
+
+    def sigma2(self, r, time, Y_days=365):
+        '''与Vix.sigma2相同的方差'''
+        T = self.T_days(time) / Y_days
+        F, K0 = self.forward(r, T)
+        return 2 * self.sum_K * exp(r * T) / T - (F / K0 - 1) ** 2 / T
+
+class LiveVix():
+    '''
+    根据实时报价流增量地更新50ETF VIX指数，近月和次近月的选择与VIX_batch相同
+    '''
+    def __init__(self, r, M_days=30, Y_days=365, min_days=7):
+        '''
+        r:
+            无风险利率
+        min_days:
+            近月合约的最短剩余到期天数
+        '''
+        self.r = r
+        self.M_days = M_days
+        self.Y_days = Y_days
+        self.min_days = min_days
+        self.expiries = {}
+        self.expires = [] #到期日从近到远排列
+
+    def update(self, time, expire, strike, call=None, put=None):
+        '''
+        处理一条报价，并返回更新后的指数
+        time:
+            报价时间，datetime
+        '''
+        if expire not in self.expiries:
+            self.expiries[expire] = LiveExpiry(expire)
+            insort(self.expires, expire)
+        self.expiries[expire].update(strike, call, put)
+        return self.volatility(time)
+
+    def near_next(self, time):
+        '''剩余到期天数大于min_days且已有报价的前两个到期日'''
+        found = []
+        for expire in self.expires:
+            live = self.expiries[expire]
+            if live.T_days(time) > self.min_days and len(live.strikes) > 1:
+                found.append(live)
+                if len(found) == 2:
+                    return found
+        return None
+
+    def volatility(self, time):
+        '''
+        将近月和次近月的方差按剩余期限插值到30天，与Vix.volatility相同，
+        报价还不完整时返回nan；只有部分执行价的报价或报价有噪声时，
+        插值的方差可能不为正，此时也返回nan
+        '''
+        pair = self.near_next(time)
+        if pair is None:
+            return float('nan')
+        near, nxt = pair
+        T1, T2 = near.T_days(time), nxt.T_days(time)
+        M, Y = self.M_days, self.Y_days
+        last1 = near.sigma2(self.r, time, Y) * T1 / Y * (T2 - M) / (T2 - T1)
+        last2 = nxt.sigma2(self.r, time, Y) * T2 / Y * (M - T1) / (T2 - T1)
+        variance = (last1 + last2) * Y / M
+        if not isfinite(variance) or variance <= 0:
+            return float('nan')
+        return 100 * sqrt(variance)
+
+def read_quotes(path):
+    '''
+    读取记录的报价文件，csv格式，列为time, expire, strike, call, put，
+    时间为ISO格式，call或put为空表示这一边没有更新
+    '''
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield (datetime.fromisoformat(row['time']),
+                   datetime.fromisoformat(row['expire']),
+                   float(row['strike']),
+                   float(row['call']) if row['call'] else None,
+                   float(row['put']) if row['put'] else None)
+
+def write_quotes(path, quotes):
+    '''将报价写入csv文件，格式与read_quotes相同'''
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'expire', 'strike', 'call', 'put'])
+        for time, expire, strike, call, put in quotes:
+            writer.writerow([time.isoformat(), expire.isoformat(), strike,
+                             '' if call is None else call,
+                             '' if put is None else put])
+
+def synthetic_quotes(start, expires, strikes, S0=2.5, sigma=0.25, r=0.03,
+                     n=100000, seconds=0.1, seed=0):
+    '''
+    生成模拟的报价流：标的价格按几何布朗运动变化，每条报价随机选一个合约，
+    按B-S价格加上噪声给出看涨、看跌中间价
+    Args:
+        start:
+            第一条报价的时间
+        expires:
+            到期日列表
+        strikes:
+            执行价列表
+        n:
+            报价条数
+        seconds:
+            相邻报价的时间间隔，秒
+    Returns:
+        (time, expire, strike, call, put)的生成器，先给出所有合约的初始报价
+    '''
+    rng = random.Random(seed)
+    ncdf = lambda x: 0.5 * (1 + erf(x / sqrt(2)))
+
+    def quote(S, time, expire, K):
+        T = (expire - time) / timedelta(days=365)
+        d1 = (log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * sqrt(T))
+        d2 = d1 - sigma * sqrt(T)
+        call = S * ncdf(d1) - K * exp(-r * T) * ncdf(d2)
+        put = call - S + K * exp(-r * T)
+        noise = lambda: 1 + 0.01 * rng.uniform(-1, 1)
+        return max(call * noise(), 1e-4), max(put * noise(), 1e-4)
+
+    S = S0
+    time = start
+    step = timedelta(seconds=seconds)
+    dt = seconds / (240 * 4 * 3600) #按一年240个交易日，每天4小时交易计算
+    for expire in expires:
+        for K in strikes:
+            yield (time, expire, K) + quote(S, time, expire, K)
+    for i in range(n):
+        time += step
+        S *= exp(-0.5 * sigma**2 * dt + sigma * sqrt(dt) * rng.gauss(0, 1))
+        expire = rng.choice(expires)
+        K = rng.choice(strikes)
+        call, put = quote(S, time, expire, K)
+        side = rng.random() #大部分报价只更新一边
+        yield (time, expire, K, call if side < 0.7 else None,
+               put if side > 0.3 else None)
+
+def replay(quotes, engine):
+    '''
+    用记录的或模拟的报价流驱动实时引擎，记录每条报价的处理耗时
+    Args:
+        quotes:
+            (time, expire, strike, call, put)的可迭代对象，如read_quotes的返回值
+        engine:
+            LiveVix实例
+    Returns:
+        values:
+            (time, vix)的列表
+        latency:
+            每条报价的处理耗时，微秒
+    '''
+    values = []
+    latency = []
+    for time, expire, strike, call, put in quotes:
+        t0 = perf_counter()
+        vix = engine.update(time, expire, strike, call, put)
+        latency.append((perf_counter() - t0) * 1e6)
+        values.append((time, vix))
+    return values, latency
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    start = datetime(2018, 9, 21, 9, 30)
+    expires = [datetime(2018, 9, 26, 15), datetime(2018, 10, 24, 15),
+               datetime(2018, 12, 26, 15), datetime(2019, 3, 27, 15)]
+    strikes = [round(2.0 + 0.05 * i, 2) for i in range(20)]
+    path = os.path.join(tempfile.gettempdir(), '50ETF_quotes.csv')
+    write_quotes(path, synthetic_quotes(start, expires, strikes, n=200000))
+
+    values, latency = replay(read_quotes(path), LiveVix(r=0.03))
+    latency.sort()
+    print('最后的VIX：%.4f' % values[-1][1])
+    print('每条报价耗时（微秒）：均值%.2f，中位数%.2f，99%%分位数%.2f'
+          % (sum(latency) / len(latency), latency[len(latency) // 2],
+             latency[int(len(latency) * 0.99)]))
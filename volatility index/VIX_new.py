@@ -122,48 +122,18 @@ class Vix():
         return 100 * sqrt((last1 + last2)  * Y_days / M_days)
 
 if __name__ == '__main__':
-    import pandas as pd
+    import os
     import matplotlib.pyplot as plt
+    from VIX_batch import vix_batch
+    from volopt.data import data_root, read_hdf #数据目录通过环境变量VOLOPT_DATA设定
+    from volopt.chains import ChainStore
     
-    with pd.HDFStore('E:/data/market.h5') as store: 
-        data = store['50ETF_option_VIX']
-        shibor = store['shibor_3M']
-    data.set_index(['date', 'expire'], drop=False, inplace=True)
-    dates = data['date'].drop_duplicates() 
+    #load(start, end)可以只读取某一段日期的数据
+    data = ChainStore(os.path.join(data_root(), '50ETF_option_VIX')).load()
+    shibor = read_hdf('market.h5', 'shibor_3M')
     
-    def data_slice(data, last_flag):
-        '''
-        提取近月或次近月的期权数据
-        Args:
-            data:
-                某一个交易的所有期权的数据
-            last_flag:
-                近月或次近月的标志，为’last1'或'last2'
-        Returns:
-            执行价格序列，看涨期权价格序列，看跌期权价格序列
-        '''
-        data_last = data[data['T_days'] == data[last_flag]]
-        data_last.set_index('strike', drop=False, inplace=True)
-        return data_last['strike'], data_last['call'], data_last['put']
-    
-    def vix(T_days, data, last_flag, r):
-        '''
-        返回一个Vix实例
-        '''
-        strikes, calls, puts = data_slice(data, last_flag) 
-        return Vix(T_days, strikes, calls, puts, r)
-    
-    VIX = {} #将得到的volatility值，以日期为键，保存到字典VIX
-    for date in dates:
-        r = shibor.loc[date, 'shibor_3M']
-        data_t = data.xs(date, level=0) #某一交易日的数据
-        T_days_1 = data_t['last1'][0] #近月的剩余到期天数
-        T_days_2 = data_t['last2'][0] #次近月的剩余到期天数
-        vix_1 =  vix(T_days_1, data_t, 'last1', r)
-        vix_2 =  vix(T_days_2, data_t, 'last2', r)
-        VIX[date] = vix_1.volatility(vix_2) 
-    
-    VIX = pd.Series(VIX).sort_index()
+    #所有交易日、所有到期日的期权数据只排序一次，分组的向量化计算得到整个VIX序列
+    VIX = vix_batch(data, shibor['shibor_3M'])
     plt.figure(figsize=(15, 8))
     plt.plot(VIX)
     plt.xticks(fontsize=14)
@@ -5,12 +5,17 @@ Created on Fri Sep 28 19:42:39 2018
 @author: 54326
 """
 
-from math import log, exp, sqrt
-from scipy.stats import norm
-from scipy.optimize import fsolve
+import os
+import numpy as np
+import pandas as pd
+from volopt import telemetry
+from volopt.core import norm_cdf, norm_pdf #不必导入scipy.stats
 
 class IV():
-    '''定义一个通过Balck-Scholes公式求隐含波动率的类'''    
+    '''
+    定义一个通过Balck-Scholes公式求隐含波动率的类
+    S, K, r, T_days, price既可以是标量，也可以是等长的数组，数组时一次求解所有期权
+    '''    
     Y_days = 365 #一年的总天数，按自然日计算
     
     def __init__(self, S, K, r, T_days, price):
@@ -26,18 +31,18 @@ class IV():
         sigma:
             波动率
         '''
-        d1 = (log(self.S / self.K) + (self.r + 0.5 * sigma**2) * self.T)\
-             / (sigma * sqrt(self.T))
-        d2 = d1 - sigma * sqrt(self.T)
-        return self.S * norm.cdf(d1) - self.K * norm.cdf(d2) * exp(-self.r * self.T)
+        d1 = (np.log(self.S / self.K) + (self.r + 0.5 * sigma**2) * self.T)\
+             / (sigma * np.sqrt(self.T))
+        d2 = d1 - sigma * np.sqrt(self.T)
+        return self.S * norm_cdf(d1) - self.K * norm_cdf(d2) * np.exp(-self.r * self.T)
     
     def vega(self, sigma):
         '''
         B-S公式得到的期权价格关于波动率的导数，希腊值vega
         '''
-        d1 = (log(self.S / self.K) + (self.r + 0.5 * sigma**2) * self.T)\
-             / (sigma * sqrt(self.T))
-        return self.S * norm.pdf(d1) * sqrt(self.T)
+        d1 = (np.log(self.S / self.K) + (self.r + 0.5 * sigma**2) * self.T)\
+             / (sigma * np.sqrt(self.T))
+        return self.S * norm_pdf(d1) * np.sqrt(self.T)
     
     def newton(self, sigma=0.3, N=50):
         '''
@@ -46,8 +51,22 @@ class IV():
         N:
             迭代次数
         '''
-        for i in range(N):
-            sigma -= (self.bs_value(sigma) - self.price) / self.vega(sigma)
+        track = telemetry.enabled
+        if track: # 误差首次小于1e-8时的迭代次数，只在记录时统计
+            needed = np.full(np.shape(self.price), N)
+        with np.errstate(all='ignore'): # 不收敛时得到nan，不报警
+            for i in range(N):
+                error = self.bs_value(sigma) - self.price
+                if track:
+                    needed = np.where((needed == N) & (np.abs(error) < 1e-8),
+                                      i, needed)
+                sigma = sigma - error / self.vega(sigma)
+            if track:
+                error = np.abs(self.bs_value(sigma) - self.price)
+                # 总是迭代N次，最后检查误差时再计算一次价格
+                self.report('newton', sigma, ~(error < 1e-8),
+                            iterations=int(np.max(needed)), max_iterations=N,
+                            function_calls=2 * N + 1)
         return sigma
     
     def equation(self, sigma):
@@ -61,146 +80,189 @@ class IV():
         使用scipy.optimize.fsolve求解隐含波动率
         fsovle总能得到解，但有些解有点奇怪，速度比Newton法快一些
         '''
-        return fsolve(self.equation, sigma)[0]
-            
-if __name__ == '__main__':
-    from collections import defaultdict
-    from itertools import product
-    import matplotlib.pyplot as plt
-    import pandas as pd
-    import numpy as np
-    
-    with pd.HDFStore('E:/data/market.h5') as store: 
-        data = store['50ETF_option_VIX']
-        shibor = store['shibor_3M']
-    close = pd.read_excel('E:/Data/50ETF基金净值表现日数据.xlsx', parse_date=True)
-    close['date'] = pd.to_datetime(close['date'])
-    close = close.loc[:, ['date', 'close']] #以交易的收盘价作为标的价格
-    data = pd.merge(data, shibor, on='date', how='left')
-    data = pd.merge(data, close, on='date', how='left')
-    data.set_index(['date', 'expire'], inplace=True)
-    
-    #计算虚值期权的虚值程度，将负虚值设为期权收盘价，以便后面计算最小的虚值程度
-    data['k_close'] = np.where(data['strike'] - data['close'] > 0, 
-                               data['strike'] - data['close'], data['strike'])
-    #计算实值期权的实值程度，将负实值设为期权执行价，以便后面计算最小的实值程度
-    data['close_k'] = np.where(data['close'] - data['strike'] > 0, 
-                               data['close'] - data['strike'], data['close'])
-    otm = data.groupby(level=['date', 'expire'])[['k_close']].min() #最小的虚值
-    otm.rename(columns={'k_close': 'otm'}, inplace=True) #otm: out-of-money
-    itm = data.groupby(level=['date', 'expire'])[['close_k']].min() #最小的实值
-    itm.rename(columns={'close_k': 'itm'}, inplace=True) #itm: in-the-money
-    data = data.join(otm)
-    data = data.join(itm)
-    itm_sp = data[data['itm'] == data['close']] #部分日期没有实值的期权
-    #将没有实值期权的实值程度将入一点常量，否则后面会导致所有期权都会入选为最接近执行价的期权
-    data['itm'] = np.where(data['itm'] == data['close'], 
-                           data['itm'] + 1, data['itm'])
-    
-    def data_slice(data, value_flag, last_flag):
+        from scipy.optimize import fsolve #只在求解时导入scipy
+        if not telemetry.enabled:
+            return fsolve(self.equation, sigma)[0]
+        root, info, ier, msg = fsolve(self.equation, sigma, full_output=True)
+        #没有收敛或得到非正的波动率，都视为奇怪的解
+        self.report('fsolve', root[0], ier != 1 or root[0] <= 0,
+                    function_calls=info['nfev'], message=msg)
+        return root[0]
+
+    def bisect(self, low=1e-4, high=5, N=60):
         '''
-        提取最靠近执行价格的期权的数据
-        Args:
-            data:
-                所有交易所有数据
-            value_flag:
-                实值、虚值标记，值为'otm'或'itm'
-            last_flag:
-                近月、次近月标志，值为'last'或'last2'
-        Returns:
-            满足某一实虚值标记，某一次近月标记的所有交易日的数据
+        对所有期权同时用二分法求解隐含波动率，B-S价格关于波动率单调递增，
+        有解时与fsolve的解相同，价格超出[low, high]对应的价格区间时返回nan，
+        不会像fsolve那样得到奇怪的解
+        N:
+            二分的次数，60次时精度远小于1e-12
         '''
-        if value_flag == 'otm':
-            spread = 'k_close'
-        elif value_flag == 'itm':
-            spread = 'close_k'
-        else:
-            print("value_flag should be 'otm' or 'itm'")
-        data_flag = data[(data[spread] == data[value_flag])
-                       & (data['T_days'] == data[last_flag])]
-        data_flag.reset_index(level=1, inplace=True)
-        return data_flag
+        low = np.full(np.shape(self.price), low, dtype=float)
+        high = np.full(np.shape(self.price), high, dtype=float)
+        valid = (self.bs_value(low) <= self.price)\
+              & (self.bs_value(high) >= self.price)
+        for i in range(N):
+            mid = (low + high) / 2
+            above = self.bs_value(mid) > self.price
+            high = np.where(above, mid, high)
+            low = np.where(above, low, mid)
+        if telemetry.enabled:
+            self.report('bisect', np.where(valid, (low + high) / 2, np.nan),
+                        ~valid, iterations=N, max_iterations=N,
+                        function_calls=N + 2)
+        return np.where(valid, (low + high) / 2, np.nan)
 
-    def get_iv(data, kind, method='newton'):
+    def report(self, method, sigma, failed, **fields):
         '''
-        计算隐含波动率
-        data:
-            某一交易日，某一实虚值标记，某一次近月标记的数据
-        kind:
-            看涨期权还是看跌期权，值为'call'或'put'
-        method:
-            指定计算采用的方法
-            Newton法较稳定，但有时得不到解，fsovle总能得到解，但有些解有点奇怪
+        记录求解的情况，并把不收敛的期权的输入单独记录下来
+        failed:
+            每个期权是否不收敛的布尔值或布尔数组
         '''
-        S = data['close']
-        K = data['strike']
-        r = data['shibor_3M']
-        T_days = data['T_days']
-        price = data[kind] 
-        iv = IV(S, K, r, T_days, price) #返回一个IV类的实例
-        if method == 'newton':
-            return iv.newton()
-        elif method == 'fsolve':
-            return iv.solve()
-        else:
-            print("method should be 'newton' or 'fsolve'")
-    
-    IVs = {} #保存所有计算到的隐含波动率
-    value_flags = ['otm', 'itm']
-    last_flags = ['last1', 'last2']
-    flags = list(product(value_flags, last_flags)) #value_flags与last_flags的笛卡尔积
-    for flag in flags:
-        vf, lf = flag
-        data_flag = data_slice(data, vf, lf) #提取满足某一实虚值标记，某一次近月标记的数据
-        dates = data_flag.index 
-        IVs[(vf, lf)] = defaultdict(dict)
-        for date in dates:
-            data_t = data_flag.loc[date, :]
-            method = 'newton' if vf == 'otm' else 'fsolve' #对实值put用fsolve
-            IVs[(vf, lf)][date].update({'call': get_iv(data_t, 'call')})
-            IVs[(vf, lf)][date].update({'put': get_iv(data_t, 'put', method)})
-    
-    def call_put_mean(flag):
-        return pd.DataFrame(IVs[flag]).T.mean(axis=1) #call和put的平均
+        failed = np.broadcast_to(failed, np.shape(sigma))
+        telemetry.record('solver', 'VIX_old.IV', method=method,
+                         options=int(np.size(sigma)),
+                         failures=int(np.sum(failed)), **fields)
+        if np.any(failed):
+            pick = lambda x: np.broadcast_to(x, np.shape(sigma))[failed]
+            telemetry.record('nonconvergence', 'VIX_old.IV', method=method,
+                             S=pick(self.S), K=pick(self.K), r=pick(self.r),
+                             T=pick(self.T), price=pick(self.price),
+                             sigma=pick(sigma))
 
-    CP_mean = {}
-    for flag in flags:
-        CP_mean[flag] = call_put_mean(flag)
-    CP_mean = pd.DataFrame(CP_mean)
-    
-    K_spread = {} #提取所有交易日最小的实值程度、虚值程度数据
-    for vf in value_flags: #在同一天，不同到期日，最小实值程度、虚值程度是一样的
-        data_flag = data_slice(data, vf, 'last1') # 所以last_flag='last2'结果一样
-        K_spread[vf] = data_flag[vf]
-    K_spread = pd.DataFrame(K_spread)
-    #计算基于实值程度、实值程度加权的权数
-    K_spread['otm_weight'] = K_spread['itm'] / (K_spread['otm'] + K_spread['itm'])
-    K_spread['itm_weight'] = K_spread['otm'] / (K_spread['otm'] + K_spread['itm'])
+def moneyness(data):
+    '''
+    计算虚值程度和实值程度
+    将负虚值设为执行价，负实值设为标的收盘价，以便后面计算最小的虚值、实值程度
+    '''
+    K = data['strike'].to_numpy(dtype=float)
+    S = data['close'].to_numpy(dtype=float)
+    data['k_close'] = np.where(K - S > 0, K - S, K)
+    data['close_k'] = np.where(S - K > 0, S - K, S)
+    return data
+
+@telemetry.timed()
+def select_nearest(data):
+    '''
+    通过一次分组运算，选出所有交易日近月、次近月中最小虚值和最小实值的期权
+    Args:
+        data:
+            所有交易日的期权数据，包含date, expire, strike, call, put, T_days,
+            last1, last2, close, shibor_3M列
+    Returns:
+        每个交易日、每个实虚值标记、每个次近月标记各一行的DataFrame，
+        value_flag为'otm'或'itm'，last_flag为'last1'或'last2'
+    '''
+    data = data[(data['T_days'] == data['last1'])
+              | (data['T_days'] == data['last2'])].reset_index(drop=True)
+    data = moneyness(data)
+    rows = data.groupby(['date', 'expire'], sort=True)[['k_close', 'close_k']]\
+               .idxmin()
+    n = len(rows)
+    idx = np.concatenate([rows['k_close'].to_numpy(),
+                          rows['close_k'].to_numpy()])
+    selected = data.loc[idx, ['date', 'strike', 'close', 'shibor_3M',
+                              'T_days', 'last1', 'call', 'put']]
+    selected = selected.reset_index(drop=True)
+    selected['value_flag'] = np.repeat(['otm', 'itm'], n)
+    selected['last_flag'] = np.where(selected['T_days'] == selected['last1'],
+                                     'last1', 'last2')
+    #同一交易日不同到期日的最小实值、虚值程度是一样的
+    selected['spread'] = np.concatenate([data.loc[idx[:n], 'k_close'],
+                                         data.loc[idx[n:], 'close_k']])
+    #没有实值期权时idxmin取到的是最低执行价的虚值期权，不入选，
+    #这些交易日的VIX为nan，由whaley_vix用可得的波动率的平均替代
+    no_itm = (selected['value_flag'] == 'itm')\
+           & (selected['spread'] == selected['close'])
+    return selected[~no_itm].drop(columns='last1').reset_index(drop=True)
+
+@telemetry.timed()
+def implied_vols(selected, N=50):
+    '''
+    将所选期权的call和put拼接起来，一次批量求解隐含波动率
+    实值期权的put用二分法求解，其余用Newton法，与原来逐日使用IV类的方法选择一致
+    Returns:
+        selected增加了call_iv, put_iv两列
+    '''
+    n = len(selected)
+    S = np.tile(selected['close'].to_numpy(dtype=float), 2)
+    K = np.tile(selected['strike'].to_numpy(dtype=float), 2)
+    r = np.tile(selected['shibor_3M'].to_numpy(dtype=float), 2)
+    T_days = np.tile(selected['T_days'].to_numpy(dtype=float), 2)
+    price = np.concatenate([selected['call'].to_numpy(dtype=float),
+                            selected['put'].to_numpy(dtype=float)])
+    robust = np.zeros(2 * n, dtype=bool)
+    robust[n:] = selected['value_flag'].to_numpy() == 'itm'
+    ivs = np.empty(2 * n)
+    ivs[~robust] = IV(S[~robust], K[~robust], r[~robust], T_days[~robust],
+                      price[~robust]).newton(N=N)
+    ivs[robust] = IV(S[robust], K[robust], r[robust], T_days[robust],
+                     price[robust]).bisect()
+    selected = selected.copy()
+    selected['call_iv'] = ivs[:n]
+    selected['put_iv'] = ivs[n:]
+    return selected
+
+@telemetry.timed()
+def whaley_vix(selected, M_days=30):
+    '''
+    按实虚值程度和剩余期限对隐含波动率加权，得到VIX，全部为按列的数组运算
+    Args:
+        selected:
+            implied_vols的返回值
+        M_days:
+            一个月的总天数
+    Returns:
+        以日期为索引的DataFrame，包含4个call、put平均波动率以及VIX
+    '''
+    iv = selected[['call_iv', 'put_iv']].to_numpy()
+    count = (~np.isnan(iv)).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        selected = selected.assign(
+            cp_mean=np.nansum(iv, axis=1) / np.where(count > 0, count, np.nan))
+    wide = selected.set_index(['date', 'value_flag', 'last_flag'])\
+                   [['cp_mean', 'spread', 'T_days']]\
+                   .unstack(['value_flag', 'last_flag'])
+    flags = [('otm', 'last1'), ('otm', 'last2'), ('itm', 'last1'), 
+             ('itm', 'last2')]
+    cp = wide['cp_mean'].reindex(columns=flags)
+    spread = wide['spread'].reindex(columns=flags)
+    otm = spread[('otm', 'last1')].to_numpy(dtype=float)
+    itm = spread[('itm', 'last1')].to_numpy(dtype=float) #没有实值期权时为nan
+    otm_weight = itm / (otm + itm)
+    itm_weight = otm / (otm + itm)
+    vols = cp.to_numpy()
+    vol_last1 = vols[:, 0] * otm_weight + vols[:, 2] * itm_weight
+    vol_last2 = vols[:, 1] * otm_weight + vols[:, 3] * itm_weight
+    T1 = wide['T_days'][('otm', 'last1')].to_numpy(dtype=float)
+    T2 = wide['T_days'][('otm', 'last2')].to_numpy(dtype=float)
+    VIX = vol_last1 * (T2 - M_days) / (T2 - T1)\
+        + vol_last2 * (M_days - T1) / (T2 - T1)
+    #对于nan值，用最原始的8个波动率中的可得值的简单平均替代
+    count = (~np.isnan(vols)).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        fallback = np.nansum(vols, axis=1) / np.where(count > 0, count, np.nan)
+    VIX = np.where(np.isnan(VIX), fallback, VIX)
+    result = pd.DataFrame(vols, index=cp.index, columns=pd.Index(flags))
+    result['VIX'] = VIX
+    return result
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    from volopt.data import data_root, read_excel, read_hdf #数据目录通过环境变量VOLOPT_DATA设定
+    from volopt.chains import ChainStore
     
-    K_weighted = CP_mean.join(K_spread)
-    #通过对最接近平价的最小实值、虚值的期权的波动率按实虚值程度加权，得到近月、次近月波动率
-    K_weighted['vol_last1'] = K_weighted[('otm', 'last1')] * K_weighted['otm_weight']\
-                            + K_weighted[('itm', 'last1')] * K_weighted['itm_weight']
-    K_weighted['vol_last2'] = K_weighted[('otm', 'last2')] * K_weighted['otm_weight']\
-                            + K_weighted[('itm', 'last2')] * K_weighted['itm_weight']        
-    T_spread = {} #提取所有交易日近月、次近月的剩余到期天数数据
-    for lf in last_flags:
-        data_flag = data_slice(data, 'otm', lf)
-        T_spread[lf] = data_flag['T_days']   
-    T_spread = pd.DataFrame(T_spread)
+    #load(start, end)可以只读取某一段日期的数据
+    data = ChainStore(os.path.join(data_root(), '50ETF_option_VIX')).load()
+    shibor = read_hdf('market.h5', 'shibor_3M')
+    close = read_excel('50ETF基金净值表现日数据.xlsx')
+    close['date'] = pd.to_datetime(close['date'])
+    close = close.loc[:, ['date', 'close']] #以交易的收盘价作为标的价格
+    data = pd.merge(data, shibor, on='date', how='left')
+    data = pd.merge(data, close, on='date', how='left')
     
-    T_weighted = K_weighted.join(T_spread)
-    #按剩余期限加权
-    T_weighted['last1_weight'] = (T_weighted['last2'] - 30)\
-                               / (T_weighted['last2'] - T_weighted['last1'])
-    T_weighted['last2_weight'] = (30 - T_weighted['last1'])\
-                               / (T_weighted['last2'] - T_weighted['last1'])
-    T_weighted['VIX'] = T_weighted['vol_last1'] * T_weighted['last1_weight']\
-                      + T_weighted['vol_last2'] * T_weighted['last2_weight']
-    #对于nan值，用最原始的8个波动率中的可得值的简单平均替代
-    nan_dates = T_weighted[T_weighted['VIX'].isnull()].index
-    for date in nan_dates:
-        T_weighted.loc[date, 'VIX'] = T_weighted.loc[date, flags].mean()
+    selected = select_nearest(data) #所有交易日最接近平价的实值、虚值期权
+    selected = implied_vols(selected) #一次批量计算所有入选期权的隐含波动率
+    T_weighted = whaley_vix(selected)
     
     plt.figure(figsize=(15, 8))
     plt.plot(T_weighted['VIX'])
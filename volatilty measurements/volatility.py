@@ -6,6 +6,7 @@ Created on Thu Sep 20 21:10:24 2018
 """
 
 from math import sqrt, log
+from volopt import telemetry
 
 def realized(close, N=240):
     '''
@@ -101,6 +102,7 @@ def volatility(model, open=None, high=None, low=None, close=None, N=240):
         print('parkinson, garman_klass, garkla_yangzh, yang_zhang')
         return None
                 
+@telemetry.timed()
 def rolling_volatility(model, window, open=None, high=None, low=None, 
                        close=None, N=240, **kwargs):
     '''
@@ -155,8 +157,9 @@ def rolling_volatility(model, window, open=None, high=None, low=None,
 if __name__ == '__main__':
     import pandas as pd
     import matplotlib.pyplot as plt
+    from volopt.data import read_excel #数据目录通过环境变量VOLOPT_DATA设定
     
-    zz500 = pd.read_excel('e:/alpha/zz500.xlsx') 
+    zz500 = read_excel('zz500.xlsx') 
     zz500.set_index(pd.to_datetime(zz500['date']), inplace=True)
     test = zz500[:60]
     
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+各个程序共用的模块。导入volopt只定义路径，子模块在第一次访问时才导入，如
+    import volopt
+    volopt.core.norm_cdf(0.5)       #只加载numpy
+    from volopt.estimators import rolling
+core, estimators, autocall只依赖numpy；pandas和scipy在用到的函数里才导入，
+matplotlib只在plotting中导入
+"""
+
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIRS = ('volatilty measurements', 'implied volatility',
+               'volatility index', 'phoenix autocall')
+SUBMODULES = ('core', 'estimators', 'autocall', 'plotting', 'telemetry',
+              'data', 'chains', 'pipeline', 'series', 'bootstrap', 'service',
+              'vix', 'daycount', 'vrp')
+
+def add_script_dirs():
+    '''
+    将各个专题的目录加入sys.path，之后可以直接import volatility, VIX_old等模块
+    '''
+    for d in SCRIPT_DIRS:
+        path = os.path.join(ROOT, d)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+def __getattr__(name):
+    '''按需导入子模块（PEP 562）'''
+    if name in SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
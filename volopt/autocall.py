@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+phoenix.py中凤凰期权定价的向量化实现，只依赖numpy：
+路径由numpy的随机数生成器一次生成，所有路径的损益同时计算
+"""
+
+import numpy as np
+
+def mc_paths(S0, sigma, n, r=0.04, M=50000, days=20, seed=None,
+             schedule=None, year_days=None):
+    '''
+    以一天为步长，假定价格服从几何布朗运动，生成M条路径，参数与phoenix.mc_paths相同
+    Args:
+        seed:
+            随机数种子，相同的种子得到相同的路径；也可以是np.random.Generator
+        schedule:
+            每个月观察日的步数，见daycount.TradingCalendar.schedule，
+            默认为每月days个交易日
+        year_days:
+            每年的交易日数，默认为12 * days
+    Returns:
+        (步数 + 1) * M的numpy二维数组
+    '''
+    rng = np.random.default_rng(seed)
+    steps = n * days if schedule is None else int(schedule[-1])
+    dt = 1 / (12 * days if year_days is None else year_days)
+    z = rng.standard_normal((steps, M))
+    paths = np.empty((steps + 1, M))
+    paths[0] = 0
+    np.cumsum((r - 0.5 * sigma**2) * dt + sigma * np.sqrt(dt) * z, axis=0,
+              out=paths[1:])
+    return S0 * np.exp(paths)
+
+def observations(n, days=20, schedule=None):
+    '''每个月观察日在路径上的位置'''
+    if schedule is None:
+        return days * np.arange(1, n + 1)
+    return np.asarray(schedule, dtype=np.int64)[:n]
+
+def phoenix_pl(paths, n, upper, lower, coupon, days=20, schedule=None):
+    '''
+    计算所有路径期末的损益，与对每条路径调用phoenix.phoenix_pl相同
+    Args:
+        paths:
+            (n * days + 1) * M的价格路径，也可以是单条路径
+        n:
+            期限，月份数
+        upper:
+            向上敲出的价格
+        lower:
+            向下敲入的价格
+        coupon:
+            每月息票率
+        schedule:
+            每个月观察日的步数，各月的交易日数可以不同，默认为每月days个交易日
+    Returns:
+        每条路径上期权卖方的损益
+    '''
+    paths = np.asarray(paths, dtype=float)
+    single = paths.ndim == 1
+    if single:
+        paths = paths[:, None]
+    M = paths.shape[1]
+    ends = observations(n, days, schedule)
+    starts = np.concatenate([[0], ends[:-1]])
+    # 每个月是否敲入，第i个月为路径上第starts[i] + 1到ends[i]步
+    knock_in = np.logical_or.reduceat(paths[1:ends[-1] + 1] < lower, starts,
+                                      axis=0)
+    knock_out = paths[ends] > upper # 每个月末是否敲出
+    out = knock_out.any(axis=0)
+    # 敲出的路径只观察到敲出的月份为止
+    observed = np.where(out, knock_out.argmax(axis=0) + 1, n)
+    knock_in_months = np.cumsum(knock_in, axis=0)[observed - 1, np.arange(M)]
+    # 敲入了看跌期权的月份，不支付利息
+    interest = paths[0] * coupon * (observed - knock_in_months)
+    # 如果存续期内都没有敲出，则到期时考虑是否敲入了看跌期权
+    gain = np.maximum(paths[0] - paths[ends[-1]], 0)
+    pl = np.where(~out & knock_in.any(axis=0), gain - interest, interest)
+    return pl[0] if single else pl
+
+def phoenix_value(paths, n, upper, lower, coupon, r=0.04, days=20,
+                  schedule=None):
+    '''
+    所有路径期末损益的均值贴现回期初即为期权的价格
+    '''
+    pl = phoenix_pl(paths, n, upper, lower, coupon, days, schedule)
+    return pl.mean() / (1 + r * n / 12)
+
+def phoenix_delta(paths, n, upper, lower, coupon, r=0.04, days=20, point=0.01,
+                  schedule=None):
+    '''
+    所有路径同时上下变动point后价格之差除以标的价格变化，近似得到delta
+    '''
+    value_plus = phoenix_value(paths * (1 + point), n, upper, lower, coupon,
+                               r, days, schedule)
+    value_sub = phoenix_value(paths * (1 - point), n, upper, lower, coupon,
+                              r, days, schedule)
+    return (value_plus - value_sub) / (paths[0, 0] * point * 2)
+
+def phoenix(S0, sigmas, ns, upper, lower, coupon, r=0.04, M=50000, days=20,
+            seed=None, calendar=None, start=None):
+    '''
+    计算不同波动率，不同到期期限的凤凰期权的价格和delta，与phoenix.phoenix相同
+    Args:
+        calendar, start:
+            daycount.TradingCalendar和起始日，给出时按start之后每月最后一个
+            交易日观察（见TradingCalendar.month_ends），每年的交易日数由交易日历
+            估计；默认为每月days个交易日
+    Returns:
+        两个字典构成的元组，字典以期限、波动率为键，值分别为价格和delta值
+    '''
+    rng = np.random.default_rng(seed)
+    values = {}
+    deltas = {}
+    year_days = None if calendar is None else calendar.year_days()
+    for n in ns:
+        values[n] = {}
+        deltas[n] = {}
+        schedule = None if calendar is None else calendar.schedule(start, n)
+        for sigma in sigmas:
+            paths = mc_paths(S0, sigma, n, r, M, days, rng, schedule,
+                             year_days)
+            values[n][sigma] = phoenix_value(paths, n, upper, lower, coupon,
+                                             r, days, schedule=schedule)
+            deltas[n][sigma] = phoenix_delta(paths, n, upper, lower, coupon,
+                                             r, days, schedule=schedule)
+    return values, deltas
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+波动率估计的自助法置信区间。每个交易日的开、高、低、收拆成与价格水平无关的
+四个对数比值（隔夜跳空、最高、最低、收盘相对开盘），在每个滚动窗口内按块重抽样
+这些交易日，再累积回价格序列，六种波动率在所有重抽样上同时计算。
+每个日期的重抽样位置相互独立，一组日期的位置一次生成为整数数组，
+各组日期分给多个线程（或进程）计算
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from volopt.estimators import MODELS, rolling_array, windows
+
+def resample_indices(n, B, block=5, method='stationary', size=None, rng=None):
+    '''
+    一次生成B组块重抽样的位置，块在长度为n的序列上首尾相接（循环）
+    Args:
+        n:
+            原序列的长度
+        B:
+            重抽样的次数
+        block:
+            块的长度；method为'stationary'时为几何分布的块长的均值
+        method:
+            'stationary'：Politis-Romano平稳自助法，块长服从几何分布；
+            'block'：固定块长的循环块自助法
+        size:
+            每组重抽样的长度，默认为n
+        rng:
+            np.random.Generator或随机数种子
+    Returns:
+        B * size的整数数组
+    '''
+    rng = np.random.default_rng(rng)
+    size = n if size is None else size
+    step = np.arange(size)
+    if method == 'stationary':
+        new = rng.random((B, size)) < 1 / block # 每个位置以1/block的概率开始新块
+        new[:, 0] = True
+    elif method == 'block':
+        new = np.zeros((B, size), dtype=bool)
+        new[:, ::block] = True
+    else:
+        raise ValueError("method should be 'stationary' or 'block'")
+    # 每个位置所在块的起点，以及块在原序列中的随机起始位置
+    head = np.maximum.accumulate(np.where(new, step, 0), axis=1)
+    starts = rng.integers(0, n, (B, size))
+    return (np.take_along_axis(starts, head, axis=1) + step - head) % n
+
+def log_ratios(open, high, low, close):
+    '''
+    每个交易日（第一个交易日除外）的对数隔夜跳空、最高、最低和收盘相对开盘，
+    最后一维依次为这四项
+    '''
+    o, h, l, c = (np.log(np.asarray(x, dtype=float))
+                  for x in (open, high, low, close))
+    return np.stack([o[1:] - c[:-1], h[1:] - o[1:], l[1:] - o[1:],
+                     c[1:] - o[1:]], axis=-1)
+
+def rebuild(ratios):
+    '''
+    由对数比值累积回价格序列，第一个交易日的价格都为1
+    Args:
+        ratios:
+            最后两维为(交易日, 4)的数组
+    Returns:
+        open, high, low, close，最后一维比ratios的交易日多1
+    '''
+    gap, hi, lo, co = (ratios[..., j] for j in range(4))
+    close = np.cumsum(gap + co, axis=-1)
+    zero = np.zeros(close.shape[:-1] + (1,))
+    prev = np.concatenate([zero, close[..., :-1]], axis=-1)
+    open = prev + gap
+    return tuple(np.exp(np.concatenate([zero, x], axis=-1))
+                 for x in (open, open + hi, open + lo, close))
+
+def _bands(ratios, models, window, B, block, method, quantiles, N, seed):
+    '''
+    一组日期的重抽样和估计
+    Args:
+        ratios:
+            (日期数, window, 4)，每个日期对应窗口内的交易日
+    Returns:
+        dict, 模型为键，值为(len(quantiles), 日期数)的分位数和每个日期的标准差
+    '''
+    # 每个日期各自独立地重抽样，相邻日期的置信区间不共用同一组随机位置
+    n = len(ratios)
+    idx = resample_indices(window, n * B, block, method, rng=seed)
+    idx = idx.reshape(n, B, window)
+    sample = ratios[np.arange(n)[:, None, None], idx] # (日期数, B, window, 4)
+    prices = rebuild(sample)
+    result = {}
+    for model in models:
+        # 长度为window + 1的序列，最后一个窗口就是重抽样的交易日
+        vol = rolling_array(model, window, *prices, N=N)[..., -1]
+        result[model] = (np.nanquantile(vol, quantiles, axis=1),
+                         np.nanstd(vol, axis=1, ddof=1))
+    return result
+
+def confidence_bands(window, open, high, low, close, models=MODELS, B=1000,
+                     block=5, method='stationary', alpha=0.05, N=240,
+                     jobs=None, processes=False, chunk=None, seed=None):
+    '''
+    用块重抽样计算滚动波动率的置信区间
+    Args:
+        window:
+            窗口期长度，每个窗口包含window个交易日（及前一日的收盘价）
+        open, high, low, close:
+            价格序列，为pandas序列时结果以日期为索引
+        models:
+            计算的模型，默认为六种全部
+        B:
+            每个日期的重抽样次数
+        block, method:
+            块长和重抽样方法，见resample_indices；日收益率的相关性越强，块长应越长
+        alpha:
+            置信区间为[alpha / 2, 1 - alpha / 2]分位数
+        jobs:
+            线程（或进程）数，默认为CPU数
+        processes:
+            是否使用进程池，numpy的运算大多释放GIL，一般用线程即可
+        chunk:
+            每次计算的日期数，默认使重抽样数据约为32MB
+        seed:
+            随机数种子
+    Returns:
+        DataFrame，列为(模型, lower/median/upper/std)，每行对应窗口最后一个交易日
+    '''
+    ratios = log_ratios(open, high, low, close)
+    view = windows(ratios.T, window).transpose(1, 2, 0) # (日期数, window, 4)
+    n = len(view)
+    if chunk is None:
+        chunk = max(1, (32 << 20) // (B * window * 4 * 8))
+    quantiles = [alpha / 2, 0.5, 1 - alpha / 2]
+    seeds = np.random.SeedSequence(seed).spawn((n + chunk - 1) // chunk)
+    tasks = [(np.ascontiguousarray(view[i: i + chunk]), models, window, B,
+              block, method, quantiles, N, np.random.default_rng(s))
+             for i, s in zip(range(0, n, chunk), seeds)]
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(jobs or os.cpu_count()) as executor:
+        parts = list(executor.map(_bands, *zip(*tasks)))
+
+    columns = {}
+    for model in models:
+        q = np.concatenate([p[model][0] for p in parts], axis=1)
+        columns[(model, 'lower')] = q[0]
+        columns[(model, 'median')] = q[1]
+        columns[(model, 'upper')] = q[2]
+        columns[(model, 'std')] = np.concatenate([p[model][1] for p in parts])
+    index = getattr(close, 'index', None)
+    import pandas as pd
+    return pd.DataFrame(columns, index=None if index is None
+                        else index[len(index) - n:])
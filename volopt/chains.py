@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+按(date, expire, strike)排序保存的期权数据，采用紧凑的数据类型，并建立交易日到行范围
+的索引，读取某一段日期时只对内存映射的文件切片，不读取整个文件
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+STRIKE_UNIT = 10000 #执行价以0.0001为单位保存为整数，分红调整后的执行价也能精确保存
+PRICES = ('call', 'put')
+DAYS = ('T_days', 'last1', 'last2', 'last3')
+
+def to_days(dates):
+    '''日期转换为距1970-01-01的天数'''
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+def from_days(days):
+    '''天数转换回日期'''
+    return (EPOCH + days).astype('datetime64[ns]')
+
+def near_expiries(chain, min_days=7, count=3):
+    '''
+    任意标的的期权数据整理为与VIX_data_clean.py的结果相同的格式：
+    没有T_days列时按自然日计算剩余到期天数，并加入last1, last2, last3列，
+    即每个交易日剩余到期天数大于min_days的前三个到期日的T_days
+    Args:
+        chain:
+            长格式的期权数据，包含date, expire, strike, call, put列
+    Returns:
+        增加了T_days和last列的DataFrame，不足的到期日为-1
+    '''
+    chain = chain.copy()
+    if 'T_days' not in chain.columns:
+        chain['T_days'] = (chain['expire'] - chain['date']).dt.days
+    pairs = chain.loc[chain['T_days'] > min_days, ['date', 'T_days']]\
+                 .drop_duplicates().sort_values(['date', 'T_days'])
+    pairs['rank'] = pairs.groupby('date').cumcount()
+    table = pairs[pairs['rank'] < count].pivot(index='date', columns='rank',
+                                               values='T_days')
+    for i in range(count):
+        column = table[i] if i in table.columns\
+                 else pd.Series(np.nan, index=table.index)
+        chain['last%d' % (i + 1)] = chain['date'].map(column).fillna(-1)\
+                                                 .astype(int)
+    return chain
+
+def write_store(chain, path):
+    '''
+    保存期权数据
+    Args:
+        chain:
+            长格式的期权数据，包含date, expire, strike, call, put列，
+            可以包含T_days, last1, last2, last3列
+        path:
+            保存的目录
+    存储格式：
+        date: int32天数；expire: int16到期日编码，到期日表保存在expires.npy；
+        strike: int32，单位0.0001；call, put: float32；
+        天数列: int16，缺失的值（如不足三个到期日时的last3）保存为-1，
+        与near_expiries相同；
+        index_dates和index_starts为每个交易日及其第一行的位置
+    '''
+    chain = chain.sort_values(['date', 'expire', 'strike'], kind='mergesort')
+    date = to_days(chain['date'])
+    expire_days = to_days(chain['expire'])
+    expires, expire_code = np.unique(expire_days, return_inverse=True)
+    arrays = {
+        'date': date,
+        'expire': expire_code.astype(np.int16),
+        'strike': np.round(chain['strike'].to_numpy(dtype=float)
+                           * STRIKE_UNIT).astype(np.int32)}
+    for column in PRICES:
+        arrays[column] = chain[column].to_numpy(dtype=np.float32)
+    for column in DAYS:
+        if column in chain.columns:
+            days = chain[column].to_numpy(dtype=float)
+            arrays[column] = np.where(np.isnan(days), -1, days)\
+                               .astype(np.int16)
+    index_dates, index_starts = np.unique(date, return_index=True)
+
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), values)
+    np.save(os.path.join(tmp, 'expires.npy'), expires.astype(np.int32))
+    np.save(os.path.join(tmp, 'index_dates.npy'), index_dates)
+    np.save(os.path.join(tmp, 'index_starts.npy'),
+            np.append(index_starts, len(date)).astype(np.int64))
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump({'columns': list(arrays), 'rows': len(date)}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+class ChainStore():
+    '''
+    读取write_store保存的期权数据，列以内存映射方式打开，按日期范围切片
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.columns = json.load(f)['columns']
+        self.expires = np.load(os.path.join(path, 'expires.npy'))
+        self.index_dates = np.load(os.path.join(path, 'index_dates.npy'))
+        self.index_starts = np.load(os.path.join(path, 'index_starts.npy'))
+        self.arrays = {name: np.load(os.path.join(path, name + '.npy'),
+                                     mmap_mode='r')
+                       for name in self.columns}
+
+    @property
+    def dates(self):
+        '''所有交易日'''
+        return pd.DatetimeIndex(from_days(self.index_dates))
+
+    def rows(self, start=None, end=None):
+        '''
+        日期范围[start, end]对应的行范围，由索引二分查找得到
+        '''
+        lo = 0 if start is None else np.searchsorted(
+            self.index_dates, to_days([start])[0], side='left')
+        hi = len(self.index_dates) if end is None else np.searchsorted(
+            self.index_dates, to_days([end])[0], side='right')
+        return int(self.index_starts[lo]), int(self.index_starts[hi])
+
+    def slice(self, start=None, end=None):
+        '''
+        返回日期范围内各列原始紧凑格式的数组，均为内存映射文件的视图
+        '''
+        lo, hi = self.rows(start, end)
+        return {name: values[lo:hi] for name, values in self.arrays.items()}
+
+    def load(self, start=None, end=None):
+        '''
+        返回日期范围内的期权数据，格式与VIX_data_clean.py的结果相同，
+        call、put保持float32；天数列为int16，缺失的值为-1而不是nan
+        Args:
+            start, end:
+                起止日期，包含两端，为None时不限制
+        '''
+        arrays = self.slice(start, end)
+        chain = {'date': from_days(arrays['date']),
+                 'expire': from_days(self.expires[arrays['expire']]),
+                 'strike': arrays['strike'] / STRIKE_UNIT}
+        for name in self.columns:
+            if name not in chain:
+                chain[name] = arrays[name]
+        return pd.DataFrame(chain, copy=False)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+只依赖numpy的基础函数：正态分布、Black-Scholes公式和隐含波动率，
+代替scipy.stats.norm，导入时不需要加载scipy
+"""
+
+from math import erfc, exp, sqrt, pi
+
+import numpy as np
+
+SQRT2 = sqrt(2)
+SQRT2PI = sqrt(2 * pi)
+
+def norm_pdf(x):
+    '''标准正态分布的密度函数'''
+    if np.ndim(x) == 0:
+        return exp(-0.5 * x * x) / SQRT2PI
+    x = np.asarray(x, dtype=float)
+    return np.exp(-0.5 * x * x) / SQRT2PI
+
+def norm_cdf(x):
+    '''
+    标准正态分布的分布函数
+    标量用math.erfc；数组用Hart(1968)的有理逼近（见West, 2005），绝对误差约1e-16
+    '''
+    if np.ndim(x) == 0:
+        return 0.5 * erfc(-x / SQRT2)
+    x = np.asarray(x, dtype=float)
+    a = np.abs(x)
+    e = np.exp(-0.5 * a * a)
+    with np.errstate(over='ignore', invalid='ignore'):
+        num = ((((((0.0352624965998911 * a + 0.700383064443688) * a
+                   + 6.37396220353165) * a + 33.912866078383) * a
+                 + 112.079291497871) * a + 221.213596169931) * a
+               + 220.206867912376)
+        den = (((((((0.0883883476483184 * a + 1.75566716318264) * a
+                    + 16.064177579207) * a + 86.7807322029461) * a
+                  + 296.564248779674) * a + 637.333633378831) * a
+                + 793.826512519948) * a + 440.413735824752)
+        b = a + 0.65
+        b = a + 4 / b
+        b = a + 3 / b
+        b = a + 2 / b
+        b = a + 1 / b
+        tail = np.where(a < 7.07106781186547, e * num / den, e / b / SQRT2PI)
+    tail = np.where(a > 37, 0.0, tail)
+    return np.where(x > 0, 1 - tail, tail)
+
+def d1(S, K, r, sigma, T):
+    '''B-S公式中的d1'''
+    return (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
+
+def bs_value(S, K, r, sigma, T, kind='call'):
+    '''
+    计算欧式期权的B-S价格，参数可以是标量或数组
+    Parameters:
+        S:
+            标的价格
+        K:
+            执行价格
+        r:
+            无风险利率
+        sigma:
+            波动率
+        T:
+            期权的期限，以年为单位
+        kind:
+            'call'或'put'
+    '''
+    D1 = d1(S, K, r, sigma, T)
+    D2 = D1 - sigma * np.sqrt(T)
+    call = S * norm_cdf(D1) - K * np.exp(-r * T) * norm_cdf(D2)
+    if kind == 'call':
+        return call
+    return call - S + K * np.exp(-r * T) #看跌看涨平价
+
+def bs_vega(S, K, r, sigma, T):
+    '''期权价格关于波动率的导数，看涨看跌相同'''
+    return S * norm_pdf(d1(S, K, r, sigma, T)) * np.sqrt(T)
+
+def implied_vol(price, S, K, r, T, kind='call', method='newton', sigma=0.3,
+                N=50, low=1e-4, high=5):
+    '''
+    对所有期权同时求解隐含波动率
+    Args:
+        price:
+            期权价格，标量或数组
+        method:
+            'newton'：牛顿迭代N次，与VIX_old.IV.newton相同，不收敛时可能得到nan；
+            'bisect'：在[low, high]中二分N次，价格超出该区间对应的价格时为nan
+        sigma:
+            牛顿法的初始值
+    '''
+    price = np.asarray(price, dtype=float)
+    if method == 'newton':
+        with np.errstate(all='ignore'):
+            for i in range(N):
+                sigma = sigma - (bs_value(S, K, r, sigma, T, kind) - price)\
+                              / bs_vega(S, K, r, sigma, T)
+        return sigma
+    elif method == 'bisect':
+        shape = np.broadcast(price, S, K, r, T).shape
+        low = np.full(shape, low, dtype=float)
+        high = np.full(shape, high, dtype=float)
+        valid = (bs_value(S, K, r, low, T, kind) <= price)\
+              & (bs_value(S, K, r, high, T, kind) >= price)
+        for i in range(N):
+            mid = (low + high) / 2
+            above = bs_value(S, K, r, mid, T, kind) > price
+            high = np.where(above, mid, high)
+            low = np.where(above, low, mid)
+        return np.where(valid, (low + high) / 2, np.nan)
+    raise ValueError("method should be 'newton' or 'bisect'")
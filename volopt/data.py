@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+统一的数据读取层：第一次读取Wind导出的Excel（或market.h5）时，将其按列转换为
+numpy的.npy文件保存在缓存目录，之后直接以内存映射的方式读取，源文件的修改时间
+或内容变化时自动重新转换
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from volopt import telemetry
+
+_root = None
+
+def data_root():
+    '''
+    数据目录，优先级：set_data_root设定的目录 > 环境变量VOLOPT_DATA > 仓库中的data目录
+    '''
+    if _root is not None:
+        return _root
+    default = os.path.join(os.path.dirname(os.path.dirname(
+                           os.path.abspath(__file__))), 'data')
+    return os.environ.get('VOLOPT_DATA', default)
+
+def set_data_root(path):
+    '''设定数据目录，原来程序中的'E:/data'可以通过这里设定'''
+    global _root
+    _root = path
+
+def cache_root():
+    '''缓存目录，默认为数据目录下的.cache，可以用环境变量VOLOPT_CACHE修改'''
+    return os.environ.get('VOLOPT_CACHE', os.path.join(data_root(), '.cache'))
+
+def source_path(name):
+    '''相对路径按数据目录解析，绝对路径保持不变'''
+    return name if os.path.isabs(name) else os.path.join(data_root(), name)
+
+def file_hash(path, chunk=1 << 20):
+    '''文件内容的sha1'''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def module_hash(module):
+    '''模块源代码的sha1，不必导入模块'''
+    return file_hash(importlib.util.find_spec(module).origin)
+
+def fingerprint(name):
+    '''
+    源文件的修改时间和大小，两者都没有变化时不必重新计算sha1
+    Returns:
+        dict, 包含mtime, size
+    '''
+    path = source_path(name)
+    stat = os.stat(path)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+def cache_dir(name, reader, kwargs):
+    '''每个源文件和每组读取参数对应一个缓存子目录'''
+    key = json.dumps([os.path.abspath(source_path(name)), reader, kwargs],
+                     sort_keys=True, default=str, ensure_ascii=False)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return os.path.join(cache_root(), '%s-%s' % (stem,
+                        hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]))
+
+def _save_column(path, values):
+    '''
+    保存一列，返回写入manifest的列信息
+    数值和日期直接保存，字符串保存为类别编码和类别（同时记录原来的dtype），
+    其余的object列用pickle保存
+    '''
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype.kind in 'OU'\
+       or isinstance(values.dtype, pd.StringDtype):
+        strings = values.dropna()
+        if strings.map(lambda x: isinstance(x, str)).all():
+            cat = pd.Categorical(values)
+            np.save(path, cat.codes)
+            np.save(path[:-4] + '.cat.npy',
+                    np.asarray(cat.categories, dtype=str))
+            return {'kind': 'category', 'dtype': str(values.dtype)}
+        np.save(path, values.to_numpy(dtype=object), allow_pickle=True)
+        return {'kind': 'object'}
+    np.save(path, values.to_numpy())
+    return {'kind': 'array'}
+
+def _load_column(path, info, mmap):
+    '''
+    读取一列，数值和日期以内存映射方式读取，不复制数据；
+    字符串列由类别编码还原为原来的dtype（object或str），原来为category时保持不变
+    '''
+    if info['kind'] == 'object':
+        return np.load(path, allow_pickle=True)
+    values = np.load(path, mmap_mode='r' if mmap else None)
+    if info['kind'] == 'category':
+        categories = np.load(path[:-4] + '.cat.npy', allow_pickle=False)
+        cat = pd.Categorical.from_codes(np.asarray(values),
+                                        categories.astype(object))
+        dtype = info.get('dtype', 'object')
+        if dtype == 'category':
+            return cat
+        if dtype == 'object':
+            return np.asarray(cat, dtype=object)
+        return pd.array(np.asarray(cat, dtype=object), dtype=dtype)
+    return values
+
+def write_cache(frame, directory, source):
+    '''
+    将DataFrame按列写入缓存目录，先写入临时目录再改名，避免读到写了一半的缓存；
+    临时目录按进程区分，多个进程同时转换同一个文件时互不影响
+    Returns:
+        实际使用的缓存的manifest，其他进程先写入了同样的缓存时为其manifest
+    '''
+    tmp = '%s.tmp%d' % (directory, os.getpid())
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = []
+    index = frame.index
+    if not isinstance(index, pd.RangeIndex) or index.start != 0\
+       or index.step != 1:
+        frame = frame.reset_index()
+        index_names = [c if c is not None else 'index' for c in index.names]
+    else:
+        index_names = None
+    for i, column in enumerate(frame.columns):
+        info = _save_column(os.path.join(tmp, '%d.npy' % i), frame[column])
+        info['name'] = column
+        columns.append(info)
+    manifest = {'source': source, 'columns': columns, 'index': index_names}
+    write_manifest(tmp, manifest)
+    try:
+        os.replace(tmp, directory)
+        return manifest
+    except OSError: # 缓存目录已经存在
+        pass
+    # 不能先删除已有的目录：其他进程可能刚刚写入了有效的缓存，正在读取。
+    # 已有的缓存与本次的源文件内容相同时直接使用；过期时先改名再删除，
+    # 放入新的缓存，改名期间又被其他进程抢先时使用其写入的缓存
+    current = read_manifest(directory)
+    if current is None or current['source'].get('sha1') != source['sha1']:
+        old = '%s.old%d' % (directory, os.getpid())
+        shutil.rmtree(old, ignore_errors=True)
+        try:
+            os.replace(directory, old)
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(tmp, directory)
+            return manifest
+        except OSError:
+            current = read_manifest(directory)
+    shutil.rmtree(tmp, ignore_errors=True)
+    return current
+
+def read_manifest(directory):
+    '''读取缓存的manifest，缓存不存在时返回None'''
+    try:
+        with open(os.path.join(directory, 'manifest.json'),
+                  encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(directory, manifest):
+    '''保存manifest'''
+    with open(os.path.join(directory, 'manifest.json'), 'w',
+              encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, default=str)
+
+def is_fresh(name, directory, manifest):
+    '''
+    判断缓存是否仍然有效：修改时间和大小相同即有效；
+    否则比较内容的sha1，内容没变时更新缓存记录的修改时间
+    '''
+    if manifest is None:
+        return False
+    current = fingerprint(name)
+    cached = manifest['source']
+    if current['mtime'] == cached['mtime'] and current['size'] == cached['size']:
+        return True
+    if current['size'] != cached['size']\
+       or file_hash(source_path(name)) != cached['sha1']:
+        return False
+    cached.update(current)
+    write_manifest(directory, manifest)
+    return True
+
+def columns(name, reader='excel', mmap=True, **kwargs):
+    '''
+    以numpy数组的形式读取一个数据源的所有列，必要时先转换并缓存
+    Args:
+        name:
+            文件名，相对于数据目录，如'zz500.xlsx'
+        reader:
+            'excel'或'hdf'
+        mmap:
+            是否以内存映射方式读取
+        kwargs:
+            传给pd.read_excel或pd.read_hdf的参数，不同参数分别缓存
+    Returns:
+        dict, 列名为键，数组为值（数值和日期列为内存映射的数组）；
+        以及索引列名的列表，没有索引时为None
+    '''
+    t0 = time.perf_counter()
+    directory = cache_dir(name, reader, kwargs)
+    manifest = read_manifest(directory)
+    hit = is_fresh(name, directory, manifest)
+    if not hit:
+        path = source_path(name)
+        if reader == 'excel':
+            frame = pd.read_excel(path, **kwargs)
+        elif reader == 'hdf':
+            frame = pd.read_hdf(path, **kwargs)
+        else:
+            raise ValueError("reader should be 'excel' or 'hdf'")
+        source = fingerprint(name)
+        source['sha1'] = file_hash(path)
+        manifest = write_cache(frame, directory, source)
+    cols = {info['name']: _load_column(os.path.join(directory, '%d.npy' % i),
+                                       info, mmap)
+            for i, info in enumerate(manifest['columns'])}
+    telemetry.record('data', 'volopt.data', source=name, reader=reader,
+                     cache_hit=hit, seconds=time.perf_counter() - t0)
+    return cols, manifest['index']
+
+def read(name, reader='excel', mmap=True, **kwargs):
+    '''
+    读取一个数据源，返回DataFrame，列的dtype与pd.read_excel的结果相同。
+    pandas 3中数值列直接引用内存映射的数组；较早的pandas构造DataFrame时会把同类型
+    的列合并为一块，此时复制一次。不需要DataFrame时用columns，不复制数据
+    '''
+    cols, index = columns(name, reader, mmap, **kwargs)
+    frame = pd.DataFrame(cols, copy=False)
+    if index is not None:
+        frame = frame.set_index(index)
+    return frame
+
+def read_excel(name, **kwargs):
+    '''代替pd.read_excel，参数相同'''
+    return read(name, 'excel', **kwargs)
+
+def read_hdf(name, key, **kwargs):
+    '''代替pd.HDFStore中按key读取，如read_hdf('market.h5', '50ETF_option_VIX')'''
+    return read(name, 'hdf', key=key, **kwargs)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+日期和期限的统一计算：自然日数、由数据中实际交易日得到的交易日数、
+凤凰期权每月最后一个交易日的观察时间表，以及各种计息基准下的年化期限。
+全部为数组运算，数据之外的日期按周一至周五估计交易日
+"""
+
+import numpy as np
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+def to_days(dates):
+    '''日期（数组、Series或DatetimeIndex）转换为距1970-01-01的天数'''
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int64)
+
+def calendar_days(start, end):
+    '''
+    两组日期之间的自然日数，代替逐行的(expire - date).apply(lambda x: x.days)
+    '''
+    return to_days(end) - to_days(start)
+
+class TradingCalendar():
+    '''
+    由实际交易日构成的交易日历
+    '''
+    def __init__(self, dates):
+        '''
+        dates:
+            交易日，可以有重复，不必排序，如期权数据的date列或指数的日期索引
+        '''
+        self.days = np.unique(to_days(dates))
+        self.first = self.days[0]
+        self.last = self.days[-1]
+        years = (EPOCH + self.days).astype('datetime64[Y]').astype(int)
+        full = np.bincount(years - years[0])[1:-1]
+        self._year_days = float(full.mean()) if len(full) else 240.0
+        self._fractions = {} #标量日期的year_fraction，只属于这个实例
+
+    @classmethod
+    def from_excel(cls, name='zz500.xlsx', column='date'):
+        '''由数据目录中某个Excel文件的日期列建立交易日历'''
+        from volopt.data import columns
+        cols, index = columns(name)
+        return cls(cols[column])
+
+    def _count(self, days):
+        '''
+        不晚于days的交易日个数：数据范围内按实际交易日，之后按工作日外推
+        '''
+        days = np.asarray(days, dtype=np.int64)
+        count = np.searchsorted(self.days, days, side='right')
+        beyond = days > self.last
+        if beyond.any():
+            d = (EPOCH + np.maximum(days, self.last)).astype('datetime64[D]')
+            last = (EPOCH + self.last).astype('datetime64[D]')
+            count = count + np.where(beyond,
+                                     np.busday_count(last + 1, d + 1), 0)
+        return count
+
+    def trading_days(self, start, end):
+        '''
+        start之后到end（含）的交易日数，即从start持有到end经过的交易日
+        '''
+        return self._count(to_days(end)) - self._count(to_days(start))
+
+    def offset(self, start, n):
+        '''start之后第n个交易日'''
+        days = to_days(start)
+        pos = np.searchsorted(self.days, days, side='right') - 1 + n
+        inside = pos < len(self.days)
+        result = self.days[np.minimum(pos, len(self.days) - 1)]
+        if not np.all(inside):
+            extra = pos - (len(self.days) - 1)
+            last = (EPOCH + self.last).astype('datetime64[D]')
+            later = to_days(np.busday_offset(last, np.maximum(extra, 0),
+                                             roll='forward'))
+            result = np.where(inside, result, later)
+        return (EPOCH + result).astype('datetime64[D]')
+
+    def year_days(self):
+        '''
+        每年的平均交易日数，由数据中完整的年份估计，没有完整年份时为240
+        '''
+        return self._year_days
+
+    def month_ends(self, start, n, min_gap=10):
+        '''
+        start之后n个月每月的最后一个交易日，用作凤凰期权的观察日。
+        start所在月份的最后一个交易日在start之后至少min_gap个交易日时，
+        第一个观察日为当月的月末，否则为下个月的月末（如start为2018-09-03时
+        第一个观察日为2018-09-28，start为2018-09-20时为2018-10-31）；
+        数据之外的月末按周一至周五向前取最近的工作日。
+        start早于交易日历的第一天时无法确定交易日，报错
+        '''
+        day = np.datetime64(start, 'D')
+        if to_days(day) < self.first:
+            raise ValueError('start %s is before the first trading day %s'
+                             % (day, (EPOCH + self.first).astype('datetime64[D]')))
+        month = np.datetime64(day, 'M')
+        months = month + np.arange(0, n + 2)
+        # 下个月第一天之前的最后一个交易日，依次为当月到之后第n个月
+        ends = to_days(months[1:].astype('datetime64[D]')) - 1
+        pos = np.searchsorted(self.days, ends, side='right') - 1
+        inside = ends <= self.last
+        ends = np.where(inside, self.days[pos], ends)
+        rolled = np.busday_offset((EPOCH + ends).astype('datetime64[D]'), 0,
+                                  roll='backward')
+        ends = np.where(inside, (EPOCH + ends).astype('datetime64[D]'), rolled)
+        skip = int(self.trading_days(day, ends[0]) < min_gap)
+        return ends[skip: skip + n]
+
+    def schedule(self, start, n, min_gap=10):
+        '''
+        从start开始n个月的观察时间表，供autocall.mc_paths和phoenix_pl使用，
+        观察日见month_ends
+        Returns:
+            每个月末观察日距start的交易日数（即路径上的步数）
+        '''
+        return self.trading_days(start, self.month_ends(start, n, min_gap))
+
+    def _fraction(self, start, end, basis):
+        key = (start, end, basis)
+        if key not in self._fractions:
+            if len(self._fractions) >= 4096:
+                self._fractions.clear()
+            self._fractions[key] = float(self.year_fraction(
+                np.array([start]), np.array([end]), basis)[0])
+        return self._fractions[key]
+
+    def year_fraction(self, start, end, basis='act/365'):
+        '''
+        以年为单位的期限
+        Args:
+            basis:
+                'act/365'：自然日/365，与Vix和VIX_old.IV相同；
+                'bus'：交易日/每年的平均交易日数；
+                'bus/240'：交易日/240，与implied_volatility.py相同
+        '''
+        if np.ndim(start) == 0 and np.ndim(end) == 0:
+            return self._fraction(str(np.datetime64(start, 'D')),
+                                  str(np.datetime64(end, 'D')), basis)
+        if basis == 'act/365':
+            return calendar_days(start, end) / 365
+        if basis == 'bus':
+            return self.trading_days(start, end) / self.year_days()
+        if basis == 'bus/240':
+            return self.trading_days(start, end) / 240
+        raise ValueError("basis should be 'act/365', 'bus' or 'bus/240'")
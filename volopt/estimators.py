@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+volatility.py中六种波动率的向量化实现，只依赖numpy，
+滚动窗口用sliding_window_view一次算出所有窗口，结果与rolling_volatility相同
+"""
+
+from math import log
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MODELS = ('realized', 'parkinson', 'garman_klass', 'roger_satchell',
+          'garkla_yangzh', 'yang_zhang')
+GK = 2 * log(2) - 1
+
+def lags(model):
+    '''
+    每个窗口需要的比窗口长度多出的交易日数：用到前一日收盘价的方法需要window+1天
+    '''
+    return 1 if model in ('realized', 'garkla_yangzh', 'yang_zhang') else 0
+
+def windows(x, window):
+    '''最后一维按窗口长度展开，不复制数据'''
+    return sliding_window_view(x, window, axis=-1)
+
+def _terms(model, open, high, low, close):
+    '''
+    每个交易日进入求和的项，最后一维为时间，比价格序列短lags(model)
+    '''
+    if model == 'realized':
+        return np.diff(np.log(close), axis=-1)
+    if model == 'parkinson':
+        return np.log(high / low) ** 2
+    hl = np.log(high / low) ** 2
+    co = np.log(close / open) ** 2
+    if model == 'garman_klass':
+        return hl / 2 - GK * co
+    rs = np.log(high / close) * np.log(high / open)\
+       + np.log(low / close) * np.log(low / open)
+    if model == 'roger_satchell':
+        return rs
+    oc = np.log(open[..., 1:] / close[..., :-1])
+    if model == 'garkla_yangzh':
+        return oc ** 2 + hl[..., 1:] / 2 - GK * co[..., 1:]
+    raise ValueError('unknown model: %s' % model)
+
+def rolling_array(model, window, open=None, high=None, low=None, close=None,
+                  N=240):
+    '''
+    计算滚动窗口的年化波动率
+    Args:
+        model:
+            MODELS中的一种
+        window:
+            窗口期长度，即每个窗口的收益率观测值数量
+        open, high, low, close:
+            价格数组，最后一维为时间，前面的维度可以是多组价格（如自助法的重抽样）
+    Returns:
+        最后一维长度为len - window + 1 - lags(model)的数组，第i个值对应
+        第i + window - 1 + lags(model)个交易日
+    '''
+    arrays = [None if x is None else np.asarray(x, dtype=float)
+              for x in (open, high, low, close)]
+    open, high, low, close = arrays
+    if model == 'realized':
+        return np.sqrt(windows(_terms(model, open, high, low, close),
+                               window).var(axis=-1, ddof=1) * N)
+    if model == 'parkinson':
+        s = windows(_terms(model, open, high, low, close), window).sum(axis=-1)
+        return np.sqrt(s * N / (4 * window * log(2)))
+    if model in ('garman_klass', 'roger_satchell', 'garkla_yangzh'):
+        s = windows(_terms(model, open, high, low, close), window).sum(axis=-1)
+        return np.sqrt(s * N / window)
+    if model == 'yang_zhang':
+        n = window
+        oc = windows(np.log(open[..., 1:] / close[..., :-1]), n)
+        co = windows(np.log(close[..., 1:] / open[..., 1:]), n)
+        rs = windows(_terms('roger_satchell', open[..., 1:], high[..., 1:],
+                            low[..., 1:], close[..., 1:]), n)
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        return np.sqrt(oc.var(axis=-1, ddof=1) * N
+                       + k * co.var(axis=-1, ddof=1) * N
+                       + (1 - k) * rs.sum(axis=-1) * N / n)
+    raise ValueError('model must be one kind of these models: %s'
+                     % ', '.join(MODELS))
+
+def rolling(model, window, open=None, high=None, low=None, close=None, N=240):
+    '''
+    与volatility.rolling_volatility相同的滚动波动率；输入为pandas序列时返回以
+    窗口最后一日为索引的Series（此时才导入pandas），否则返回数组
+    '''
+    vol = rolling_array(model, window, open, high, low, close, N)
+    ref = close if close is not None else high
+    index = getattr(ref, 'index', None)
+    if index is None:
+        return vol
+    import pandas as pd
+    return pd.Series(vol, index=index[len(index) - vol.shape[-1]:])
+
+def volatility(model, open=None, high=None, low=None, close=None, N=240):
+    '''整个序列作为一个窗口的波动率，与volatility.py中的各函数相同'''
+    ref = close if close is not None else high
+    window = np.shape(ref)[-1] - lags(model)
+    return rolling_array(model, window, open, high, low, close, N)[..., -1]
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+从数据整理到各项计算的流水线。每个环节声明输入的数据文件、依赖的上游环节和参数，
+结果按输入的指纹缓存，输入没有变化的环节直接跳过，互不依赖的环节在多个进程中同时运行；
+画图是单独的可选环节，批量运行时不必加载matplotlib
+
+    python -m volopt.pipeline                      运行所有计算环节
+    python -m volopt.pipeline vix_new vix_old      只运行指定环节（及其上游）
+    python -m volopt.pipeline --plot --jobs 4      同时画图，4个进程
+    python -m volopt.pipeline --list               列出所有环节
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from time import perf_counter
+
+from volopt import add_script_dirs
+from volopt.data import (cache_root, data_root, file_hash, module_hash,
+                         source_path)
+
+add_script_dirs()
+
+Stage = namedtuple('Stage', ['func', 'sources', 'deps', 'modules', 'params',
+                             'plot'])
+
+def stage(func, sources=(), deps=(), modules=(), params=None, plot=False):
+    '''
+    声明一个环节
+    Args:
+        func:
+            计算函数，接收上游结果组成的dict和params
+        sources:
+            读取的数据文件，相对于数据目录
+        deps:
+            上游环节的名称
+        modules:
+            用到的模块，源代码变化时结果也会重新计算
+        plot:
+            是否为画图环节，画图环节不缓存，只在--plot时运行
+    '''
+    return Stage(func, tuple(sources), tuple(deps), tuple(modules),
+                 params or {}, plot)
+
+# 各个环节的计算，在子进程中运行，必须是模块级的函数
+
+def run_chain(inputs, params):
+    '''整理期权数据，同时保存按日期索引的期权数据'''
+    from VIX_data_clean import clean_options
+    from volopt.chains import write_store
+    from volopt.data import read_excel
+    basic = read_excel(params['basic'])
+    options = clean_options(basic, [read_excel(name)
+                                    for name in params['daily']])
+    write_store(options, os.path.join(data_root(), '50ETF_option_VIX'))
+    return options
+
+def run_vix_new(inputs, params):
+    from VIX_batch import vix_batch
+    from volopt.data import read_excel
+    shibor = read_excel('shibor_3M.xlsx', index_col='date')
+    return vix_batch(inputs['chain'], shibor['shibor_3M'])
+
+def run_term_structure(inputs, params):
+    from VIX_batch import constant_maturity
+    from volopt.data import read_excel
+    shibor = read_excel('shibor_3M.xlsx', index_col='date')
+    return constant_maturity(inputs['chain'], shibor['shibor_3M'],
+                             params['targets'])
+
+def run_vix_old(inputs, params):
+    import pandas as pd
+    from VIX_old import select_nearest, implied_vols, whaley_vix
+    from volopt.data import read_excel
+    shibor = read_excel('shibor_3M.xlsx')
+    close = read_excel('50ETF基金净值表现日数据.xlsx')
+    close['date'] = pd.to_datetime(close['date'])
+    data = pd.merge(inputs['chain'], shibor, on='date', how='left')
+    data = pd.merge(data, close.loc[:, ['date', 'close']], on='date', how='left')
+    return whaley_vix(implied_vols(select_nearest(data)))
+
+def zz500():
+    '''读取中证500指数数据，以日期为索引'''
+    import pandas as pd
+    from volopt.data import read_excel
+    data = read_excel('zz500.xlsx')
+    return data.set_index(pd.to_datetime(data['date']))
+
+def run_volatility(inputs, params):
+    import pandas as pd
+    from volopt import series
+    from volopt.estimators import rolling
+    data = zz500().loc[:, ['open', 'high', 'low', 'close']]
+    window = params['window']
+    version = module_hash('volopt.estimators')
+    vols = {}
+    for model in params['models']:
+        def compute(d, model=model):
+            return rolling(model, window, d['open'], d['high'], d['low'],
+                           d['close'])
+        vols[model] = series.update('rolling_volatility',
+                                    {'source': 'zz500.xlsx', 'model': model,
+                                     'window': window, 'module': version},
+                                    data, compute, before=window)
+    return pd.DataFrame(vols)
+
+def run_bands(inputs, params):
+    from volopt.bootstrap import confidence_bands
+    data = zz500()
+    return confidence_bands(params['window'], data['open'], data['high'],
+                            data['low'], data['close'], B=params['B'],
+                            block=params['block'], seed=params['seed'])
+
+def rates(close, shibor):
+    '''与收盘价对齐的Shibor，作为增量计算的输入之一'''
+    import pandas as pd
+    return pd.DataFrame({'close': close,
+                         'r': shibor['shibor_3M'].reindex(close.index)})
+
+def run_implied(inputs, params):
+    import pandas as pd
+    from implied_volatility import rolling_implied
+    from volopt import series
+    from volopt.data import read_excel
+    close = zz500()['close']
+    shibor = read_excel('shibor_3M.xlsx', index_col='date')
+    n = int(0.25 * 240)
+    version = module_hash('implied_volatility')
+    # 每个日期的结果用到之后M + n天的收盘价
+    return pd.DataFrame({'iv(M=%d)' % M: series.update(
+                             'rolling_implied',
+                             {'source': 'zz500.xlsx', 'M': M, 'T': 0.25,
+                              'N': 50, 'module': version},
+                             rates(close, shibor),
+                             lambda d, M=M: rolling_implied(d['close'], shibor,
+                                                            M=M),
+                             after=M + n - 1)
+                         for M in params['Ms']})
+
+def run_hedge(inputs, params):
+    from implied_volatility import rolling_hedge
+    from volopt import series
+    from volopt.data import read_excel
+    close = zz500()['close']
+    shibor = read_excel('shibor_3M.xlsx', index_col='date')
+    n = int(0.25 * 240)
+    return series.update('rolling_hedge',
+                         {'source': 'zz500.xlsx', 'T': 0.25,
+                          'module': module_hash('implied_volatility')},
+                         rates(close, shibor),
+                         lambda d: rolling_hedge(d['close'], shibor),
+                         after=n)
+
+def run_phoenix(inputs, params):
+    import pandas as pd
+    from volopt.autocall import phoenix
+    values, deltas = phoenix(params['S0'], params['sigmas'], params['ns'],
+                             params['upper'], params['lower'],
+                             params['coupon'], M=params['M'],
+                             seed=params['seed'])
+    return pd.DataFrame(values), pd.DataFrame(deltas)
+
+def run_vrp(inputs, params):
+    '''已实现波动率与隐含波动率、对冲隐含波动率和VIX的比较'''
+    from volopt.vrp import panel
+    implied = dict(inputs['implied'].items())
+    implied['hedge'] = inputs['hedge']
+    implied['VIX'] = inputs['vix_new'] / 100
+    return panel(zz500(), implied, params['models'], params['windows'])
+
+def plot_series(inputs, params):
+    '''将上游的结果画图保存'''
+    from volopt.plotting import save_plot
+    return save_plot(inputs[params['dep']], params['title'],
+                     os.path.join(params['out'], params['file']))
+
+STAGES = {
+    'chain': stage(run_chain,
+                   sources=['50ETF期权合约基本资料.xlsx',
+                            '50ETF期权日行情2015-2016.xlsx',
+                            '50ETF期权日行情2017-2018.xlsx'],
+                   modules=['VIX_data_clean'],
+                   params={'basic': '50ETF期权合约基本资料.xlsx',
+                           'daily': ['50ETF期权日行情2015-2016.xlsx',
+                                     '50ETF期权日行情2017-2018.xlsx']}),
+    'vix_new': stage(run_vix_new, sources=['shibor_3M.xlsx'], deps=['chain'],
+                     modules=['VIX_batch', 'VIX_new']),
+    'term_structure': stage(run_term_structure, sources=['shibor_3M.xlsx'],
+                            deps=['chain'], modules=['VIX_batch'],
+                            params={'targets': [9, 30, 60, 90, 180]}),
+    'vix_old': stage(run_vix_old, deps=['chain'], modules=['VIX_old'],
+                     sources=['shibor_3M.xlsx', '50ETF基金净值表现日数据.xlsx']),
+    'volatility': stage(run_volatility, sources=['zz500.xlsx'],
+                        modules=['volopt.estimators'],
+                        params={'window': 60,
+                                'models': ['realized', 'parkinson',
+                                           'garman_klass', 'roger_satchell',
+                                           'garkla_yangzh', 'yang_zhang']}),
+    'bands': stage(run_bands, sources=['zz500.xlsx'],
+                   modules=['volopt.bootstrap', 'volopt.estimators'],
+                   params={'window': 60, 'B': 500, 'block': 5, 'seed': 0}),
+    'implied': stage(run_implied, sources=['zz500.xlsx', 'shibor_3M.xlsx'],
+                     modules=['implied_volatility'],
+                     params={'Ms': [600, 1200, 2000]}),
+    'hedge': stage(run_hedge, sources=['zz500.xlsx', 'shibor_3M.xlsx'],
+                   modules=['implied_volatility']),
+    'vrp': stage(run_vrp, sources=['zz500.xlsx'],
+                 deps=['implied', 'hedge', 'vix_new'],
+                 modules=['volopt.vrp', 'volopt.estimators'],
+                 params={'windows': [20, 60, 120],
+                         'models': ['realized', 'parkinson', 'garman_klass',
+                                    'roger_satchell', 'garkla_yangzh',
+                                    'yang_zhang']}),
+    'phoenix': stage(run_phoenix, modules=['volopt.autocall'],
+                     params={'S0': 100, 'sigmas': [0.2, 0.25, 0.3, 0.35, 0.4],
+                             'ns': [3, 6, 9, 12], 'upper': 101, 'lower': 85,
+                             'coupon': 0.015, 'M': 50000, 'seed': 0}),
+}
+for name, title, file in [('vix_new', 'VIX-Demeterfi', 'VIX_new.png'),
+                          ('term_structure', 'VIX Term Structure',
+                           'VIX_term_structure.png'),
+                          ('vix_old', 'VIX-Whaley', 'VIX_old.png'),
+                          ('volatility', 'Volatility Measurements',
+                           'vlolatilities.png'),
+                          ('implied', 'Implied Volatility, zz500',
+                           'implied volatility.png'),
+                          ('hedge', 'Hedged Implied Volatility',
+                           'hedged implied volatility.png'),
+                          ('phoenix', 'Phoenix', 'phoenix_values_deltas.png')]:
+    STAGES['plot_' + name] = stage(plot_series, deps=[name], plot=True,
+                                   params={'dep': name, 'title': title,
+                                           'file': file})
+
+def pipeline_dir():
+    '''环节结果的缓存目录'''
+    return os.path.join(cache_root(), 'pipeline')
+
+def result_path(name, key):
+    return os.path.join(pipeline_dir(), '%s-%s.pkl' % (name, key))
+
+def stage_key(name, keys):
+    '''
+    环节的指纹：环节名称、参数、数据文件内容、模块源代码以及上游环节的指纹
+    keys:
+        已经算好的上游环节的指纹
+    '''
+    s = STAGES[name]
+    fingerprint = {
+        'name': name, 'params': s.params,
+        'sources': {src: file_hash(source_path(src)) for src in s.sources},
+        'modules': {m: module_hash(m) for m in s.modules},
+        'deps': {d: keys[d] for d in s.deps}}
+    text = json.dumps(fingerprint, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+def resolve(targets, plot=False):
+    '''
+    需要运行的环节（包括上游），按依赖顺序排列
+    '''
+    if not targets:
+        targets = [name for name, s in STAGES.items() if plot or not s.plot]
+    elif plot:
+        targets = list(targets) + ['plot_' + t for t in targets
+                                   if 'plot_' + t in STAGES]
+    order = []
+    def visit(name):
+        if name in order:
+            return
+        if name not in STAGES:
+            raise KeyError('unknown stage: %s' % name)
+        for dep in STAGES[name].deps:
+            visit(dep)
+        order.append(name)
+    for name in targets:
+        visit(name)
+    return order
+
+def load_result(name, key):
+    with open(result_path(name, key), 'rb') as f:
+        return pickle.load(f)
+
+def execute(name, key, dep_keys, out):
+    '''
+    在子进程中运行一个环节：读取上游的缓存结果，计算并保存结果
+    Returns:
+        环节名称和耗时
+    '''
+    s = STAGES[name]
+    inputs = {d: load_result(d, dep_keys[d]) for d in s.deps}
+    params = dict(s.params, out=out) if s.plot else s.params
+    t0 = perf_counter()
+    result = s.func(inputs, params)
+    seconds = perf_counter() - t0
+    if not s.plot:
+        path = result_path(name, key)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+    return name, seconds
+
+def run(targets=(), jobs=1, plot=False, force=False, out='.'):
+    '''
+    运行流水线
+    Args:
+        targets:
+            要运行的环节，为空时运行所有计算环节（plot为True时包括画图环节）
+        jobs:
+            同时运行的进程数，为1时在当前进程中依次运行
+        force:
+            忽略缓存，全部重新计算
+        out:
+            图片的保存目录
+    Returns:
+        dict, 环节名称为键，值为('cached', 0)、('done', 耗时)，
+        或数据文件不存在时的('missing', 0)、上游没有结果时的('skipped', 0)
+    '''
+    os.makedirs(pipeline_dir(), exist_ok=True)
+    order = resolve(targets, plot)
+    keys = {}
+    status = {}
+    pending = []
+    for name in order:
+        s = STAGES[name]
+        if any(status.get(d, ('',))[0] in ('missing', 'skipped')
+               for d in s.deps):
+            status[name] = ('skipped', 0.0)
+            continue
+        if not all(os.path.exists(source_path(src)) for src in s.sources):
+            status[name] = ('missing', 0.0)
+            continue
+        keys[name] = stage_key(name, keys)
+        if not force and not s.plot\
+           and os.path.exists(result_path(name, keys[name])):
+            status[name] = ('cached', 0.0)
+        else:
+            pending.append(name)
+
+    def ready(name):
+        return all(d in status for d in STAGES[name].deps)
+
+    def args(name):
+        return name, keys[name], {d: keys[d] for d in STAGES[name].deps}, out
+
+    if jobs == 1:
+        for name in pending:
+            status[name] = ('done', execute(*args(name))[1])
+        return status
+    with ProcessPoolExecutor(jobs) as pool:
+        running = {}
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                running[pool.submit(execute, *args(name))] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, seconds = future.result()
+                del running[future]
+                status[name] = ('done', seconds)
+    return status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='运行计算流水线')
+    parser.add_argument('stages', nargs='*', help='要运行的环节，默认全部')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--plot', action='store_true', help='同时运行画图环节')
+    parser.add_argument('--force', action='store_true', help='忽略缓存')
+    parser.add_argument('--out', default='.', help='图片的保存目录')
+    parser.add_argument('--list', action='store_true', help='列出所有环节')
+    args = parser.parse_args(argv)
+    if args.list:
+        for name, s in STAGES.items():
+            print('%-16s deps=%s sources=%s' % (name, ','.join(s.deps),
+                                                 ','.join(s.sources)))
+        return 0
+    status = run(args.stages, args.jobs, args.plot, args.force, args.out)
+    for name, (state, seconds) in status.items():
+        print('%-16s %-7s %8.2fs' % (name, state, seconds))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+画图函数，matplotlib只在调用时导入，其余模块不依赖本模块
+"""
+
+def save_plot(result, title, path):
+    '''
+    将计算结果画图保存
+    Args:
+        result:
+            Series或DataFrame；也可以是多个DataFrame构成的元组（如凤凰期权的价格和delta），
+            此时每个DataFrame画在一个子图中
+        title:
+            图的标题
+        path:
+            保存的文件路径
+    Returns:
+        保存的文件路径
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    if isinstance(result, tuple):
+        fig, axes = plt.subplots(1, len(result), figsize=(16, 5))
+        for ax, frame in zip(axes, result):
+            frame.plot(ax=ax, marker='o')
+    else:
+        result.plot(figsize=(15, 8), fontsize=14)
+    plt.title(title, fontsize=16)
+    plt.savefig(path, bbox_inches='tight')
+    plt.close('all')
+    return path
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+在仓库根目录下运行各专题目录中的程序，如同直接运行该程序，
+volopt和其他专题的模块都可以导入，程序本身不必修改sys.path
+
+    python -m volopt.run VIX_new
+    python -m volopt.run volatility
+"""
+
+import runpy
+import sys
+
+from volopt import add_script_dirs
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print('usage: python -m volopt.run <程序名> [参数...]')
+        return 2
+    add_script_dirs()
+    sys.argv = argv
+    runpy.run_module(argv[0], run_name='__main__', alter_sys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
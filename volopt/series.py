@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+滚动计算结果的增量存储：rolling_volatility, rolling_implied, rolling_hedge以及VIX
+的结果按日期追加保存，每次运行只计算上次之后的新日期，或者输入数据发生变化的日期。
+
+每个序列按名称和参数（模型、窗口、T, M, N，以及数据源和程序版本）对应一个目录，
+其中结果和输入数据都按日期保存：
+    dates.bin      结果的日期，int64纳秒
+    values.bin     结果，float64，每个日期一行
+    inputs.bin     输入数据的日期，int64纳秒
+    checksums.bin  输入数据每个日期的校验值，uint64
+    manifest.json  名称、参数、列名以及各文件的有效行数
+文件只在末尾追加；输入数据中间的某一天变化时，截断该天影响到的结果后重新计算。
+截断前manifest中的行数先减少，追加后再增加，中途中断时按manifest中的行数读取，
+多写的部分下次被截断
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from volopt import telemetry
+from volopt.data import cache_root, read_manifest
+
+FNV_PRIME = np.uint64(0x100000001b3)
+FILES = {'dates': np.int64, 'values': np.float64, 'inputs': np.int64,
+         'checksums': np.uint64}
+
+def series_dir(name, params, root=None):
+    '''
+    每个名称和每组参数对应一个目录
+    root:
+        保存的根目录，默认为缓存目录下的series
+    '''
+    key = json.dumps([name, params], sort_keys=True, default=str,
+                     ensure_ascii=False)
+    root = os.path.join(cache_root(), 'series') if root is None else root
+    return os.path.join(root, '%s-%s' % (name,
+                        hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]))
+
+def to_ns(index):
+    '''日期索引转换为int64纳秒，pandas的日期可能是其他精度'''
+    return pd.DatetimeIndex(index).as_unit('ns').asi8
+
+def checksums(inputs):
+    '''
+    输入数据每个日期的校验值
+    Args:
+        inputs:
+            以日期为索引、按日期排序的Series或DataFrame；
+            同一日期可以有多行（如长格式的期权数据），此时合并为一个校验值
+    Returns:
+        不重复的日期（int64纳秒）和对应的uint64校验值
+    '''
+    h = pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+    with np.errstate(over='ignore'):
+        dates = to_ns(inputs.index)
+        if len(dates) and (dates[1:] == dates[:-1]).any():
+            # 同一日期的多行：行号参与混合后按日期求和，行的顺序变化也能发现
+            starts = np.flatnonzero(np.append(True, dates[1:] != dates[:-1]))
+            rank = np.arange(len(dates)) - np.repeat(starts, np.diff(
+                np.append(starts, len(dates))))
+            h = (h ^ rank.astype(np.uint64)) * FNV_PRIME
+            h = np.add.reduceat(h, starts)
+            dates = dates[starts]
+    return dates, h
+
+def _read(directory, manifest):
+    '''按manifest中的行数读取各文件'''
+    arrays = {}
+    for key, dtype in FILES.items():
+        path = os.path.join(directory, key + '.bin')
+        count = manifest['rows'][key]
+        if key == 'values':
+            count *= len(manifest['columns'])
+        arrays[key] = np.fromfile(path, dtype=dtype, count=count)\
+                      if count else np.empty(0, dtype)
+    arrays['values'] = arrays['values'].reshape(-1, len(manifest['columns']))
+    return arrays
+
+def _write(directory, key, keep, data):
+    '''保留文件的前keep个元素，在其后追加data'''
+    path = os.path.join(directory, key + '.bin')
+    size = np.dtype(FILES[key]).itemsize
+    with open(path, 'ab') as f: # 不存在时创建
+        pass
+    with open(path, 'r+b') as f:
+        f.truncate(keep * size)
+        f.seek(keep * size)
+        f.write(np.ascontiguousarray(data, dtype=FILES[key]).tobytes())
+
+def _save_manifest(directory, manifest, rows, inputs):
+    '''写入manifest，rows为结果的行数，inputs为输入数据的日期数'''
+    manifest['rows'] = {'dates': rows, 'values': rows, 'inputs': inputs,
+                        'checksums': inputs}
+    tmp = os.path.join(directory, 'manifest.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, default=str)
+    os.replace(tmp, os.path.join(directory, 'manifest.json'))
+
+def _frame(dates, values, columns):
+    '''结果数组转换为以日期为索引的DataFrame'''
+    return pd.DataFrame(values, columns=columns,
+                        index=pd.DatetimeIndex(dates.astype('datetime64[ns]'),
+                                               name='date'))
+
+def load(name, params, root=None):
+    '''
+    读取已经保存的结果
+    Returns:
+        以日期为索引的DataFrame，没有保存过时为None
+    '''
+    directory = series_dir(name, params, root)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    arrays = _read(directory, manifest)
+    return _frame(arrays['dates'], arrays['values'], manifest['columns'])
+
+def _result(new):
+    '''compute的结果统一为按日期排序的DataFrame'''
+    if isinstance(new, dict):
+        new = pd.Series(new, dtype=float)
+    result = new.to_frame('value') if isinstance(new, pd.Series) else new
+    return result.sort_index()
+
+def update(name, params, inputs, compute, before=0, after=0, pointwise=False,
+           root=None):
+    '''
+    增量更新一个滚动计算的结果序列
+    Args:
+        name:
+            序列名称，如'rolling_implied'
+        params:
+            dict, 计算参数，与name一起决定保存的位置；
+            应包括数据源和程序版本（如模块源代码的sha1），变化时重新计算全部历史
+        inputs:
+            计算用到的所有随日期变化的数据，以日期为索引并按日期排序，
+            用于发现新增和变化的日期，见checksums
+        compute:
+            函数，输入inputs的一段（按日期截取），返回以日期为索引的
+            Series, DataFrame或dict（如rolling_volatility的结果）；
+            pointwise为True时只保留输入中的日期的结果
+        before, after:
+            某个日期的结果用到的前before个和后after个交易日的输入，
+            如window天的滚动波动率before=window，rolling_implied的after=M+n-1
+        pointwise:
+            每个日期的结果只取决于当日的输入（如VIX）时为True，
+            此时只重新计算输入变化的日期，而不是变化之后的所有日期
+        root:
+            保存的根目录，见series_dir
+    Returns:
+        以日期为索引的全部结果，compute返回Series或dict时为Series
+    '''
+    t0 = time.perf_counter()
+    directory = series_dir(name, params, root)
+    manifest = read_manifest(directory)
+    dates, sums = checksums(inputs)
+    if manifest is None:
+        old = {key: np.empty(0, dtype) for key, dtype in FILES.items()}
+        columns = None
+    else:
+        old = _read(directory, manifest)
+        columns = manifest['columns']
+
+    # 第一个新增或变化的输入日期
+    n = min(len(dates), len(old['inputs']))
+    changed = np.flatnonzero((dates[:n] != old['inputs'][:n])
+                             | (sums[:n] != old['checksums'][:n]))
+    p = changed[0] if len(changed) else n
+    if pointwise:
+        # 只重新计算变化和新增的日期，截断位置之后未变化的结果原样写回
+        redo = dates[np.append(changed, np.arange(n, len(dates)))]
+        k = p
+    else:
+        # 从第k个日期起的结果需要重新计算，计算时从第k - before个日期的输入开始；
+        # 上次最后一个结果之后的日期即使输入没有变化也要计算（上次输入不够长）
+        k = max(p - after, 0)
+        if len(old['dates']):
+            k = min(k, int(np.searchsorted(dates, old['dates'][-1], 'right')))
+        else:
+            k = 0
+    first = dates[k] if k < len(dates) else None
+    if first is not None:
+        keep = int(np.searchsorted(old['dates'], first))
+    else: # 输入数据变短时去掉最后一个日期之后的结果
+        keep = int(np.searchsorted(old['dates'], dates[-1] if len(dates)
+                                   else np.iinfo(np.int64).min, 'right'))
+
+    result = None
+    if pointwise and len(redo):
+        result = _result(compute(inputs[np.isin(to_ns(inputs.index), redo)]))
+        # 其他日期的结果保留原来的，compute多返回的日期不写入，避免日期重复
+        result = result[np.isin(to_ns(result.index), redo)]
+    elif not pointwise and first is not None:
+        start = dates[max(k - before, 0)].astype('datetime64[ns]')
+        result = _result(compute(inputs[pd.DatetimeIndex(inputs.index)
+                                        >= start]))
+        result = result[to_ns(result.index) >= first]
+    if result is not None and len(result):
+        if columns is None:
+            columns = [str(c) for c in result.columns]
+        new_dates = to_ns(result.index)
+        new_values = result.to_numpy(dtype=np.float64)
+    else:
+        columns = columns or ['value']
+        new_dates = np.empty(0, np.int64)
+        new_values = np.empty((0, len(columns)))
+    computed = len(new_dates)
+    old_values = old['values'].reshape(-1, len(columns))
+    if pointwise and first is not None:
+        tail = old['dates'][keep:]
+        stay = np.isin(tail, dates) & ~np.isin(tail, redo)
+        new_dates = np.concatenate([tail[stay], new_dates])
+        new_values = np.concatenate([old_values[keep:][stay], new_values])
+        order = np.argsort(new_dates, kind='stable')
+        new_dates, new_values = new_dates[order], new_values[order]
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'name': name, 'params': params, 'columns': columns}
+    # 先把有效行数减到截断后的长度，再截断和追加，最后写入新的行数
+    _save_manifest(directory, manifest, keep, p)
+    _write(directory, 'dates', keep, new_dates)
+    _write(directory, 'values', keep * len(columns), new_values)
+    _write(directory, 'inputs', p, dates[p:])
+    _write(directory, 'checksums', p, sums[p:])
+    _save_manifest(directory, manifest, keep + len(new_dates), len(dates))
+    telemetry.record('series', 'volopt.series', series=name, kept=keep,
+                     computed=computed, seconds=time.perf_counter() - t0)
+
+    frame = _frame(np.concatenate([old['dates'][:keep], new_dates]),
+                   np.concatenate([old_values[:keep], new_values]), columns)
+    if columns == ['value']:
+        return frame['value'].rename(None)
+    return frame
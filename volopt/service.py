@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+本地定价服务：隐含波动率、凤凰期权的价格和delta以及VIX。
+客户端通过TCP发送一行json的请求，服务在一个很短的时间窗口内收集同一类请求，
+合并为一次向量化计算；蒙特卡洛模拟在进程池中运行，其余计算在线程中运行，
+不阻塞接收新请求。每个请求的结果附带排队、计算和总耗时
+
+    python -m volopt.service --port 8765 --window 5 --workers 4
+
+请求和响应的格式（每行一个json）：
+    {"id": 1, "method": "iv", "params": {"S": 2.5, "K": 2.4, "r": 0.03,
+                                          "T_days": 30, "price": 0.15}}
+    {"id": 1, "result": 0.26, "latency": {"queue_ms": ..., "compute_ms": ...,
+                                           "total_ms": ..., "batch": 12}}
+method为'iv', 'phoenix', 'vix'或'stats'，参数见各自的batch函数
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from volopt import add_script_dirs
+from volopt.core import bs_value, implied_vol
+
+def _number(params, key, default=None, kind=float):
+    '''取出一个数值参数并转换类型，缺少或不能转换时报错'''
+    value = params.get(key, default)
+    if value is None:
+        raise ValueError('missing parameter: %s' % key)
+    if isinstance(value, (bool, str)) or not isinstance(value, (int, float)):
+        raise ValueError('%s should be a number' % key)
+    if kind is int and not float(value).is_integer():
+        raise ValueError('%s should be an integer' % key)
+    return kind(value)
+
+def _flag(params, key, default):
+    '''取出一个布尔参数，只接受true, false（或字符串'true', 'false'）'''
+    value = params.get(key, default)
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    if not isinstance(value, bool):
+        raise ValueError('%s should be true or false' % key)
+    return value
+
+def _params(params):
+    '''请求的参数必须是json对象'''
+    if not isinstance(params, dict):
+        raise ValueError('params should be an object')
+    return params
+
+def iv_params(params):
+    '''检查一个隐含波动率请求的参数，返回转换后的参数'''
+    params = _params(params)
+    q = {key: _number(params, key) for key in ('S', 'K', 'r', 'T_days', 'price')}
+    q['kind'] = params.get('kind', 'call')
+    if q['kind'] not in ('call', 'put'):
+        raise ValueError("kind should be 'call' or 'put'")
+    return q
+
+def iv_batch(requests):
+    '''
+    一批隐含波动率：一年365天，先用牛顿法，不收敛时改用二分法。
+    看跌期权先按看跌看涨平价换算为看涨期权的价格再求解；VIX_old.IV则是
+    把看跌期权的价格直接代入看涨期权的公式，两者对看跌期权的结果不同
+    Args:
+        requests:
+            dict的列表，包含S, K, r, T_days, price，kind为'call'（默认）或'put'，
+            见iv_params
+    Returns:
+        隐含波动率的列表，无解时为None
+    '''
+    field = lambda key: np.array([q[key] for q in requests], dtype=float)
+    S, K, r, price = field('S'), field('K'), field('r'), field('price')
+    T = field('T_days') / 365
+    put = np.array([q.get('kind', 'call') == 'put' for q in requests])
+    call = np.where(put, price + S - K * np.exp(-r * T), price) #看跌看涨平价
+    sigma = implied_vol(call, S, K, r, T)
+    with np.errstate(invalid='ignore'):
+        error = np.abs(bs_value(S, K, r, sigma, T) - call)
+    bad = ~(error < 1e-8) | ~(sigma > 0)
+    if bad.any():
+        sigma[bad] = implied_vol(call[bad], S[bad], K[bad], r[bad], T[bad],
+                                 method='bisect')
+    return [None if np.isnan(s) else float(s) for s in sigma]
+
+def phoenix_params(params):
+    '''检查一个凤凰期权请求的参数，返回转换后的参数'''
+    params = _params(params)
+    q = {key: _number(params, key)
+         for key in ('S0', 'sigma', 'upper', 'lower', 'coupon')}
+    q['r'] = _number(params, 'r', 0.04)
+    for key, default in (('n', None), ('M', 50000), ('days', 20), ('seed', 0)):
+        q[key] = _number(params, key, default, int)
+    if q['n'] < 1 or q['M'] < 1 or q['days'] < 1:
+        raise ValueError('n, M and days should be positive')
+    q['delta'] = _flag(params, 'delta', True)
+    return q
+
+def _paths_key(q):
+    '''共用同一组模拟路径的参数'''
+    return (q['S0'], q['sigma'], q['n'], q.get('r', 0.04), q.get('M', 50000),
+            q.get('days', 20), q.get('seed', 0))
+
+def phoenix_group(key, contracts):
+    '''
+    同一组路径上的多个凤凰期权，在工作进程中运行
+    Returns:
+        每个合约的{'value': ..., 'delta': ...}
+    '''
+    from volopt.autocall import mc_paths, phoenix_delta, phoenix_value
+    S0, sigma, n, r, M, days, seed = key
+    paths = mc_paths(S0, sigma, n, r, M, days, seed=seed)
+    results = []
+    for q in contracts:
+        terms = (n, q['upper'], q['lower'], q['coupon'], r, days)
+        result = {'value': float(phoenix_value(paths, *terms))}
+        if q.get('delta', True):
+            result['delta'] = float(phoenix_delta(paths, *terms))
+        results.append(result)
+    return results
+
+def vix_params(params):
+    '''检查一个VIX请求的参数，返回转换后的参数'''
+    params = _params(params)
+    quotes = params.get('quotes')
+    if not isinstance(quotes, list) or not quotes:
+        raise ValueError('quotes should be a non-empty list')
+    return {'r': _number(params, 'r'),
+            'min_days': _number(params, 'min_days', 7, int),
+            'quotes': [{'T_days': _number(_params(quote), 'T_days', kind=int),
+                        'strike': _number(quote, 'strike'),
+                        'call': _number(quote, 'call'),
+                        'put': _number(quote, 'put')} for quote in quotes]}
+
+def vix_batch(requests):
+    '''
+    一批VIX，每个请求是某一时刻的期权报价，所有请求合并后一次调用VIX_batch.vix_batch
+    Args:
+        requests:
+            dict的列表，包含r和quotes，quotes为{'T_days', 'strike', 'call', 'put'}
+            的列表，可以有多个到期日；min_days默认为7，见vix_params
+    Returns:
+        VIX的列表，近月和次近月不足时为None
+    '''
+    import pandas as pd
+    add_script_dirs()
+    from VIX_batch import vix_batch as batch
+    results = [None] * len(requests)
+    groups = {}
+    for i, q in enumerate(requests):
+        groups.setdefault(q.get('min_days', 7), []).append(i)
+    for min_days, members in groups.items():
+        # 每个请求用一个虚拟的日期区分，到期日由T_days推出
+        base = np.datetime64('2000-01-01', 'D')
+        frames, rates = [], {}
+        for i in members:
+            date = base + i
+            quotes = pd.DataFrame(requests[i]['quotes'])
+            quotes['date'] = pd.Timestamp(date)
+            days = quotes['T_days'].to_numpy(dtype='timedelta64[D]')
+            quotes['expire'] = pd.to_datetime(date + days)
+            frames.append(quotes)
+            rates[pd.Timestamp(date)] = requests[i]['r']
+        vix = batch(pd.concat(frames, ignore_index=True), pd.Series(rates),
+                    min_days=min_days)
+        for i in members:
+            value = vix.get(pd.Timestamp(base + i))
+            results[i] = None if value is None or np.isnan(value)\
+                         else float(value)
+    return results
+
+class Batcher():
+    '''
+    收集时间窗口内到达的同类请求，合并为一次计算
+    '''
+    def __init__(self, name, run, window=0.005, max_batch=4096):
+        '''
+        run:
+            协程函数，输入请求参数的列表，返回等长的结果列表
+        window:
+            第一个请求到达后等待的秒数
+        '''
+        self.name = name
+        self.run = run
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.latencies = deque(maxlen=10000) #最近的请求的总耗时
+        self.requests = 0
+        self.batches = 0
+
+    def submit(self, params):
+        '''加入一个请求，返回结果的future'''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((params, future, perf_counter()))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._execute(batch))
+
+    async def _execute(self, batch):
+        start = perf_counter()
+        try:
+            results = await self.run([params for params, _, _ in batch])
+        except Exception as e:
+            results = [e] if len(batch) == 1 else await self._one_by_one(batch)
+        end = perf_counter()
+        self.batches += 1
+        for (params, future, arrived), result in zip(batch, results):
+            latency = {'queue_ms': (start - arrived) * 1000,
+                       'compute_ms': (end - start) * 1000,
+                       'total_ms': (end - arrived) * 1000, 'batch': len(batch)}
+            self.latencies.append(latency['total_ms'])
+            self.requests += 1
+            if not future.done():
+                future.set_result((result, latency))
+
+    async def _one_by_one(self, batch):
+        '''整批计算失败时逐个重新计算，只有出错的请求返回错误'''
+        results = []
+        for params, _, _ in batch:
+            try:
+                results.extend(await self.run([params]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        '''请求数、批次数以及总耗时的分位数（毫秒）'''
+        lat = np.array(self.latencies)
+        stats = {'requests': self.requests, 'batches': self.batches}
+        if len(lat):
+            stats.update({'p50_ms': float(np.percentile(lat, 50)),
+                          'p99_ms': float(np.percentile(lat, 99)),
+                          'max_ms': float(lat.max())})
+        return stats
+
+class PricingService():
+    '''
+    定价服务，handle处理一个请求，serve在本地端口上监听
+    '''
+    def __init__(self, window=0.005, workers=None):
+        '''
+        window:
+            合并请求的时间窗口，秒
+        workers:
+            蒙特卡洛模拟的进程数，默认为CPU数
+        '''
+        self.pool = ProcessPoolExecutor(workers or os.cpu_count())
+        self.batchers = {'iv': Batcher('iv', self._threaded(iv_batch), window),
+                         'vix': Batcher('vix', self._threaded(vix_batch),
+                                        window),
+                         'phoenix': Batcher('phoenix', self._phoenix, window)}
+        self.validators = {'iv': iv_params, 'vix': vix_params,
+                           'phoenix': phoenix_params}
+
+    @staticmethod
+    def _threaded(func):
+        '''在线程中运行向量化计算'''
+        async def run(requests):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, func, requests)
+        return run
+
+    async def _phoenix(self, requests):
+        '''相同路径参数的合约合并为一个任务，各任务在进程池中并行'''
+        loop = asyncio.get_running_loop()
+        groups = {}
+        for i, q in enumerate(requests):
+            groups.setdefault(_paths_key(q), []).append(i)
+        tasks = [loop.run_in_executor(self.pool, phoenix_group, key,
+                                      [requests[i] for i in members])
+                 for key, members in groups.items()]
+        results = [None] * len(requests)
+        for members, values in zip(groups.values(),
+                                   await asyncio.gather(*tasks)):
+            for i, value in zip(members, values):
+                results[i] = value
+        return results
+
+    def stats(self):
+        return {name: b.stats() for name, b in self.batchers.items()}
+
+    async def handle(self, request):
+        '''
+        处理一个请求，返回响应的dict；参数在加入批次之前逐个检查，
+        参数有误的请求直接返回错误，不影响同一批次的其他请求
+        '''
+        if not isinstance(request, dict):
+            return {'id': None, 'error': 'bad request: not an object'}
+        method = request.get('method')
+        response = {'id': request.get('id')}
+        if method == 'stats':
+            response['result'] = self.stats()
+            return response
+        if method not in self.batchers:
+            response['error'] = 'unknown method: %s' % method
+            return response
+        try:
+            params = self.validators[method](request.get('params', {}))
+        except ValueError as e:
+            response['error'] = 'bad params: %s' % e
+            return response
+        result, latency = await self.batchers[method].submit(params)
+        if isinstance(result, Exception):
+            response['error'] = '%s: %s' % (type(result).__name__, result)
+        else:
+            response['result'] = result
+        response['latency'] = latency
+        return response
+
+    async def _client(self, reader, writer):
+        '''一个连接上可以连续发送多个请求，响应按完成的先后返回'''
+        lock = asyncio.Lock()
+        async def reply(line):
+            try:
+                response = await self.handle(json.loads(line))
+            except Exception as e: # 任何错误都只返回给这一个请求
+                response = {'id': None, 'error': 'bad request: %s' % e}
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(reply(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (asyncio.CancelledError, ConnectionError): # 服务关闭或客户端断开
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self._client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown()
+
+async def request(requests, host='127.0.0.1', port=8765):
+    '''
+    客户端：在一个连接上发送多个请求，按发送的顺序返回响应
+    Args:
+        requests:
+            (method, params)的列表
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    for i, (method, params) in enumerate(requests):
+        writer.write(json.dumps({'id': i, 'method': method,
+                                 'params': params}).encode() + b'\n')
+    await writer.drain()
+    responses = [None] * len(requests)
+    for i in range(len(requests)):
+        response = json.loads(await reader.readline())
+        responses[response['id']] = response
+    writer.close()
+    return responses
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地定价服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--window', type=float, default=5,
+                        help='合并请求的时间窗口，毫秒')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='蒙特卡洛模拟的进程数')
+    args = parser.parse_args(argv)
+    service = PricingService(args.window / 1000, args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+可选的运行记录：各环节耗时、求解器的迭代和函数调用次数、不收敛的输入、
+蒙特卡洛每秒路径数以及峰值内存。默认关闭，关闭时每个记录点只多一次判断；
+设置环境变量VOLOPT_TELEMETRY（文件路径，或'memory'只保存在进程内）或调用enable开启。
+进程内只保留最近的max_records条记录，长时间运行时内存不会无限增长；
+需要全部记录时写入文件
+"""
+
+import functools
+import json
+import os
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+enabled = False
+_path = None
+_memory = False
+MAX_RECORDS = 100000
+_records = deque(maxlen=MAX_RECORDS) #进程内保存的最近的记录
+_stack = [] #正在运行的环节，用于嵌套环节的峰值内存
+
+def enable(path=None, memory=False, max_records=MAX_RECORDS):
+    '''
+    开启记录
+    Args:
+        path:
+            记录追加写入的文件，每行一个json；为None时只保存在进程内，用records读取
+        memory:
+            是否用tracemalloc记录各环节的峰值内存，会使程序变慢
+        max_records:
+            进程内保留的记录条数，超出时丢弃最早的记录（文件中的记录不受影响）
+    '''
+    global enabled, _path, _memory, _records
+    enabled = True
+    if _records.maxlen != max_records:
+        _records = deque(_records, maxlen=max_records)
+    _path = path
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    '''关闭记录'''
+    global enabled, _memory
+    enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+def records(kind=None):
+    '''进程内保存的最近的记录，kind不为None时只返回该类记录'''
+    return [r for r in _records if kind is None or r['kind'] == kind]
+
+def clear():
+    '''清空进程内的记录'''
+    _records.clear()
+
+def _jsonable(value):
+    '''numpy标量、数组以及日期转换为json可以保存的类型'''
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def record(kind, name, **fields):
+    '''
+    保存一条记录
+    Args:
+        kind:
+            记录类型，'stage', 'solver', 'nonconvergence', 'simulation', 'data',
+            'series'
+        name:
+            记录点的名称，如'implied_volatility.solve'
+    '''
+    if not enabled:
+        return
+    entry = {'kind': kind, 'name': name, 'time': time.time()}
+    entry.update(fields)
+    _records.append(entry)
+    if _path is not None:
+        with open(_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, default=_jsonable, ensure_ascii=False))
+            f.write('\n')
+
+@contextmanager
+def _stage(name, fields):
+    frame = {'peak': 0}
+    if _memory:
+        if _stack:
+            parent = _stack[-1]
+            parent['peak'] = max(parent['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    _stack.append(frame)
+    t0 = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - t0
+        _stack.pop()
+        if _memory:
+            frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], frame['peak'])
+            fields['peak_mb'] = frame['peak'] / 2**20
+        record('stage', name, seconds=seconds, **fields)
+
+class _Null():
+    '''关闭记录时使用的空环节'''
+    def __enter__(self):
+        return {}
+    def __exit__(self, *args):
+        return False
+
+_null = _Null()
+
+def stage(name, **fields):
+    '''
+    记录一个环节的耗时（以及峰值内存）的上下文管理器，with语句中得到的dict
+    可以加入额外的字段，如：
+        with telemetry.stage('rolling_hedge', dates=n) as info:
+            ...
+            info['paths'] = M
+    '''
+    if not enabled:
+        return _null
+    return _stage(name, fields)
+
+def timed(name=None):
+    '''把整个函数作为一个环节记录的装饰器'''
+    def decorator(func):
+        label = name or '%s.%s' % (func.__module__, func.__name__)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _stage(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# 启动时根据环境变量开启
+if os.environ.get('VOLOPT_TELEMETRY'):
+    _env = os.environ['VOLOPT_TELEMETRY']
+    enable(None if _env == 'memory' else _env,
+           memory=bool(os.environ.get('VOLOPT_TELEMETRY_MEMORY')))
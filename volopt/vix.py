@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+多个标的的VIX：每个标的的期权数据保存为chains.ChainStore，加上标的收盘价和无风险
+利率，就可以用VIX_batch（方差互换）和VIX_old（Whaley）两种方法编制指数。
+所有标的、所有日期分段的计算分给同一个进程池，工作进程各自以内存映射方式读取
+期权数据，不在进程之间复制；结果通过series保存到同一个目录，数据修正后只重新计算
+受影响的日期
+
+    python -m volopt.vix                              计算所有标的
+    python -m volopt.vix 50ETF 300ETF --jobs 8        只计算指定标的
+    python -m volopt.vix --config underlyings.json    读取其他标的的设置
+
+设置文件为json，标的名称为键，值为dict：
+    chain:  ChainStore的目录，相对于数据目录（由chains.near_expiries和write_store生成）
+    close:  标的收盘价的Excel文件，包含date, close列
+    rate:   无风险利率的Excel文件，包含date列和rate_column列，默认为shibor_3M.xlsx
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from volopt import add_script_dirs, series
+from volopt.data import data_root, module_hash
+
+UNDERLYINGS = {
+    '50ETF': {'chain': '50ETF_option_VIX',
+              'close': '50ETF基金净值表现日数据.xlsx'},
+}
+DEFAULTS = {'rate': 'shibor_3M.xlsx', 'rate_column': 'shibor_3M'}
+METHODS = ('new', 'old')
+_stores = {} #工作进程中打开的ChainStore
+
+def load_config(path):
+    '''读取设置文件，与UNDERLYINGS合并'''
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return dict(UNDERLYINGS, **config)
+
+def output_root():
+    '''所有标的的结果保存的目录'''
+    return os.path.join(data_root(), 'vix')
+
+def _store(spec):
+    '''打开的ChainStore在进程内重复使用，数据重新保存后重新打开'''
+    from volopt.chains import ChainStore
+    path = os.path.join(data_root(), spec['chain'])
+    key = (path, os.stat(os.path.join(path, 'manifest.json')).st_mtime_ns)
+    if key not in _stores:
+        _stores[key] = ChainStore(path)
+    return _stores[key]
+
+def _rate(spec):
+    '''以日期为索引的无风险利率'''
+    from volopt.data import read_excel
+    spec = dict(DEFAULTS, **spec)
+    rate = read_excel(spec['rate'], index_col='date')[spec['rate_column']]
+    rate.index = rate.index.astype('datetime64[ns]')
+    return rate
+
+def _close(spec):
+    '''以日期为索引的标的收盘价'''
+    import pandas as pd
+    from volopt.data import read_excel
+    close = read_excel(spec['close'])
+    return close.set_index(pd.to_datetime(close['date']))['close']
+
+def inputs(spec):
+    '''
+    计算用到的全部数据：期权数据每行加上当日的利率和收盘价，用于发现新增和修正的日期
+    '''
+    chain = _store(spec).load()
+    date = chain['date']
+    chain['r'] = _rate(spec).reindex(date).to_numpy()
+    chain['close'] = _close(spec).reindex(date).to_numpy()
+    return chain.set_index('date', drop=False)
+
+def vix_shard(spec, method, runs):
+    '''
+    几段日期的VIX，在工作进程中运行
+    Args:
+        method:
+            'new'为方差互换方法（VIX_batch），'old'为Whaley方法（VIX_old）
+        runs:
+            (起始日, 结束日)的列表，包含两端，每段是连续的交易日
+    Returns:
+        以日期为索引的VIX序列
+    '''
+    import pandas as pd
+    add_script_dirs()
+    store = _store(spec)
+    chain = pd.concat([store.load(start, end) for start, end in runs],
+                      ignore_index=True)
+    if method == 'new':
+        from VIX_batch import vix_batch
+        return vix_batch(chain, _rate(spec))
+    from VIX_old import select_nearest, implied_vols, whaley_vix
+    rate = _rate(spec).rename('shibor_3M')
+    close = _close(spec).rename('close')
+    data = chain.join(rate, on='date').join(close, on='date')
+    vix = whaley_vix(implied_vols(select_nearest(data)))['VIX']
+    return pd.Series(vix.to_numpy(), index=pd.DatetimeIndex(vix.index))
+
+def shards(dates, trading_days, n):
+    '''
+    需要计算的日期按个数平均分成n段，每段再拆成连续交易日的区间，
+    中间没有变化的日期不会被读取和计算
+    Args:
+        dates:
+            需要计算的日期
+        trading_days:
+            所有交易日，有序
+    Returns:
+        每段为(起始日, 结束日)的列表
+    '''
+    trading_days = np.asarray(trading_days, dtype='datetime64[ns]')
+    positions = np.searchsorted(trading_days,
+                                np.unique(np.asarray(dates, dtype='datetime64[ns]')))
+    result = []
+    for part in np.array_split(positions, max(min(n, len(positions)), 1)):
+        if not len(part):
+            continue
+        breaks = np.flatnonzero(np.diff(part) != 1) + 1
+        starts = np.r_[part[0], part[breaks]]
+        ends = np.r_[part[breaks - 1], part[-1]]
+        result.append(list(zip(trading_days[starts], trading_days[ends])))
+    return result
+
+def _params(name, spec, method):
+    '''保存结果时的参数，包括计算所用模块的源代码'''
+    add_script_dirs()
+    module = 'VIX_batch' if method == 'new' else 'VIX_old'
+    return {'underlying': name, 'method': method, 'chain': spec['chain'],
+            'module': module_hash(module)}
+
+def update(name, spec, method, pool, n_shards):
+    '''
+    增量更新一个标的、一种方法的VIX，需要计算的日期分段后交给进程池
+    Returns:
+        以日期为索引的全部VIX
+    '''
+    import pandas as pd
+
+    def compute(data):
+        dates = data.index.unique()
+        futures = [pool.submit(vix_shard, spec, method, runs)
+                   for runs in shards(dates, _store(spec).dates, n_shards)]
+        parts = [f.result() for f in futures]
+        if not parts:
+            return pd.Series(dtype=float)
+        # 只读取需要计算的日期，仍然只返回这些日期，以防计算结果多出日期
+        result = pd.concat(parts)
+        return result[result.index.isin(dates)]
+
+    return series.update('vix', _params(name, spec, method), inputs(spec),
+                         compute, pointwise=True, root=output_root())
+
+def run(names=None, methods=METHODS, jobs=None, shards_per=None,
+        underlyings=None):
+    '''
+    计算多个标的的VIX
+    Args:
+        names:
+            标的名称的列表，为None时计算underlyings中的所有标的
+        methods:
+            'new', 'old'中的一种或两种
+        jobs:
+            进程数，默认为CPU数
+        shards_per:
+            每个标的、每种方法的日期分段数，默认为进程数
+        underlyings:
+            标的的设置，默认为UNDERLYINGS
+    Returns:
+        DataFrame，列为(标的, 方法)，以日期为索引
+    '''
+    import pandas as pd
+    underlyings = underlyings or UNDERLYINGS
+    names = names or list(underlyings)
+    jobs = jobs or os.cpu_count()
+    shards_per = shards_per or jobs
+    tasks = [(name, method) for name in names for method in methods]
+    # 各标的在线程中读取数据和比较校验值，计算都在同一个进程池中
+    with ProcessPoolExecutor(jobs) as pool,\
+         ThreadPoolExecutor(len(tasks) or 1) as threads:
+        futures = {task: threads.submit(update, task[0], underlyings[task[0]],
+                                        task[1], pool, shards_per)
+                   for task in tasks}
+        results = {task: f.result() for task, f in futures.items()}
+    return pd.DataFrame(results)
+
+def load(names=None, methods=METHODS, underlyings=None):
+    '''读取已经保存的VIX，不做计算'''
+    import pandas as pd
+    underlyings = underlyings or UNDERLYINGS
+    frames = {}
+    for name in names or list(underlyings):
+        for method in methods:
+            result = series.load('vix', _params(name, underlyings[name],
+                                                method), root=output_root())
+            if result is not None:
+                frames[(name, method)] = result['value']
+    return pd.DataFrame(frames)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多个标的的VIX')
+    parser.add_argument('names', nargs='*', help='标的名称，默认为全部')
+    parser.add_argument('--config', help='其他标的的设置文件')
+    parser.add_argument('--methods', default='new,old',
+                        help="'new', 'old'，用逗号分隔")
+    parser.add_argument('--jobs', type=int, default=None, help='进程数')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='每个标的的日期分段数')
+    args = parser.parse_args(argv)
+    underlyings = load_config(args.config) if args.config else UNDERLYINGS
+    result = run(args.names, args.methods.split(','), args.jobs, args.shards,
+                 underlyings)
+    print(result.describe().T.to_string())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
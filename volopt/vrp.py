@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+波动率风险溢价：六种已实现波动率（多个窗口）与隐含波动率、对冲隐含波动率和VIX
+的比较。所有序列按日期对齐到同一个日期索引上的预先分配的数组，
+价差、比值以及与未来窗口已实现波动率的比较在一次广播运算中得到
+"""
+
+import numpy as np
+
+from volopt.estimators import MODELS, lags, rolling_array
+
+MEASURES = ('spread', 'ratio', 'forward_spread', 'forward_ratio')
+
+def shared_index(*indexes):
+    '''多个日期索引的并集，int64纳秒，已排序'''
+    from volopt.series import to_ns
+    return np.unique(np.concatenate([to_ns(index) for index in indexes]))
+
+def align(index, dates, values, out):
+    '''
+    将以dates为日期的values写入out中与index对应的位置
+    Args:
+        index:
+            shared_index得到的日期
+        dates:
+            values的日期，int64纳秒，必须都在index中
+        out:
+            第一维与index等长的数组，values的其余维与out相同
+    '''
+    out[np.searchsorted(index, dates)] = values
+    return out
+
+def realized(open, high, low, close, models=MODELS, windows=(20, 60, 120),
+             N=240):
+    '''
+    所有模型、所有窗口的滚动波动率，以及之后一个窗口的已实现波动率
+    Args:
+        open, high, low, close:
+            价格序列（数组）
+    Returns:
+        两个(交易日数, 模型数, 窗口数)的数组：第i行为截止第i个交易日的窗口，
+        和第i + 1到第i + window个交易日的窗口；窗口不完整时为NaN
+    '''
+    close = np.asarray(close, dtype=float)
+    n = close.shape[-1]
+    past = np.full((n, len(models), len(windows)), np.nan)
+    future = np.full_like(past, np.nan)
+    for i, model in enumerate(models):
+        for j, window in enumerate(windows):
+            start = window - 1 + lags(model)
+            past[start:, i, j] = rolling_array(model, window, open, high, low,
+                                               close, N=N)
+            future[:n - window, i, j] = past[window:, i, j]
+    return past, future
+
+def premium(implied, past, future):
+    '''
+    隐含波动率与已实现波动率的比较，广播计算
+    Args:
+        implied:
+            (日期数, 隐含波动率的种数)
+        past, future:
+            (日期数, 模型数, 窗口数)，见realized
+    Returns:
+        (len(MEASURES), 日期数, 隐含波动率的种数, 模型数, 窗口数)的数组：
+        隐含减已实现、隐含除以已实现、之后的已实现减隐含、之后的已实现除以隐含
+    '''
+    iv = implied[:, :, None, None]
+    rv, fv = past[:, None], future[:, None]
+    out = np.empty((len(MEASURES),) + np.broadcast_shapes(iv.shape, rv.shape))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(iv, rv, out=out[0])
+        np.divide(iv, rv, out=out[1])
+        np.subtract(fv, iv, out=out[2])
+        np.divide(fv, iv, out=out[3])
+    return out
+
+def panel(prices, implied, models=MODELS, windows=(20, 60, 120), N=240):
+    '''
+    波动率风险溢价的面板
+    Args:
+        prices:
+            以日期为索引的DataFrame，包含open, high, low, close列
+        implied:
+            dict，名称为键，值为以日期为索引的隐含波动率（小数，不是百分数），
+            如各个M的rolling_implied、rolling_hedge和VIX / 100
+        windows:
+            已实现波动率的窗口长度，之后的已实现波动率用相同的窗口
+    Returns:
+        以所有序列日期的并集为索引的DataFrame，
+        列为(比较方式, 隐含波动率, 模型, 窗口)
+    '''
+    import pandas as pd
+    from volopt.series import to_ns
+    names = list(implied)
+    index = shared_index(prices.index, *(implied[k].index for k in names))
+    # 已实现波动率在价格自身的交易日上计算，未来窗口按交易日而不是日历对齐
+    past, future = realized(*(prices[k].to_numpy(dtype=float)
+                              for k in ('open', 'high', 'low', 'close')),
+                            models=models, windows=windows, N=N)
+    dates = to_ns(prices.index)
+    shape = (len(index), len(models), len(windows))
+    past = align(index, dates, past, np.full(shape, np.nan))
+    future = align(index, dates, future, np.full(shape, np.nan))
+    iv = np.full((len(index), len(names)), np.nan)
+    for j, name in enumerate(names):
+        align(index, to_ns(implied[name].index),
+              np.asarray(implied[name], dtype=float), iv[:, j])
+
+    values = premium(iv, past, future)
+    columns = pd.MultiIndex.from_product(
+        [MEASURES, names, models, windows],
+        names=['measure', 'implied', 'model', 'window'])
+    # (比较方式, 日期, ...)换到日期在前，各列的顺序与columns相同
+    values = np.moveaxis(values, 1, 0).reshape(len(index), -1)
+    return pd.DataFrame(values, columns=columns,
+                        index=pd.DatetimeIndex(index.astype('datetime64[ns]'),
+                                               name='date'))